@@ -0,0 +1,83 @@
+"""
+静的アセット出力モジュール
+
+画像などのアセットを、内容ハッシュ入りのファイル名（例: assets/pins-1x.<hash>.png）で
+HTMLとは別のファイルに書き出し、参照用のURLを返します。内容が変わらない限り
+URLも変わらないため、ブラウザは再訪問時もキャッシュを使えます。
+単一ファイルで配布したい場合は、従来どおり data URL で埋め込むこともできます。
+"""
+import base64
+import hashlib
+import logging
+import os
+from typing import List
+
+from atomic_file import atomic_writer
+
+logger = logging.getLogger(__name__)
+
+# 出力モード
+ASSET_MODE_EXTERNAL = 'external'  # 別ファイルに書き出してURLで参照
+ASSET_MODE_INLINE = 'inline'      # data URL でHTMLに埋め込む
+
+DEFAULT_ASSETS_FOLDER = 'assets'
+
+# ファイル名に含めるハッシュの桁数
+HASH_LENGTH = 12
+
+
+class AssetWriter:
+    """
+    アセットを出力モードに応じて書き出し、参照用のURLを返す
+
+    external モードでは、URLは出力HTMLからの相対パスです。
+    """
+
+    def __init__(
+        self,
+        mode: str = ASSET_MODE_EXTERNAL,
+        output_dir: str = '.',
+        assets_folder: str = DEFAULT_ASSETS_FOLDER
+    ):
+        """
+        Args:
+            mode: 'external' または 'inline'
+            output_dir: 出力HTMLのあるフォルダ
+            assets_folder: アセットを書き出すフォルダ（output_dir からの相対パス）
+        """
+        if mode not in (ASSET_MODE_EXTERNAL, ASSET_MODE_INLINE):
+            raise ValueError(f"不明なアセット出力モードです: {mode}")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.assets_folder = assets_folder
+        self.written: List[str] = []  # このビルドで書き出した（または既に存在した）ファイル
+
+    def url(self, name: str, data: bytes, mime_type: str, extension: str) -> str:
+        """
+        アセットを書き出して参照用のURLを返す
+
+        Args:
+            name: ファイル名の接頭辞（例: 'pins-1x'）
+            data: アセットの内容
+            mime_type: MIMEタイプ（inline モードで使用）
+            extension: ファイル拡張子（ドットなし）
+
+        Returns:
+            相対URL、または data URL
+        """
+        if self.mode == ASSET_MODE_INLINE:
+            return f"data:{mime_type};base64,{base64.b64encode(data).decode()}"
+
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        filename = f"{name}.{digest}.{extension}"
+        folder = os.path.join(self.output_dir, self.assets_folder)
+        path = os.path.join(folder, filename)
+
+        # 同じ名前なら内容も同じなので書き直さない
+        if not os.path.exists(path):
+            os.makedirs(folder, exist_ok=True)
+            with atomic_writer(path) as f:
+                f.write(data)
+            logger.info(f"アセットを書き出しました: {path} ({len(data):,} bytes)")
+        self.written.append(path)
+        return f"{self.assets_folder}/{filename}"
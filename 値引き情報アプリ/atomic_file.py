@@ -0,0 +1,46 @@
+"""
+ファイルの安全な書き込みモジュール
+
+同じフォルダの一時ファイルに書き込み、正常に閉じられた後で出力先に置き換えます。
+途中で失敗しても既存のファイルは壊れず、一時ファイル（*.tmp）も残りません。
+"""
+import contextlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+TMP_SUFFIX = '.tmp'
+FILE_MODE = 0o644  # mkstemp は所有者のみ読み書きできるファイルを作るため、通常のファイルと同じ権限にする
+
+
+@contextmanager
+def atomic_writer(path: str, mode: str = 'wb', encoding: Optional[str] = None) -> Iterator[IO]:
+    """
+    一時ファイルに書き込み、正常に閉じられたら path に置き換える
+
+    書き込み・置き換えのどこで失敗しても一時ファイルを削除し、例外はそのまま送出します。
+
+    Args:
+        path: 出力先のパス
+        mode: 'wb'（バイナリ）または 'w'（テキスト。改行は変換しない）
+        encoding: テキストの文字コード（テキストモードのみ）
+
+    Yields:
+        書き込み用のファイルオブジェクト
+    """
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=TMP_SUFFIX)
+    try:
+        if 'b' in mode:
+            f = os.fdopen(fd, mode)
+        else:
+            f = os.fdopen(fd, mode, encoding=encoding or 'utf-8', newline='')
+        with f:
+            yield f
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
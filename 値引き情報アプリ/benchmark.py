@@ -0,0 +1,267 @@
+"""
+性能計測スクリプト
+
+合成した店舗データを使って、地図生成パイプラインの各処理を計測します。
+
+使い方:
+    python benchmark.py distance
+    python benchmark.py spatial
+    python benchmark.py render
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from distance import DistanceEngine, calculate_distance, distance_matrix
+from spatial_index import StoreSpatialIndex
+from sprite_atlas import SpriteAtlas
+
+# 合成店舗を配置する範囲（備後地方を覆う程度の緯度経度）
+SYNTHETIC_LAT_RANGE = (34.35, 34.75)
+SYNTHETIC_LON_RANGE = (133.05, 133.55)
+SYNTHETIC_BRANDS = ['ハローズ', 'エブリイ', 'フレスタ', 'フジ', 'ラ・ムー', '業務スーパー']
+
+REFERENCE_LAT = 34.49178298
+REFERENCE_LON = 133.3690471
+
+
+def make_synthetic_stores(count: int, seed: int = 0) -> pd.DataFrame:
+    """
+    緯度経度とブランドを持つ合成店舗データを生成
+
+    Args:
+        count: 店舗数
+        seed: 乱数シード
+
+    Returns:
+        lat, lon, brand 列を持つDataFrame
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'lat': rng.uniform(*SYNTHETIC_LAT_RANGE, count),
+        'lon': rng.uniform(*SYNTHETIC_LON_RANGE, count),
+        'brand': rng.choice(SYNTHETIC_BRANDS, count),
+    })
+
+
+def measure(func: Callable[[], object], repeat: int = 3) -> Tuple[float, object]:
+    """
+    関数を繰り返し実行し、最短の実行時間（秒）と最後の戻り値を返す
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_distance(sizes: List[int], references: int) -> None:
+    """
+    行ごとのスカラー計算とベクトル化計算の比較
+    """
+    print(f"{'店舗数':>8} {'scalar(apply)':>14} {'vector':>10} {'倍率':>8} {'最大誤差(m)':>12}")
+    for size in sizes:
+        df = make_synthetic_stores(size)
+
+        scalar_time, scalar_result = measure(lambda: df.apply(
+            lambda row: calculate_distance(
+                REFERENCE_LAT, REFERENCE_LON, row['lat'], row['lon']
+            ),
+            axis=1
+        ).to_numpy(), repeat=1)
+
+        engine = DistanceEngine.from_dataframe(df)
+        vector_time, vector_result = measure(
+            lambda: engine.distances_from(REFERENCE_LAT, REFERENCE_LON)
+        )
+
+        max_error = float(np.max(np.abs(scalar_result - vector_result)))
+        print(
+            f"{size:>8} {scalar_time:>13.4f}s {vector_time:>9.5f}s "
+            f"{scalar_time / vector_time:>7.0f}x {max_error:>12.2e}"
+        )
+
+    # 複数基準点からの距離行列
+    points = make_synthetic_stores(references, seed=1)[['lat', 'lon']].to_numpy()
+    for size in sizes:
+        stores = make_synthetic_stores(size)[['lat', 'lon']].to_numpy()
+        matrix_time, _ = measure(lambda: distance_matrix(points, stores))
+        print(f"distance_matrix: 基準点{references}件 x 店舗{size}件 = {matrix_time:.4f}s")
+
+
+def brute_force_nearest(df: pd.DataFrame, engine: DistanceEngine, lat: float, lon: float,
+                        k: int, brands=None) -> List[int]:
+    """
+    全店舗の距離を計算してソートする全件走査版の最寄り検索
+    """
+    distances = engine.distances_from(lat, lon)
+    order = np.argsort(distances, kind='stable')
+    if brands is not None:
+        order = order[df['brand'].to_numpy()[order].astype(str) == brands]
+    return df.index.to_numpy()[order[:k]].tolist()
+
+
+def bench_spatial(sizes: List[int], queries: int, k: int, radius: float) -> None:
+    """
+    空間インデックスの検証（全件走査との一致）と検索時間の比較
+    """
+    rng = np.random.default_rng(2)
+    print(f"{'店舗数':>8} {'構築':>9} {'nearest':>10} {'全件走査':>10} {'radius':>10} {'全件走査':>10}")
+    for size in sizes:
+        df = make_synthetic_stores(size)
+        engine = DistanceEngine.from_dataframe(df)
+        build_time, index = measure(lambda: StoreSpatialIndex.from_dataframe(df), repeat=1)
+
+        points = list(zip(
+            rng.uniform(*SYNTHETIC_LAT_RANGE, queries),
+            rng.uniform(*SYNTHETIC_LON_RANGE, queries),
+        ))
+        brand_filters = rng.choice(SYNTHETIC_BRANDS, queries)
+
+        # 全件走査の結果と一致することを確認
+        for (lat, lon), brand in zip(points, brand_filters):
+            expected = brute_force_nearest(df, engine, lat, lon, k)
+            actual = [n.index for n in index.nearest(lat, lon, k)]
+            assert actual == expected, f"nearest が一致しません: ({lat}, {lon})"
+
+            expected = brute_force_nearest(df, engine, lat, lon, k, brands=brand)
+            actual = [n.index for n in index.nearest(lat, lon, k, brands=[brand])]
+            assert actual == expected, f"ブランド指定の nearest が一致しません: ({lat}, {lon}, {brand})"
+
+            distances = engine.distances_from(lat, lon)
+            expected = np.flatnonzero(distances <= radius)
+            expected = expected[np.argsort(distances[expected], kind='stable')].tolist()
+            actual = [n.index for n in index.within_radius(lat, lon, radius)]
+            assert actual == expected, f"within_radius が一致しません: ({lat}, {lon})"
+
+        def run_index_nearest():
+            for lat, lon in points:
+                index.nearest(lat, lon, k)
+
+        def run_brute_nearest():
+            for lat, lon in points:
+                brute_force_nearest(df, engine, lat, lon, k)
+
+        def run_index_radius():
+            for lat, lon in points:
+                index.within_radius(lat, lon, radius)
+
+        def run_brute_radius():
+            for lat, lon in points:
+                distances = engine.distances_from(lat, lon)
+                hits = np.flatnonzero(distances <= radius)
+                hits[np.argsort(distances[hits], kind='stable')]
+
+        timings = [
+            measure(func, repeat=1)[0] / queries * 1e6
+            for func in (run_index_nearest, run_brute_nearest, run_index_radius, run_brute_radius)
+        ]
+        print(
+            f"{size:>8} {build_time:>8.3f}s "
+            + " ".join(f"{t:>8.0f}us" for t in timings)
+        )
+    print(f"全件走査との一致を確認しました（各{queries}クエリ, k={k}, 半径{radius:.0f}m）")
+
+
+def make_synthetic_catalog(count: int, seed: int = 0) -> pd.DataFrame:
+    """
+    地図の出力に必要な列（店舗名・特売情報・基準点からの距離など）を持つ合成店舗データを生成
+    """
+    df = make_synthetic_stores(count, seed)
+    df['name'] = [f"{brand} 合成{i}号店" for i, brand in enumerate(df['brand'])]
+    df['website'] = 'https://example.com/'
+    for column in ('souzai_info', 'sengyo_info', 'niku_info', 'seika_info'):
+        df[column] = df['brand'] + ': 本日の特売情報は店頭にて！'
+    engine = DistanceEngine.from_dataframe(df)
+    df['distance_from_reference'] = engine.distances_from(REFERENCE_LAT, REFERENCE_LON).round().astype(int)
+    return df
+
+
+def bench_render(sizes: List[int], repeat: int) -> None:
+    """
+    Foliumでの出力とLeaflet直接出力の比較（生成時間・HTMLの大きさ）
+    """
+    # generate_map はGUI（webview）を読み込むため、このサブコマンドでのみ読み込む
+    from generate_map import (
+        FRONTEND_LIBRARIES, ICON_SIZE, RENDERER_FOLIUM, RENDERER_LEAFLET, write_app_html
+    )
+    from leaflet_renderer import leaflet_libraries
+
+    # ピン画像はブランドごとに1つ（CSSクラスだけを使うため、アトラスの画像は空）
+    pin_atlas = SpriteAtlas(
+        b'', ICON_SIZE, len(SYNTHETIC_BRANDS), 1, {brand: i for i, brand in enumerate(SYNTHETIC_BRANDS)}
+    )
+    variants = [
+        ('folium', RENDERER_FOLIUM, False, FRONTEND_LIBRARIES),
+        ('folium+geojson', RENDERER_FOLIUM, True, FRONTEND_LIBRARIES),
+        ('leaflet', RENDERER_LEAFLET, True, leaflet_libraries(FRONTEND_LIBRARIES)),
+    ]
+
+    print(f"{'店舗数':>8} {'出力方法':<16} {'生成時間':>10} {'HTML':>12} {'gzip':>10}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for size in sizes:
+            df = make_synthetic_catalog(size)
+            store_pin_keys = dict(zip(df.index, df['brand']))
+            for label, renderer, browser_markers, libraries in variants:
+                path = os.path.join(output_dir, f"{label}.html")
+                elapsed, _ = measure(lambda: write_app_html(
+                    path, df, store_pin_keys, pin_atlas, '', libraries,
+                    renderer=renderer, browser_markers=browser_markers
+                ), repeat=repeat)
+                with open(path, 'rb') as f:
+                    html = f.read()
+                print(
+                    f"{size:>8} {label:<16} {elapsed:>9.3f}s "
+                    f"{len(html):>11,}B {len(gzip.compress(html)):>9,}B"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="地図生成パイプラインの性能計測")
+    subparsers = parser.add_subparsers(dest='target', required=True)
+
+    distance_parser = subparsers.add_parser('distance', help="距離計算の計測")
+    distance_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+        help="計測する店舗数"
+    )
+    distance_parser.add_argument(
+        '--references', type=int, default=32,
+        help="距離行列の基準点数"
+    )
+
+    spatial_parser = subparsers.add_parser('spatial', help="空間インデックスの検証と計測")
+    spatial_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10_000, 100_000],
+        help="計測する店舗数"
+    )
+    spatial_parser.add_argument('--queries', type=int, default=200, help="クエリ数")
+    spatial_parser.add_argument('--k', type=int, default=5, help="nearest の取得件数")
+    spatial_parser.add_argument('--radius', type=float, default=1_000, help="within_radius の半径（メートル）")
+
+    render_parser = subparsers.add_parser('render', help="地図ページの出力方法（Folium / Leaflet直接出力）の比較")
+    render_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[100, 1_000, 10_000],
+        help="計測する店舗数"
+    )
+    render_parser.add_argument('--repeat', type=int, default=3, help="繰り返し回数（最短の時間を表示）")
+
+    args = parser.parse_args()
+    if args.target == 'distance':
+        bench_distance(args.sizes, args.references)
+    elif args.target == 'spatial':
+        bench_spatial(args.sizes, args.queries, args.k, args.radius)
+    elif args.target == 'render':
+        bench_render(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+ブランド情報レジストリモジュール
+
+ブランドごとのピン色・ロゴファイル・既定の特売情報を、
+店舗カタログから一度だけ集計して保持します。
+以降の処理はブランド名から O(1) で参照できます。
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterator, Mapping
+
+import pandas as pd
+
+# ブランド単位で既定値を持つ特売情報の列
+INFO_KEYS = ['souzai_info', 'sengyo_info', 'niku_info', 'seika_info']
+
+
+def normalize_brand_name(brand: str) -> str:
+    """
+    ブランド名を正規化する（ファイル名などに使用）
+
+    Args:
+        brand: ブランド名
+
+    Returns:
+        正規化されたブランド名
+    """
+    return brand.lower().replace(' ', '').replace('［', '').replace('］', '').replace('−', '')
+
+
+@dataclass
+class BrandInfo:
+    """1ブランド分の集計済み情報"""
+    name: str
+    color: str
+    logo_file: str
+    info: Dict[str, str]
+
+
+class BrandRegistry:
+    """
+    ブランド名をキーとした BrandInfo の辞書
+
+    登録順は店舗カタログに最初に現れた順です。
+    """
+
+    def __init__(self, brands: Mapping[str, BrandInfo]):
+        self._brands: Dict[str, BrandInfo] = dict(brands)
+
+    @classmethod
+    def from_catalog(
+        cls,
+        df: pd.DataFrame,
+        pin_colors: Mapping[str, str],
+        default_color: str,
+        info_template: str
+    ) -> 'BrandRegistry':
+        """
+        店舗カタログから1回の走査でレジストリを構築
+
+        ロゴファイル・特売情報は、そのブランドで最初に
+        記入されている店舗の値を採用し、無ければ既定値を使います。
+
+        Args:
+            df: load_store_catalog() で読み込んだ店舗DataFrame（未記入は空文字列）
+            pin_colors: ブランド名とピン色の対応
+            default_color: pin_colors に無いブランドのピン色
+            info_template: 特売情報の既定値（{brand} をブランド名に置換）
+        """
+        first_values: Dict[str, Dict[str, str]] = {}
+        keys = ['logo_file'] + INFO_KEYS
+        columns = [df[key].tolist() for key in keys]
+
+        for row, brand in enumerate(df['brand'].tolist()):
+            values = first_values.setdefault(brand, {})
+            for key, column in zip(keys, columns):
+                if key not in values and column[row]:
+                    values[key] = column[row]
+
+        brands = {}
+        for brand, values in first_values.items():
+            brands[brand] = BrandInfo(
+                name=brand,
+                color=pin_colors.get(brand, default_color),
+                logo_file=values.get('logo_file', f"logo_{normalize_brand_name(brand)}.png"),
+                info={
+                    key: values.get(key, info_template.format(brand=brand))
+                    for key in INFO_KEYS
+                },
+            )
+        return cls(brands)
+
+    def __getitem__(self, brand: str) -> BrandInfo:
+        return self._brands[brand]
+
+    def __contains__(self, brand: object) -> bool:
+        return brand in self._brands
+
+    def __iter__(self) -> Iterator[BrandInfo]:
+        return iter(self._brands.values())
+
+    def __len__(self) -> int:
+        return len(self._brands)
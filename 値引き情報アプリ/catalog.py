@@ -0,0 +1,166 @@
+"""
+店舗カタログ読み込みモジュール
+
+CSV / JSON Lines 形式の店舗カタログファイルを分割読み込みし、
+座標とブランド名を検証したうえで地図生成用のDataFrameを作成します。
+店舗の追加はカタログファイルへの行追加だけで行えます。
+"""
+import logging
+import os
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 店舗DataFrameの列（この順序で出力する）
+STORE_COLUMNS = [
+    'name', 'lat', 'lon', 'logo_file', 'website',
+    'souzai_info', 'sengyo_info', 'niku_info', 'seika_info', 'brand'
+]
+
+# カタログファイルに必須の列
+REQUIRED_COLUMNS = ['name', 'lat', 'lon', 'brand']
+
+# 1回に読み込む行数
+DEFAULT_CHUNK_SIZE = 5000
+
+# 緯度・経度の有効範囲
+LAT_RANGE = (-90.0, 90.0)
+LON_RANGE = (-180.0, 180.0)
+
+
+class CatalogError(ValueError):
+    """カタログファイルの形式が不正な場合の例外"""
+
+
+def _read_chunks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    拡張子に応じてカタログファイルを分割読み込み
+
+    Raises:
+        CatalogError: 対応していない拡張子の場合
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        # Excelで保存したBOM付きUTF-8も読めるようにする
+        return pd.read_csv(
+            path, chunksize=chunksize, dtype=str,
+            keep_default_na=False, encoding='utf-8-sig'
+        )
+    if extension in ('.jsonl', '.ndjson'):
+        return pd.read_json(
+            path, lines=True, chunksize=chunksize,
+            dtype=False, encoding='utf-8'
+        )
+    raise CatalogError(f"対応していないカタログ形式です: {path}")
+
+
+def _validate_chunk(
+    chunk: pd.DataFrame,
+    path: str,
+    first_line: int,
+    valid_brands: Optional[Iterable[str]]
+) -> pd.DataFrame:
+    """
+    1チャンク分の店舗データを検証し、不正な行を除外して列を揃える
+
+    Args:
+        chunk: 読み込んだチャンク
+        path: カタログファイルのパス（ログ用）
+        first_line: チャンク先頭行の行番号（ログ用）
+        valid_brands: 許可するブランド名（Noneの場合は検証しない）
+
+    Returns:
+        STORE_COLUMNS の列を持つDataFrame
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+    if missing:
+        raise CatalogError(f"カタログ '{path}' に必須列がありません: {', '.join(missing)}")
+
+    chunk = chunk.reindex(columns=STORE_COLUMNS)
+    text_columns = [column for column in STORE_COLUMNS if column not in ('lat', 'lon')]
+    chunk[text_columns] = chunk[text_columns].fillna('').astype(str).apply(lambda s: s.str.strip())
+    chunk['lat'] = pd.to_numeric(chunk['lat'], errors='coerce')
+    chunk['lon'] = pd.to_numeric(chunk['lon'], errors='coerce')
+
+    valid = (
+        chunk['lat'].between(*LAT_RANGE) &
+        chunk['lon'].between(*LON_RANGE) &
+        (chunk['name'] != '') &
+        (chunk['brand'] != '')
+    )
+    for position in (~valid).to_numpy().nonzero()[0]:
+        row = chunk.iloc[position]
+        logger.warning(
+            f"{path}:{first_line + position}: 座標または必須項目が不正なため読み飛ばします "
+            f"(name={row['name']!r}, lat={row['lat']}, lon={row['lon']})"
+        )
+
+    if valid_brands is not None:
+        known = chunk['brand'].isin(set(valid_brands))
+        for position in (valid & ~known).to_numpy().nonzero()[0]:
+            row = chunk.iloc[position]
+            logger.warning(
+                f"{path}:{first_line + position}: 未登録のブランド '{row['brand']}' のため読み飛ばします "
+                f"(name={row['name']!r})"
+            )
+        valid &= known
+
+    return chunk[valid]
+
+
+def iter_catalog_chunks(
+    path: str,
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    valid_brands: Optional[Iterable[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    カタログファイルを検証済みのチャンク単位で読み込む
+
+    Args:
+        path: CSV (.csv) または JSON Lines (.jsonl / .ndjson) のパス
+        chunksize: 1チャンクの行数
+        valid_brands: 許可するブランド名（Noneの場合は検証しない）
+
+    Yields:
+        STORE_COLUMNS の列を持つDataFrame
+    """
+    if valid_brands is not None:
+        valid_brands = frozenset(valid_brands)
+    # CSVはヘッダーが1行目なので、データ行は2行目から
+    line = 2 if path.lower().endswith('.csv') else 1
+    with _read_chunks(path, chunksize) as reader:
+        for chunk in reader:
+            yield _validate_chunk(chunk, path, line, valid_brands)
+            line += len(chunk)
+
+
+def load_store_catalog(
+    paths: Sequence[str],
+    chunksize: int = DEFAULT_CHUNK_SIZE,
+    valid_brands: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    複数のカタログファイルを読み込み、1つの店舗DataFrameにまとめる
+
+    未記入の項目は空文字列のまま返すため、呼び出し側で補完してください。
+
+    Args:
+        paths: カタログファイルのパス（記載順に結合）
+        chunksize: 1チャンクの行数
+        valid_brands: 許可するブランド名（Noneの場合は検証しない）
+
+    Returns:
+        STORE_COLUMNS の列を持つ店舗DataFrame
+    """
+    chunks: List[pd.DataFrame] = []
+    for path in paths:
+        file_chunks = list(iter_catalog_chunks(path, chunksize, valid_brands))
+        count = sum(len(chunk) for chunk in file_chunks)
+        logger.info(f"店舗カタログ '{path}' から{count}店舗を読み込みました。")
+        chunks.extend(file_chunks)
+
+    if not chunks:
+        return pd.DataFrame(columns=STORE_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,169 @@
+"""
+店舗距離計算モジュール
+
+Haversine formula による2点間距離を、NumPyでベクトル化して一括計算します。
+店舗数・基準点数が増えても、Pythonの行ごとのループを介さずに計算できます。
+"""
+import math
+from typing import Sequence, Union
+
+import numpy as np
+
+# 地球の半径（メートル）
+EARTH_RADIUS_M = 6371 * 1000
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+
+def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    2点間の距離を計算（Haversine formula）
+
+    1点ずつ計算するスカラー版。ベクトル版の検証・ベンチマーク用に残しています。
+
+    Args:
+        lat1, lon1: 第1点の緯度・経度
+        lat2, lon2: 第2点の緯度・経度
+
+    Returns:
+        距離（メートル）
+    """
+    R = 6371  # 地球の半径（km）
+    d_lat = math.radians(lat2 - lat1)
+    d_lon = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_lat / 2) ** 2 +
+        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+        math.sin(d_lon / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c * 1000  # メートルに変換
+
+
+def _haversine(
+    lat1_rad: np.ndarray,
+    lon1_rad: np.ndarray,
+    cos_lat1: np.ndarray,
+    lat2_rad: np.ndarray,
+    lon2_rad: np.ndarray,
+    cos_lat2: np.ndarray
+) -> np.ndarray:
+    """
+    ラジアン化済みの座標配列からHaversine距離を計算（ブロードキャスト対応）
+
+    Returns:
+        距離（メートル）の配列
+    """
+    a = (
+        np.sin((lat2_rad - lat1_rad) / 2) ** 2 +
+        cos_lat1 * cos_lat2 * np.sin((lon2_rad - lon1_rad) / 2) ** 2
+    )
+    # 丸め誤差で1をわずかに超えるとsqrt(1 - a)がNaNになるため丸める
+    a = np.clip(a, 0.0, 1.0)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def _as_points(points: ArrayLike) -> np.ndarray:
+    """
+    緯度・経度の組の列を (N, 2) のfloat配列に変換
+
+    Raises:
+        ValueError: 形状が (N, 2) でない場合
+    """
+    arr = np.asarray(points, dtype=np.float64)
+    if arr.ndim == 1 and arr.size == 2:
+        arr = arr.reshape(1, 2)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError(f"座標は (緯度, 経度) の組の配列で指定してください: shape={arr.shape}")
+    return arr
+
+
+def distance_matrix(points_a: ArrayLike, points_b: ArrayLike) -> np.ndarray:
+    """
+    2つの地点集合の全組み合わせの距離行列を計算
+
+    Args:
+        points_a: (緯度, 経度) の組の配列（N件）
+        points_b: (緯度, 経度) の組の配列（M件）
+
+    Returns:
+        距離（メートル）の (N, M) 配列
+    """
+    a = np.radians(_as_points(points_a))
+    b = np.radians(_as_points(points_b))
+    lat_a, lon_a = a[:, 0:1], a[:, 1:2]
+    lat_b, lon_b = b[:, 0], b[:, 1]
+    return _haversine(lat_a, lon_a, np.cos(lat_a), lat_b, lon_b, np.cos(lat_b))
+
+
+class DistanceEngine:
+    """
+    店舗座標を保持し、任意の基準点からの距離を一括計算するエンジン
+
+    店舗側のラジアン変換とcos(緯度)は構築時に一度だけ計算します。
+    """
+
+    def __init__(self, lats: ArrayLike, lons: ArrayLike):
+        """
+        Args:
+            lats: 店舗の緯度の配列
+            lons: 店舗の経度の配列
+        """
+        lats_arr = np.asarray(lats, dtype=np.float64)
+        lons_arr = np.asarray(lons, dtype=np.float64)
+        if lats_arr.shape != lons_arr.shape:
+            raise ValueError("緯度と経度の件数が一致しません")
+        self._lat_rad = np.radians(lats_arr)
+        self._lon_rad = np.radians(lons_arr)
+        self._cos_lat = np.cos(self._lat_rad)
+
+    @classmethod
+    def from_dataframe(cls, df, lat_column: str = 'lat', lon_column: str = 'lon') -> 'DistanceEngine':
+        """
+        店舗DataFrameからエンジンを構築
+
+        Args:
+            df: 緯度・経度列を持つDataFrame
+            lat_column: 緯度の列名
+            lon_column: 経度の列名
+        """
+        return cls(df[lat_column].to_numpy(), df[lon_column].to_numpy())
+
+    def __len__(self) -> int:
+        return self._lat_rad.shape[0]
+
+    def distances_from(self, lat: float, lon: float) -> np.ndarray:
+        """
+        基準点から全店舗までの距離を計算
+
+        Args:
+            lat: 基準点の緯度
+            lon: 基準点の経度
+
+        Returns:
+            店舗順の距離（メートル）の配列
+        """
+        ref_lat = math.radians(lat)
+        return _haversine(
+            ref_lat, math.radians(lon), math.cos(ref_lat),
+            self._lat_rad, self._lon_rad, self._cos_lat
+        )
+
+    def distances_from_many(self, points: ArrayLike) -> np.ndarray:
+        """
+        複数の基準点から全店舗までの距離を計算
+
+        Args:
+            points: 基準点の (緯度, 経度) の組の配列（K件）
+
+        Returns:
+            距離（メートル）の (K, 店舗数) 配列
+        """
+        refs = np.radians(_as_points(points))
+        ref_lat, ref_lon = refs[:, 0:1], refs[:, 1:2]
+        return _haversine(
+            ref_lat, ref_lon, np.cos(ref_lat),
+            self._lat_rad, self._lon_rad, self._cos_lat
+        )
+
@@ -7,80 +7,22 @@ from io import BytesIO
 import json
 import logging
 
+from catalog import load_store_catalog
+
 # logging設定: UTF-8エンコーディングを指定し、エラーを捕捉
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s', encoding='utf-8')
 
 # --- 0. データ定義 ---
-SUPER_DATA = {
-    'name': [
-        'ハローズ 御幸店', 'ハローズ 神辺モール店', 'ハローズ 南駅家店', 'エブリイ 駅家店',
-        'エブリイ 緑町店', 'ハローズ 緑町店', 'フレスタ アイネス店', 'フジ 福山三吉店',
-        'ハローズ 山手店', 'フレスタ 蔵王店', 'ラ・ムー 駅家店', 'ハローズ 伊勢丘店',
-        'ハローズ 新涯店'
-    ],
-    'lat': [
-        34.547245, 34.542857, 34.544033, 34.538313,
-        34.477490, 34.476470, 34.487743, 34.493521,
-        34.492559, 34.498787, 34.542412, 
-        34.502842,
-        34.461328
-    ],
-    'lon': [
-        133.347939, 133.363893, 133.330316, 133.331962,
-        133.372590, 133.371601, 133.362712, 133.375035,
-        133.333259, 133.392526, 133.326149,
-        133.422737,
-        133.392132
-    ],
-    'logo_file': [
-        'logo_harrows.png', 'logo_harrows.png', 'logo_harrows.png', 'logo_every.png',
-        'logo_every.png', 'logo_harrows.png', 'logo_fresta.png', 'logo_fuji.png',
-        'logo_harrows.png', 'logo_fresta.png', 'logo_lamu.png', 'logo_harrows.png',
-        'logo_harrows.png'
-    ],
-    'website': [
-        'https://www.halows.com/', 'https://www.halows.com/', 'https://www.halows.com/', 'https://www.super-every.co.jp/',
-        'https://www.super-every.co.jp/', 'https://www.halows.com/', 'https://www.fresta.co.jp/', 'https://www.the-fuji.com/',
-        'https://www.halows.com/', 'https://www.fresta.co.jp/', 'https://www.e-dkt.co.jp/',  # ★修正: ラ・ムーのURLを更新
-        'https://www.halows.com/',
-        'https://www.halows.com/'
-    ],
-    'souzai_info': [
-        'ハローズ: 本日の目玉は鶏の唐揚げ！', 'ハローズ: 出来立てのお好み焼きがあります！', 'ハローズ: 特製カツ丼がおすすめ！',
-        'エブリイ: 地元の人気弁当が豊富です。', 'エブリイ: サラダ・デリが充実！', 'ハローズ: 特製オムライスが20%OFF！',
-        'フレスタ: 自社製パンが人気です。', 'フジ: 手作りおにぎりコーナー！', 'ハローズ: ローストビーフ丼が数量限定！',
-        'フレスタ: 季節のパスタフェア開催中！', 'ラ・ムー: 驚きの100円たこ焼き！', 'ハローズ: 本日の目玉は鶏の唐揚げ！',
-        'ハローズ: 特製オムライスが20%OFF！'
-    ],
-    'sengyo_info': [
-        'ハローズ: 瀬戸内産の新鮮な鯛が入荷！', 'ハローズ: お刺身盛り合わせがお得！', 'ハローズ: 週末限定マグロの解体！',
-        'エブリイ: 干物が充実しています。', 'エブリイ: 本日のアジの開きがおすすめ！', 'ハローズ: マグロの刺身が半額！',
-        'フレスタ: 鮮魚コーナーに産直品！', 'フジ: 新鮮なカツオのたたき！', 'ハローズ: 瀬戸内産の新鮮な鯛が入荷！',
-        'フレスタ: 新鮮なブリが入荷！', 'ラ・ムー: 激安の冷凍魚介！', 'ハローズ: マグロの刺身が半額！',
-        'ハローズ: 瀬戸内産の新鮮な鯛が入荷！'
-    ],
-    'niku_info': [
-        'ハローズ: 黒毛和牛の特売セール！', 'ハローズ: 豚肉のこま切れがグラム98円！', 'ハローズ: BBQ用のお肉セット充実！',
-        'エブリイ: 地元産「もみじ鶏」のフェア！', 'エブリイ: 牛すじ肉で煮込み料理はいかが？', 'ハローズ: 国産豚バラブロック半額！',
-        'フレスタ: 熟成肉コーナーが自慢です。', 'フジ: 鶏むね肉まとめ買いでお得！', 'ハローズ: 黒毛和牛の特売セール！',
-        'フレスタ: 特選ソーセージ・ハムが充実！', 'ラ・ムー: 鶏肉の激安パック！', 'ハローズ: 国産豚バラブロック半額！',
-        'ハローズ: 黒毛和牛の特売セール！'
-    ],
-    'seika_info': [
-        'ハローズ: 旬の地元産イチゴが入荷！', 'ハローズ: 新鮮な春キャベツがお買い得！', 'ハローズ: 広島県産レモン大特価！',
-        'エブリイ: 地元農家直送の新鮮野菜！', 'エブリイ: 新玉ねぎの詰め放題を実施中！', 'ハローズ: 契約農家のトマトがお買い得！',
-        'フレスタ: オーガニック野菜コーナー！', 'フジ: 大粒ぶどうの試食会開催！', 'ハローズ: 旬の地元産イチゴが入荷！',
-        'フレスタ: 珍しい輸入野菜も！', 'ラ・ムー: 激安の袋入りもやし！', 'ハローズ: 契約農家のトマトがお買い得！',
-        'ハローズ: 新鮮な春キャベツがお買い得！'
-    ],
-    'brand': [
-        'ハローズ', 'ハローズ', 'ハローズ', 'エブリイ',
-        'エブリイ', 'ハローズ', 'フレスタ', 'フジ',
-        'ハローズ', 'フレスタ', 'ラ・ムー', 'ハローズ',
-        'ハローズ'
-    ]
+# 店舗データは generate_map.py と共通のカタログファイルから読み込む
+STORE_CATALOG_FILES = [os.path.join('data', 'stores_existing.csv')]
+
+# このアプリで使うロゴファイル（ブランド別）
+LOGO_FILES = {
+    'ハローズ': 'logo_harrows.png', 'エブリイ': 'logo_every.png', 'フレスタ': 'logo_fresta.png',
+    'フジ': 'logo_fuji.png', 'ラ・ムー': 'logo_lamu.png',
 }
-df = pd.DataFrame(SUPER_DATA)
+df = load_store_catalog(STORE_CATALOG_FILES, valid_brands=LOGO_FILES.keys())
+df['logo_file'] = df['brand'].map(LOGO_FILES)
 
 # --- 1. 設定と画像合成用フォルダの準備 ---
 LOGO_FOLDER = 'logos'
@@ -226,7 +168,7 @@ for index, row in df.iterrows():
         'sengyo': row['sengyo_info'],
         'niku': row['niku_info'],
         'seika': row['seika_info'],
-        'layer_id': marker._id, # Leaflet IDを記録
+        'marker': marker.get_name(), # マーカーを格納するJavaScriptの変数名
         'lat': row['lat'],
         'lon': row['lon'],
         'distance': 0 # 初期値
@@ -236,6 +178,8 @@ for index, row in df.iterrows():
 marker_data_json = json.dumps(marker_data_for_js)
 pin_colors_json = json.dumps(PIN_COLORS)
 fukuyama_center_json = json.dumps(FUKUYAMA_CENTER)
+# Foliumが地図を格納するJavaScriptの変数名
+map_var = m_temp.get_name()
 
 
 # 5. UI要素の定義とJavaScriptによる動的機能の追加 (Raw String f-stringを使用)
@@ -355,7 +299,7 @@ for brand, color in PIN_COLORS.items():
     app_ui_elements += f"""
     <div class="filter-item" onclick="document.getElementById('filter-{safe_brand_id}').checked = !document.getElementById('filter-{safe_brand_id}').checked; filterMarkers('{brand}', document.getElementById('filter-{safe_brand_id}').checked)">
         <label for="filter-{safe_brand_id}">
-            <input type="checkbox" id="filter-{safe_brand_id}" onchange="filterMarkers('{brand}', this.checked)">
+            <input type="checkbox" id="filter-{safe_brand_id}" data-brand="{brand}" onchange="filterMarkers('{brand}', this.checked)">
             <i class="fas fa-shopping-basket" style="color: {color};"></i> {brand}のみ表示
         </label>
     </div>
@@ -408,12 +352,14 @@ app_ui_elements += rf"""
 </div>
 
 <script>
-    const mapElement = window.{map_name};
+    let mapElement = null;
     const allMarkersData = {marker_data_json};
     const PIN_COLORS_JS = {pin_colors_json};
     const FUKUYAMA_CENTER_JS = {fukuyama_center_json};
     let currentFilteredBrands = new Set();
-    const layerControl = {{}};
+    // ブランド名 -> そのブランドのマーカーをまとめた L.layerGroup（起動時に1回だけ作成）
+    const brandLayers = {{}};
+    const markersById = new Map();
     // Base64化されたピン画像をグローバルに利用できるように定義
     const generated_pin_base64_js = {json.dumps(generated_pin_base64)};
 
@@ -424,18 +370,29 @@ app_ui_elements += rf"""
     const REFERENCE_POINT_NAME = "穴吹ビジネス専門学校";
     // ★★★ 基準点の定義ここまで ★★★
 
-    // Leaflet Layersをブランドごとにグループ化
-    mapElement.eachLayer(layer => {{
-        if(layer._leaflet_id && layer.options && layer.options.pane === 'markerPane') {{
-            const markerData = allMarkersData.find(d => d.layer_id === layer._leaflet_id);
-            if (markerData) {{
-                layerControl[markerData.brand] = layerControl[markerData.brand] || [];
-                layerControl[markerData.brand].push(layer);
-            }}
-        }}
-    }});
+    // マーカーを地図から外し、ブランドごとの L.layerGroup にまとめる
+    // 非表示のブランドはグループごと地図から外すので、パン・ズーム時の描画やクリック判定の対象にならない
+    function groupMarkersByBrand() {{
+        allMarkersData.forEach(store => {{
+            const marker = window[store.marker];
+            if (!marker) return;
+            mapElement.removeLayer(marker);
+            brandLayers[store.brand] = brandLayers[store.brand] || L.layerGroup();
+            brandLayers[store.brand].addLayer(marker);
+            markersById.set(store.id, marker);
+        }});
+        Object.keys(brandLayers).forEach(brand => currentFilteredBrands.add(brand));
+    }}
 
-    Object.keys(layerControl).forEach(brand => currentFilteredBrands.add(brand));
+    // 表示状態が変わったブランドのグループだけを地図に追加・地図から削除する
+    function applyBrandFilter() {{
+        Object.keys(brandLayers).forEach(brand => {{
+            const group = brandLayers[brand];
+            const visible = currentFilteredBrands.has(brand);
+            if (visible && !mapElement.hasLayer(group)) group.addTo(mapElement);
+            else if (!visible && mapElement.hasLayer(group)) mapElement.removeLayer(group);
+        }});
+    }}
 
     // 緯度経度から距離(メートル)を計算する関数 
     function getDistance(lat1, lon1, lat2, lon2) {{
@@ -451,6 +408,8 @@ app_ui_elements += rf"""
     }}
 
     $(document).ready(function() {{
+        mapElement = window.{map_var};
+        groupMarkersByBrand();
         filterMarkers('all', true); 
     }});
 
@@ -475,7 +434,7 @@ app_ui_elements += rf"""
 
     function filterMarkers(brandToFilter, isChecked) {{
         const filterAllCheckbox = document.getElementById('filter-all');
-        const allBrands = new Set(Object.keys(layerControl));
+        const allBrands = new Set(Object.keys(brandLayers));
 
         // フィルタリングロジック
         if (brandToFilter === 'all') {{
@@ -490,8 +449,7 @@ app_ui_elements += rf"""
                 
                 currentFilteredBrands = new Set(Array.from(document.querySelectorAll('.filter-item input[type="checkbox"]'))
                                             .filter(cb => cb.id !== 'filter-all' && cb.checked)
-                                            .map(cb => allMarkersData.find(d => 'filter-' + d.brand.replace(' ', '') === cb.id.replace('filter-', ''))?.brand)
-                                            .filter(b => b));
+                                            .map(cb => cb.dataset.brand));
             }}
         }} else {{
             const originalBrandName = brandToFilter;
@@ -519,16 +477,7 @@ app_ui_elements += rf"""
             currentFilteredBrands = new Set(allBrands);
         }}
 
-        allBrands.forEach(brand => {{
-            const opacity = currentFilteredBrands.has(brand) ? 1 : 0;
-            const zIndex = currentFilteredBrands.has(brand) ? 1000 : 0;
-            if (layerControl[brand]) {{
-                layerControl[brand].forEach(layer => {{
-                    layer.setOpacity(opacity);
-                    layer.setZIndexOffset(zIndex); 
-                }});
-            }}
-        }});
+        applyBrandFilter();
         
         // フィルター変更時に詳細パネルが開いていた場合、内容を更新する
         if ($('#details-panel').css('display') === 'flex') {{
@@ -566,22 +515,18 @@ app_ui_elements += rf"""
     // ★★★ 修正された locateUser() 関数 (デモモード) ★★★
 
 
-    function openMarkerPopup(lat, lon, layerId) {{
+    function openMarkerPopup(lat, lon, storeId) {{
         // クリック時のズームレベルを調整 (現在のズームレベルか14の大きい方)
         const currentZoom = mapElement.getZoom();
         const targetZoom = Math.max(currentZoom, 14);
 
         mapElement.setView([lat, lon], targetZoom); 
 
-        mapElement.eachLayer(layer => {{
-            if (layer._leaflet_id === layerId) {{
-                if (layer.openPopup) {{
-                    layer.openPopup();
-                    document.getElementById('details-panel').style.display = 'none';
-                    return; 
-                }}
-            }}
-        }});
+        const marker = markersById.get(storeId);
+        if (marker && mapElement.hasLayer(marker)) {{
+            marker.openPopup();
+            document.getElementById('details-panel').style.display = 'none';
+        }}
     }}
 
 
@@ -650,7 +595,7 @@ app_ui_elements += rf"""
 
 
                 listHTML += `
-                    <li onclick="openMarkerPopup(${{data.lat}}, ${{data.lon}}, ${{data.layer_id}})" style="border-left: 5px solid ${{brandColor}};">
+                    <li onclick="openMarkerPopup(${{data.lat}}, ${{data.lon}}, '${{data.id}}')" style="border-left: 5px solid ${{brandColor}};">
                         <img src="${{logoBase64Url}}" 
                              onerror="this.style.display='none'" 
                              style="height: 25px; width: 25px; object-fit: contain; flex-shrink: 0;">
@@ -4,17 +4,32 @@
 福山市内のスーパーマーケット店舗情報を地図上に表示し、
 インタラクティブなWebアプリケーションを生成します。
 """
+import argparse
 import pandas as pd
 import folium
+from folium.plugins import MarkerCluster
 from PIL import Image, ImageDraw, ImageFont
 import os
-import base64
-from io import BytesIO
 import json
 import logging
 import webview
-from typing import Dict, List, Optional, Tuple
-import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from asset_writer import ASSET_MODE_EXTERNAL, ASSET_MODE_INLINE, AssetWriter
+from brand_registry import INFO_KEYS, BrandRegistry
+from catalog import load_store_catalog
+from distance import DistanceEngine
+from html_writer import iter_json, write_map_html
+from leaflet_renderer import leaflet_libraries, write_leaflet_html
+from logo_assets import LogoThumbnailCache, PlaceholderLogoTask, render_placeholder_logo
+from parallel import TaskRunner
+from pin_compositor import PinCompositor
+from pin_encoder import BUDGET_FAIL, BUDGET_WARN, PIN_ENCODINGS, PinEncoder
+from precompress import precompress_artifacts
+from pwa import head_html, library_urls_to_cache, write_app_icons, write_manifest, write_service_worker
+from sprite_atlas import SpriteAtlas, pack_sprite_atlas, sprite_css
+from store_chunks import COORDINATE_DIGITS, StoreChunkUrls, write_store_chunks
+from vendor_assets import CLUSTER_LIBRARIES, FRONTEND_LIBRARIES, FrontendLibrary, apply_libraries, vendor_libraries
 
 # ロギング設定
 logging.basicConfig(
@@ -30,20 +45,89 @@ logger = logging.getLogger(__name__)
 
 # ファイル・フォルダ設定
 LOGO_FOLDER = 'logos'
+DATA_FOLDER = 'data'
+# 店舗カタログ（CSV / JSON Lines）。記載順に読み込んで結合する
+STORE_CATALOG_FILES = [
+    os.path.join(DATA_FOLDER, 'stores_existing.csv'),
+    os.path.join(DATA_FOLDER, 'stores_new.csv'),
+]
 PIN_BASE_IMAGE = 'pin_base.png'
+PIN_CACHE_FOLDER = '.pin_cache'
+LOGO_CACHE_FOLDER = '.logo_cache'
 OUTPUT_HTML_FILE = "supermarket_app_map_clickable_list.html"
+ASSETS_FOLDER = 'assets'  # 画像などを内容ハッシュ付きのファイル名で書き出すフォルダ
+ASSET_MODE = ASSET_MODE_INLINE  # 既定はHTML1ファイルで配布できるよう画像を埋め込む
+PRECOMPRESS_OUTPUT = True  # HTMLとアセットの .gz / .br を出力する
+# 店舗データをHTMLに埋め込まず、店舗一覧とブランドごとの詳細JSONに分けて出力する
+CHUNKED_OUTPUT = False
+# Leaflet などのライブラリをCDNから読み込まず、static フォルダに保存して参照する（オフライン用）
+VENDOR_LIBRARIES = False
+STATIC_FOLDER = 'static'
+VENDOR_CACHE_FOLDER = '.vendor_cache'
+# Webアプリマニフェストとサービスワーカーを出力する（ホーム画面への追加・オフライン表示用）
+PWA_OUTPUT = False
+APP_NAME = "SMAP - Supermarket Map App"
+APP_SHORT_NAME = "SMAP"
+APP_THEME_COLOR = '#667eea'
 
 # 地図設定
 FUKUYAMA_CENTER = [34.50, 133.37]
 MAP_NAME = "m_temp"
 MAP_ZOOM_START = 12
 
+# マーカーのクラスタリング（近くの店舗を1つの円にまとめ、ブランドごとの店舗数を表示する）
+CLUSTER_MARKERS = False
+CLUSTER_OPTIONS = {
+    'maxClusterRadius': 60,         # まとめる範囲（ピクセル）
+    'disableClusteringAtZoom': 16,  # このズーム以上では個別のピンを表示
+    'showCoverageOnHover': False,
+    'spiderfyOnMaxZoom': True,
+    'chunkedLoading': True,         # 店舗数が多い場合も描画中に画面を固めない
+}
+CLUSTER_BRAND_CHIPS = 3  # クラスターに店舗数を表示するブランドの数（多い順）
+
+# マーカーの出力方法
+MARKER_BACKEND_FOLIUM = 'folium'    # 店舗ごとに folium.Marker を出力する
+MARKER_BACKEND_GEOJSON = 'geojson'  # 全店舗を1つのGeoJSONとして出力し、ブラウザ側で1つのレイヤーに描画する
+MARKER_BACKEND = MARKER_BACKEND_FOLIUM
+
+# 地図ページの出力方法
+RENDERER_FOLIUM = 'folium'    # Foliumで地図を作成し、Foliumのテンプレートで出力する
+RENDERER_LEAFLET = 'leaflet'  # Foliumを使わず1つのテンプレートから出力する（マーカーはブラウザ側で作成）
+RENDERER = RENDERER_FOLIUM
+LEAFLET_MAP_VAR = f"map_{MAP_NAME}"
+LEAFLET_MARKER_LAYER_VAR = 'store_marker_layer'
+# ブラウザ側で作成するマーカーを、ピン画像の代わりにブランド色の円として canvas に描画する
+CANVAS_MARKERS = False
+# 表示範囲（と周囲の余白）にある店舗のマーカーだけを地図に載せる（ブラウザ側で作成するマーカーのみ）
+# 範囲外に出たマーカーは地図から外し、範囲に入った別の店舗のマーカーとして再利用する
+CULL_MARKERS = False
+CULL_GRID_DEGREES = 0.02  # 店舗を振り分ける格子の一辺（度。約2km）
+CULL_PADDING = 0.25       # 表示範囲の外側に載せる余白（表示範囲の大きさに対する割合）
+# 詳細度の切り替え: 引いた表示ではブランド色の円を canvas に描画し、LOD_ZOOM 以上でロゴのピンに切り替える
+LOD_MARKERS = False
+LOD_ZOOM = 14
+
+# 画像生成の並列プロセス数（None: CPU数, 1: 直列）
+IMAGE_WORKERS: Optional[int] = None
+
 # 画像設定
-LOGO_SIZE = (60, 60)
-PIN_SIZE = (100, 100)
+LOGO_SIZE = (48, 48)  # 正規化済みロゴの大きさ（PIN_VARIANTS の最大のロゴサイズ）
+PIN_SIZE = (100, 100)  # ピンベース画像（形状のマスク）のサイズ
 ICON_SIZE = (40, 40)
 ICON_ANCHOR = (20, 40)
 
+# 配信するピン画像: デバイスピクセル比 -> (ピンサイズ, ロゴサイズ)
+# 1x は地図上の表示サイズ（ICON_SIZE）と一致させ、ブラウザでの縮小を不要にする
+PIN_VARIANTS: Dict[int, Tuple[Tuple[int, int], Tuple[int, int]]] = {
+    1: ((40, 40), (24, 24)),
+    2: ((80, 80), (48, 48)),
+}
+
+# ピン画像のエンコード設定（pin_encoder.PIN_ENCODINGS を参照）
+PIN_ENCODING = 'png-palette'
+PIN_BYTE_BUDGET = 8 * 1024  # 1ピンあたりの上限（バイト）
+
 # 基準点設定
 INITIAL_REFERENCE_LAT = 34.49178298
 INITIAL_REFERENCE_LON = 133.3690471
@@ -87,262 +171,43 @@ FONT_PATHS = {
 }
 FONT_SIZE = 30
 
-# ============================================================================
-# データ定義
-# ============================================================================
-
-# 既存データ
-EXISTING_DATA = {
-    'name': [
-        'ハローズ 御幸店', 'ハローズ 神辺モール店', 'ハローズ 南駅家店', 'エブリイ 駅家店',
-        'エブリイ 緑町店', 'ハローズ 緑町店', 'フレスタ アイネス店', 'フジ 福山三吉店',
-        'ハローズ 山手店', 'フレスタ 蔵王店', 'ラ・ムー 駅家店', 'ハローズ 伊勢丘店',
-        'ハローズ 新涯店'
-    ],
-    'lat': [
-        34.547245, 34.542857, 34.544033, 34.538313,
-        34.477490, 34.476470, 34.487743, 34.493521,
-        34.492559, 34.498787, 34.542412,
-        34.502842,
-        34.461328
-    ],
-    'lon': [
-        133.347939, 133.363893, 133.330316, 133.331962,
-        133.372590, 133.371601, 133.362712, 133.375035,
-        133.333259, 133.392526, 133.326149,
-        133.422737,
-        133.392132
-    ],
-    'logo_file': [
-        'logo_ハローズ.png', 'logo_ハローズ.png', 'logo_ハローズ.png', 'logo_エブリイ.png',
-        'logo_エブリイ.png', 'logo_ハローズ.png', 'logo_フレスタ.png', 'logo_フジ.png',
-        'logo_ハローズ.png', 'logo_フレスタ.png', 'logo_ラ・ムー.png', 'logo_ハローズ.png',
-        'logo_ハローズ.png'
-    ],
-    'website': [
-        'https://www.halows.com/', 'https://www.halows.com/', 'https://www.halows.com/', 'https://www.super-every.co.jp/',
-        'https://www.super-every.co.jp/', 'https://www.halows.com/', 'https://www.fresta.co.jp/', 'https://www.the-fuji.com/',
-        'https://www.halows.com/', 'https://www.fresta.co.jp/', 'https://www.e-dkt.co.jp/',
-        'https://www.halows.com/',
-        'https://www.halows.com/'
-    ],
-    'souzai_info': [
-        'ハローズ: 本日の目玉は鶏の唐揚げ！', 'ハローズ: 出来立てのお好み焼きがあります！', 'ハローズ: 特製カツ丼がおすすめ！',
-        'エブリイ: 地元の人気弁当が豊富です。', 'エブリイ: サラダ・デリが充実！', 'ハローズ: 特製オムライスが20%OFF！',
-        'フレスタ: 自社製パンが人気です。', 'フジ: 手作りおにぎりコーナー！', 'ハローズ: ローストビーフ丼が数量限定！',
-        'フレスタ: 季節のパスタフェア開催中！', 'ラ・ムー: 驚きの100円たこ焼き！', 'ハローズ: 本日の目玉は鶏の唐揚げ！',
-        'ハローズ: 特製オムライスが20%OFF！'
-    ],
-    'sengyo_info': [
-        'ハローズ: 瀬戸内産の新鮮な鯛が入荷！', 'ハローズ: お刺身盛り合わせがお得！', 'ハローズ: 週末限定マグロの解体！',
-        'エブリイ: 干物が充実しています。', 'エブリイ: 本日のアジの開きがおすすめ！', 'ハローズ: マグロの刺身が半額！',
-        'フレスタ: 鮮魚コーナーに産直品！', 'フジ: 新鮮なカツオのたたき！', 'ハローズ: 瀬戸内産の新鮮な鯛が入荷！',
-        'フレスタ: 新鮮なブリが入荷！', 'ラ・ムー: 激安の冷凍魚介！', 'ハローズ: マグロの刺身が半額！',
-        'ハローズ: 瀬戸内産の新鮮な鯛が入荷！'
-    ],
-    'niku_info': [
-        'ハローズ: 黒毛和牛の特売セール！', 'ハローズ: 豚肉のこま切れがグラム98円！', 'ハローズ: BBQ用のお肉セット充実！',
-        'エブリイ: 地元産「もみじ鶏」のフェア！', 'エブリイ: 牛すじ肉で煮込み料理はいかが？', 'ハローズ: 国産豚バラブロック半額！',
-        'フレスタ: 熟成肉コーナーが自慢です。', 'フジ: 鶏むね肉まとめ買いでお得！', 'ハローズ: 黒毛和牛の特売セール！',
-        'フレスタ: 特選ソーセージ・ハムが充実！', 'ラ・ムー: 鶏肉の激安パック！', 'ハローズ: 国産豚バラブロック半額！',
-        'ハローズ: 黒毛和牛の特売セール！'
-    ],
-    'seika_info': [
-        'ハローズ: 旬の地元産イチゴが入荷！', 'ハローズ: 新鮮な春キャベツがお買い得！', 'ハローズ: 広島県産レモン大特価！',
-        'エブリイ: 地元農家直送の新鮮野菜！', 'エブリイ: 新玉ねぎの詰め放題を実施中！', 'ハローズ: 契約農家のトマトがお買い得！',
-        'フレスタ: オーガニック野菜コーナー！', 'フジ: 大粒ぶどうの試食会開催！', 'ハローズ: 旬の地元産イチゴが入荷！',
-        'フレスタ: 珍しい輸入野菜も！', 'ラ・ムー: 激安の袋入りもやし！', 'ハローズ: 契約農家のトマトがお買い得！',
-        'ハローズ: 新鮮な春キャベツがお買い得！'
-    ],
-    'brand': [
-        'ハローズ', 'ハローズ', 'ハローズ', 'エブリイ',
-        'エブリイ', 'ハローズ', 'フレスタ', 'フジ',
-        'ハローズ', 'フレスタ', 'ラ・ムー', 'ハローズ',
-        'ハローズ'
-    ]
-}
-
-# 追加データ
-NEW_DATA = {
-    'name': [
-        'ハローズ 神辺店', 'ハローズ 戸手店', 'ハローズ 春日店', 'ハローズ 引野店', 'ハローズ 東福山店',
-        'ハローズ 手城店', 'ハローズ 水呑店', 'ハローズ 南松永店', 'ハローズ 沼南店',
-        'エブリイ 松永店', 'エブリイ瀬戸店', 'エブリイ御幸店', 'エブリイ神辺店', 'エブリイ本庄店',
-        'エブリイ蔵王店', 'エブリイ川口店', 'エブリイ伊勢丘店',
-        'フレスタ 福山三吉店', 'フレスタ 北吉津店', 'フレスタ 草戸店', 'フレスタ 多治米店',
-        '業務スーパー新市店', 'ラ・ムー 松永店', 'ラ・ムー 手城店', 'ディオ 福山南店',
-        'フジグラン神辺 食品館', 'オンリーワン 駅家店', 'オンリーワン 千田店', 'オンリーワン 旭ヶ丘店',
-        'オンリーワン 木之庄店', 'オンリーワン 山手店', 'オンリーワン 瀬戸店',
-        'ゆめタウン 蔵王', 'ゆめタウン福山', 'ザ・ビッグ 神辺店', 'ザ・ビッグ大門店',
-        'ミスターマックス新神辺店',
-        'なかやま牧場 ハート新徳田店', 'なかやま牧場 ハート加茂店', 'なかやま牧場［ﾊｰﾄ坪生店］', 'なかやま牧場 引野店',
-        'なかやま牧場 ハート木之庄店', 'なかやま牧場 ハート新涯店',
-        'マルナカ 加茂店', 'Ａ−プライス 福山店',
-        'ニチエー 柳津店', 'ニチエー さんらいず店', 'ニチエー 瀬戸店', 'ニチエー 沼南店',
-        '生鮮食品 おだ 春日店'
-    ],
-    'lat': [
-        34.549238, 34.549010, 34.511183, 34.500121, 34.490001,
-        34.484085, 34.446823, 34.443160, 34.387728,
-        34.442332, 34.475457, 34.540975, 34.547862, 34.486838,
-        34.503659, 34.468972, 34.504264,
-        34.495523, 34.497068, 34.478892, 34.468429,
-        34.545228, 34.446731, 34.483819, 34.465147,
-        34.545245, 34.549297, 34.518545, 34.492134,
-        34.496204, 34.494895, 34.471791,
-        34.504926, 34.487064, 34.557168, 34.494797,
-        34.540661,
-        34.548747, 34.568176, 34.527446, 34.496260,
-        34.498596, 34.454583,
-        34.560882, 34.494565,
-        34.439995, 34.453543, 34.473304, 34.386952,
-        34.510628
-    ],
-    'lon': [
-        133.377984, 133.283165, 133.415063, 133.406021, 133.410593,
-        133.392729, 133.386847, 133.254940, 133.323727,
-        133.251304, 133.317128, 133.348727, 133.382452, 133.350845,
-        133.394152, 133.383982, 133.423391,
-        133.378392, 133.365369, 133.360637, 133.370928,
-        133.293464, 133.243272, 133.398270, 133.383363,
-        133.357068, 133.326900, 133.365520, 133.422231,
-        133.353517, 133.337047, 133.314893,
-        133.400447, 133.378583, 133.389616, 133.438232,
-        133.362873,
-        133.371937, 133.346001, 133.439373, 133.400904,
-        133.354959, 133.393429,
-        133.347027, 133.397965,
-        133.263470, 133.256207, 133.314423, 133.324780,
-        133.413331
-    ],
-    'brand': [
-        'ハローズ', 'ハローズ', 'ハローズ', 'ハローズ', 'ハローズ',
-        'ハローズ', 'ハローズ', 'ハローズ', 'ハローズ',
-        'エブリイ', 'エブリイ', 'エブリイ', 'エブリイ', 'エブリイ',
-        'エブリイ', 'エブリイ', 'エブリイ',
-        'フレスタ', 'フレスタ', 'フレスタ', 'フレスタ',
-        '業務スーパー', 'ラ・ムー', 'ラ・ムー', 'ディオ',
-        'フジ', 'オンリーワン', 'オンリーワン', 'オンリーワン',
-        'オンリーワン', 'オンリーワン', 'オンリーワン',
-        'ゆめタウン', 'ゆめタウン', 'ザ・ビッグ', 'ザ・ビッグ',
-        'ミスターマックス',
-        'なかやま牧場', 'なかやま牧場', 'なかやま牧場', 'なかやま牧場',
-        'なかやま牧場', 'なかやま牧場',
-        'マルナカ', 'Ａ−プライス',
-        'ニチエー', 'ニチエー', 'ニチエー', 'ニチエー',
-        '生鮮食品 おだ'
-    ]
-}
-
 # ============================================================================
 # データ処理関数
 # ============================================================================
 
-def normalize_brand_name(brand: str) -> str:
+def prepare_data() -> Tuple[pd.DataFrame, BrandRegistry]:
     """
-    ブランド名を正規化する（ファイル名などに使用）
+    店舗カタログを読み込み、未記入の情報を補完してDataFrameを作成
     
-    Args:
-        brand: ブランド名
-        
-    Returns:
-        正規化されたブランド名
-    """
-    return brand.lower().replace(' ', '').replace('［', '').replace('］', '').replace('−', '')
-
-
-def fill_info(brand: str, data_key: str) -> str:
-    """
-    追加データに不足している情報を既存データから補完する
+    基準点からの距離（distance_from_reference）も合わせて計算します。
     
-    Args:
-        brand: ブランド名
-        data_key: 補完するデータのキー
-        
     Returns:
-        補完された情報
+        店舗データのDataFrameと、そこから集計したブランドレジストリ
     """
-    existing_brand_indices = [
-        i for i, b in enumerate(EXISTING_DATA['brand']) if b == brand
-    ]
-    safe_brand_name = normalize_brand_name(brand)
-    
-    if data_key == 'logo_file':
-        if existing_brand_indices:
-            return EXISTING_DATA['logo_file'][existing_brand_indices[0]]
-        return f"logo_{safe_brand_name}.png"
-            
-    if data_key == 'website':
-        return DEFAULT_WEBSITE
-        
-    if existing_brand_indices:
-        return EXISTING_DATA[data_key][existing_brand_indices[0]]
-        
-    return DEFAULT_INFO_TEMPLATE.format(brand=brand)
-
-
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    2点間の距離を計算（Haversine formula）
-    
-    Args:
-        lat1, lon1: 第1点の緯度・経度
-        lat2, lon2: 第2点の緯度・経度
-        
-    Returns:
-        距離（メートル）
-    """
-    R = 6371  # 地球の半径（km）
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    a = (
-        math.sin(d_lat / 2) ** 2 +
-        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-        math.sin(d_lon / 2) ** 2
+    df = load_store_catalog(STORE_CATALOG_FILES, valid_brands=PIN_COLORS.keys())
+    registry = BrandRegistry.from_catalog(
+        df, PIN_COLORS, DEFAULT_PIN_COLOR, DEFAULT_INFO_TEMPLATE
     )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c * 1000  # メートルに変換
-
 
-def prepare_data() -> pd.DataFrame:
-    """
-    既存データと追加データを結合してDataFrameを作成
-    
-    Returns:
-        結合された店舗データのDataFrame
-    """
-    # 追加データにロゴファイルと情報を補完
-    info_keys = ['logo_file', 'website', 'souzai_info', 'sengyo_info', 'niku_info', 'seika_info']
-    for data_key in info_keys:
-        NEW_DATA[data_key] = [
-            fill_info(brand, data_key) for brand in NEW_DATA['brand']
+    # 未記入のロゴファイルと情報をブランドの既定値で補完
+    brand_infos = [registry[brand] for brand in df['brand']]
+    df['logo_file'] = [
+        value or info.logo_file for value, info in zip(df['logo_file'], brand_infos)
+    ]
+    # 個別サイトが未記入の店舗は、従来どおり共通サイトを案内する
+    df['website'] = [value or DEFAULT_WEBSITE for value in df['website']]
+    for data_key in INFO_KEYS:
+        df[data_key] = [
+            value or info.info[data_key] for value, info in zip(df[data_key], brand_infos)
         ]
-    
-    # データの結合
-    df = pd.concat(
-        [pd.DataFrame(EXISTING_DATA), pd.DataFrame(NEW_DATA)],
-        ignore_index=True
-    )
-    return df
 
+    # 穴吹ビジネス専門学校から各店舗までの距離を一括計算
+    distance_engine = DistanceEngine.from_dataframe(df)
+    df['distance_from_reference'] = distance_engine.distances_from(
+        INITIAL_REFERENCE_LAT, INITIAL_REFERENCE_LON
+    )
+    return df, registry
 
-# データの準備
-df = prepare_data()
-
-# 穴吹ビジネス専門学校から各店舗までの距離を事前計算
-df['distance_from_reference'] = df.apply(
-    lambda row: calculate_distance(
-        INITIAL_REFERENCE_LAT, INITIAL_REFERENCE_LON,
-        row['lat'], row['lon']
-    ),
-    axis=1
-)
-
-# ============================================================================
-# ファイル・フォルダ準備
-# ============================================================================
-
-os.makedirs(LOGO_FOLDER, exist_ok=True)
 
 # ============================================================================
 # 画像生成関数
@@ -384,246 +249,529 @@ def get_font_path() -> Optional[str]:
     return None
 
 
-def create_placeholder_logo(brand_name: str, size: Tuple[int, int] = LOGO_SIZE) -> None:
+def prepare_images(registry: BrandRegistry, runner: TaskRunner) -> None:
     """
-    ブランド名の頭文字を中央に配置した代替ロゴ画像を生成
+    必要な画像ファイルを準備（ピンベースとロゴプレースホルダー）
+    
+    ロゴファイルが見つからないブランドは、頭文字入りの代替ロゴを生成します。
     
     Args:
-        brand_name: ブランド名
-        size: ロゴサイズ（デフォルト: LOGO_SIZE）
+        registry: ブランドレジストリ
+        runner: 代替ロゴの生成に使う実行器
     """
-    try:
-        logo_filename = df[df['brand'] == brand_name]['logo_file'].iloc[0]
-        logo_path = os.path.join(LOGO_FOLDER, logo_filename)
-        
-        if os.path.exists(logo_path):
-            return
+    create_pin_base_image()
 
+    font_path = get_font_path()
+    tasks: Dict[str, PlaceholderLogoTask] = {}
+    for brand_info in registry:
+        logo_path = os.path.join(LOGO_FOLDER, brand_info.logo_file)
+        if logo_path in tasks or os.path.exists(logo_path):
+            continue
         logger.warning(
-            f"ロゴファイル '{logo_filename}' が見つかりませんでした。"
+            f"ロゴファイル '{brand_info.logo_file}' が見つかりませんでした。"
             f"代替画像を生成します。"
         )
+        tasks[logo_path] = PlaceholderLogoTask(
+            brand_info.name, brand_info.color, LOGO_SIZE, font_path, FONT_SIZE
+        )
 
-        img = Image.new('RGBA', size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(img)
-        
-        pin_color = PIN_COLORS.get(brand_name, DEFAULT_PIN_COLOR)
-        draw.ellipse((0, 0, size[0], size[1]), fill=pin_color)
-        
-        initial = brand_name[0]
-        
-        # フォントの読み込み
-        font = ImageFont.load_default()
-        font_path = get_font_path()
-        if font_path:
-            try:
-                font = ImageFont.truetype(font_path, FONT_SIZE)
-            except Exception:
-                logger.warning(f"フォント '{font_path}' の読み込みに失敗しました。デフォルトフォントを使用します。")
-        
-        fill_color = "#FFFFFF"
-        
-        # テキストの中央配置
-        if hasattr(draw, 'textbbox'):
-            text_bbox = draw.textbbox((0, 0), initial, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-            x = (size[0] - text_width) // 2
-            y = (size[1] - text_height) // 2
-            draw.text((x, y), initial, font=font, fill=fill_color)
-        else:
-            draw.text(
-                (size[0] // 4, size[1] // 4),
-                initial,
-                fill=fill_color,
-                font=font
-            )
-
-        img.save(logo_path)
-        logger.info(f"代替ロゴを生成しました: {logo_path}")
-        
-    except Exception as e:
-        logger.error(f"代替ロゴファイルの生成に失敗しました (ブランド: {brand_name}): {e}")
-
-
-def prepare_images() -> None:
-    """
-    必要な画像ファイルを準備（ピンベースとロゴプレースホルダー）
-    """
-    create_pin_base_image()
-    for brand in df['brand'].unique():
-        create_placeholder_logo(brand)
-
-
-# 画像の準備
-prepare_images()
+    results = runner.map(render_placeholder_logo, tasks.values())
+    for (logo_path, task), result in zip(tasks.items(), results):
+        for message in result.warnings:
+            logger.warning(message)
+        try:
+            if result.data is None:
+                raise RuntimeError(result.error)
+            with open(logo_path, 'wb') as f:
+                f.write(result.data)
+            logger.info(f"代替ロゴを生成しました: {logo_path}")
+        except Exception as e:
+            logger.error(f"代替ロゴファイルの生成に失敗しました (ブランド: {task.brand_name}): {e}")
 
 
 # ============================================================================
 # ピン画像生成関数
 # ============================================================================
 
-def create_logo_pin_base64(
-    logo_path: str,
-    pin_base_path: str,
-    pin_color: str = DEFAULT_PIN_COLOR,
-    logo_size: Tuple[int, int] = LOGO_SIZE
-) -> Optional[str]:
+def prepare_logo_thumbnails(registry: BrandRegistry, runner: TaskRunner) -> Dict[str, str]:
     """
-    ロゴとピンベースを合成してBase64エンコードされた画像を生成
+    各ブランドのロゴを1回だけ正規化し、LOGO_SIZE のサムネイルを用意する
+    
+    元のロゴは数百KBのものもあるため、以降の処理はすべてサムネイルを読み込みます。
+    サムネイルは LOGO_CACHE_FOLDER に保存し、元画像が変わらない限り再利用します。
     
     Args:
-        logo_path: ロゴ画像のパス
-        pin_base_path: ピンベース画像のパス
-        pin_color: ピンの色
-        logo_size: ロゴサイズ
+        registry: ブランドレジストリ
+        runner: 正規化に使う実行器
         
     Returns:
-        Base64エンコードされた画像文字列、失敗時はNone
+        ロゴファイル名とサムネイルのパスの対応
     """
-    try:
-        pin_base = Image.open(pin_base_path).convert("RGBA").resize(
-            PIN_SIZE, Image.LANCZOS
-        )
-        logo_img = Image.open(logo_path).convert("RGBA").resize(
-            logo_size, Image.LANCZOS
-        )
-
-        # カラー付きピンシェイプの作成
-        colored_background = Image.new('RGBA', pin_base.size, pin_color)
-        pin_mask = pin_base.split()[-1]
-        colored_pin_shape = Image.new('RGBA', pin_base.size, (0, 0, 0, 0))
-        colored_pin_shape.paste(colored_background, (0, 0), pin_mask)
-
-        # ロゴを中央に配置（少し上にオフセット）
-        x_offset = (colored_pin_shape.width - logo_img.width) // 2
-        y_offset = (colored_pin_shape.height - logo_img.height) // 2 - 10
-        final_pin = colored_pin_shape.copy()
-        final_pin.paste(logo_img, (x_offset, y_offset), logo_img)
-
-        # Base64エンコード
-        buffered = BytesIO()
-        final_pin.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+    cache = LogoThumbnailCache(LOGO_SIZE, LOGO_CACHE_FOLDER)
+    sources = {
+        brand_info.logo_file: os.path.join(LOGO_FOLDER, brand_info.logo_file)
+        for brand_info in registry
+    }
+    thumbnails = cache.prepare(sources.values(), runner)
+
+    logger.info(
+        f"ロゴサムネイル: {len(thumbnails)}件 (正規化 {cache.stats['normalized']}件, "
+        f"キャッシュ再利用 {cache.stats['hits']}件)"
+    )
+    return {
+        logo_file: thumbnails[source_path]
+        for logo_file, source_path in sources.items() if source_path in thumbnails
+    }
+
+
+def generate_all_pin_images(
+    df: pd.DataFrame,
+    registry: BrandRegistry,
+    logo_thumbnails: Dict[str, str],
+    runner: TaskRunner
+) -> Tuple[Dict[int, str], Dict[int, Dict[str, bytes]]]:
+    """
+    全店舗のピン画像を PIN_VARIANTS の各解像度で生成し、見た目が同じピンを共有する形でまとめる
+    
+    同じ内容のピン（同一ブランドの店舗など）は1回だけ合成し、
+    合成結果は PIN_CACHE_FOLDER に保存して次回以降のビルドでも再利用します。
+    
+    Args:
+        df: 店舗データのDataFrame
+        registry: ブランドレジストリ
+        logo_thumbnails: ロゴファイル名と正規化済みサムネイルのパスの対応
+        runner: ピン画像の合成に使う実行器
         
-    except Exception as e:
-        logger.error(f"ピン画像合成中にエラーが発生しました: {e}. 単色ピンを使用します。")
-        return create_solid_color_pin(pin_color)
+    Returns:
+        インデックスをキー、ピン画像キーを値とする辞書と、
+        デバイスピクセル比ごとの「ピン画像キー -> PNGバイト列」の辞書
+        （ピン画像キーは1xのキャッシュキーで、全解像度で共通）
+    """
+    requests = [
+        (logo_thumbnails.get(logo_file, os.path.join(LOGO_FOLDER, logo_file)), registry[brand].color)
+        for logo_file, brand in zip(df['logo_file'], df['brand'])
+    ]
+    compositors = {
+        scale: PinCompositor(PIN_BASE_IMAGE, pin_size, logo_size, cache_dir=PIN_CACHE_FOLDER)
+        for scale, (pin_size, logo_size) in PIN_VARIANTS.items()
+    }
+    pin_ids = [compositors[min(compositors)].pin_key(*request) for request in requests]
+
+    variant_pins: Dict[int, Dict[str, bytes]] = {}
+    for scale, compositor in compositors.items():
+        rendered = compositor.render_many(requests, runner)
+        pins: Dict[str, bytes] = {}
+        for pin_id, request in zip(pin_ids, requests):
+            png = rendered.get(compositor.pin_key(*request))
+            if png is not None:
+                pins.setdefault(pin_id, png)
+        variant_pins[scale] = pins
+
+    # 全解像度が揃ったピンだけを使う
+    store_pin_keys = {
+        index: pin_id for index, pin_id in zip(df.index, pin_ids)
+        if all(pin_id in pins for pins in variant_pins.values())
+    }
+    unique_ids = dict.fromkeys(store_pin_keys.values())
+    variant_pins = {
+        scale: {pin_id: pins[pin_id] for pin_id in unique_ids}
+        for scale, pins in variant_pins.items()
+    }
+
+    composited = sum(c.stats['composited'] for c in compositors.values())
+    disk_hits = sum(c.stats['disk_hits'] for c in compositors.values())
+    logger.info(
+        f"ピン画像: {len(unique_ids)}種類 x {len(variant_pins)}解像度 (合成 {composited}件, "
+        f"キャッシュ再利用 {disk_hits}件) を{len(store_pin_keys)}店舗で共有"
+    )
+    return store_pin_keys, variant_pins
 
 
-def create_solid_color_pin(pin_color: str) -> Optional[str]:
+def build_pin_sprites(
+    variant_pins: Dict[int, Dict[str, bytes]],
+    encoder: PinEncoder,
+    assets: AssetWriter
+) -> Tuple[SpriteAtlas, str]:
     """
-    単色のピン画像を生成（フォールバック用）
+    ピン画像を解像度ごとに1枚のスプライトアトラスにまとめ、表示用のCSSを生成
+    
+    アトラスを指定の方式でエンコードし、ピン数分の予算（1ピンあたりの予算 × セル数）に
+    収まるかを確認します。
+    全解像度のアトラスは同じ並び順なので、CSSクラスは共通です。
     
     Args:
-        pin_color: ピンの色
+        variant_pins: デバイスピクセル比ごとの「ピン画像キー -> PNGバイト列」
+        encoder: ピン画像のエンコーダー
+        assets: アトラス画像の書き出し先
         
     Returns:
-        Base64エンコードされた画像文字列、失敗時はNone
+        1xのスプライトアトラスと、アトラス画像を参照するCSS
     """
-    try:
-        img = Image.new('RGBA', PIN_SIZE, (0, 0, 0, 0))
-        ImageDraw.Draw(img).ellipse(
-            (0, 0, PIN_SIZE[0] - 1, PIN_SIZE[1] - 1),
-            fill=pin_color
+    atlases: Dict[int, SpriteAtlas] = {}
+    image_urls: Dict[int, str] = {}
+    for scale, pins in variant_pins.items():
+        atlas = pack_sprite_atlas(pins, PIN_VARIANTS[scale][0])
+        encoded = encoder.encode(
+            atlas.png, label=f"スプライトアトラス@{scale}x", pin_count=len(atlas.slots)
         )
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
-    except Exception as e:
-        logger.error(f"単色ピン生成に失敗しました: {e}")
-        return None
+        atlases[scale] = atlas
+        image_urls[scale] = assets.url(
+            f"pins-{scale}x", encoded.data, encoded.mime_type, encoded.extension
+        )
+        logger.info(
+            f"スプライトアトラス@{scale}x: {atlas.columns}x{atlas.rows} ({len(encoded.data):,} bytes)"
+        )
+    encoder.log_summary()
 
+    atlas = atlases[min(atlases)]
+    return atlas, sprite_css(atlas, image_urls)
 
-def generate_all_pin_images() -> Dict[int, str]:
+
+# ============================================================================
+# 地図・UI生成関数
+# ============================================================================
+
+def build_map(
+    df: pd.DataFrame,
+    store_pin_keys: Dict[int, str],
+    pin_atlas: SpriteAtlas,
+    libraries: List[FrontendLibrary] = FRONTEND_LIBRARIES,
+    with_markers: bool = True,
+    cluster: bool = False
+) -> Tuple[folium.Map, folium.MacroElement, List[dict]]:
     """
-    全店舗のピン画像を生成し、Base64として辞書に格納
+    Foliumマップを作成し、全店舗のマーカーを追加
+    
+    ポップアップは出力せず、ブラウザ側で開いた時点に店舗データから作成します。
     
+    Args:
+        df: 店舗データのDataFrame
+        store_pin_keys: 店舗インデックスとピン画像キーの対応
+        pin_atlas: ピン画像のスプライトアトラス
+        libraries: 読み込むフロントエンドライブラリ
+        with_markers: Falseの場合はマーカーを追加しない（分割出力モードではブラウザ側で作成する）
+        cluster: Trueの場合はマーカーをクラスターにまとめる
+        
     Returns:
-        インデックスをキー、Base64画像URLを値とする辞書
+        マップ、マーカーの追加先（マップまたはクラスター）、JavaScriptに渡す店舗データのリスト
     """
-    generated_pin_base64: Dict[int, str] = {}
+    # 地図をクリック可能にするために、folium.Mapのデフォルトのフォールバックレイヤーを設定
+    m_temp = folium.Map(location=FUKUYAMA_CENTER, zoom_start=MAP_ZOOM_START, name=MAP_NAME)
+    apply_libraries(m_temp, libraries)
+    marker_layer = m_temp
+    if cluster:
+        marker_layer = MarkerCluster(
+            control=False, icon_create_function='createBrandClusterIcon', **CLUSTER_OPTIONS
+        ).add_to(m_temp)
+        # ライブラリは CLUSTER_LIBRARIES としてマップ側で読み込む（--vendor の置き換えを上書きしない）
+        marker_layer.default_js = []
+        marker_layer.default_css = []
+
+    marker_data_for_js = []
+    if not with_markers:
+        return m_temp, marker_layer, marker_data_for_js
+
     for index, row in df.iterrows():
-        logo_path = os.path.join(LOGO_FOLDER, row['logo_file'])
-        pin_color = PIN_COLORS.get(row['brand'], DEFAULT_PIN_COLOR)
-        b64_image = create_logo_pin_base64(logo_path, PIN_BASE_IMAGE, pin_color)
-        if b64_image:
-            generated_pin_base64[index] = f"data:image/png;base64,{b64_image}"
-    return generated_pin_base64
+        pin_key = store_pin_keys.get(index)
+        pin_class = pin_atlas.class_name(pin_key) if pin_key else ''
 
+        if pin_key:
+            # ピン画像はスプライトアトラスからCSSで切り出す（店舗ごとの画像埋め込みなし）
+            icon = folium.DivIcon(icon_size=ICON_SIZE, icon_anchor=ICON_ANCHOR, class_name=pin_class)
+        else:
+            icon = folium.Icon(color='gray', icon='info', prefix='fa')
+
+        marker = folium.Marker(
+            location=[row['lat'], row['lon']],
+            icon=icon,
+            tooltip=row['name'],
+            brand=row['brand']  # クラスターのブランド別店舗数の集計に使う
+        ).add_to(marker_layer)
+
+        marker_data_for_js.append({
+            'id': f'marker-{index}',
+            'name': row['name'],
+            'brand': row['brand'],
+            'website': row['website'],
+            'souzai': row['souzai_info'],
+            'sengyo': row['sengyo_info'],
+            'niku': row['niku_info'],
+            'seika': row['seika_info'],
+            'marker': marker.get_name(),  # マーカーのJavaScript変数名
+            'lat': row['lat'],
+            'lon': row['lon'],
+            'distance': int(row['distance_from_reference']),  # 事前計算された距離（メートル）
+            'pin_class': pin_class
+        })
+
+    return m_temp, marker_layer, marker_data_for_js
+
+
+# 最寄り店舗の順位付けを行う Web Worker のスクリプト
+# 店舗の緯度経度は初期化時に型付き配列で受け取り、基準点ごとの距離計算と
+# 上位k件の選択（k件のヒープによる部分選択）だけを行います。
+NEAREST_WORKER_JS = r"""
+const RAD = Math.PI / 180;
+const EARTH_RADIUS_M = 6371000;
+let storeLat = null;
+let storeLon = null;
+let storeCosLat = null;
+let brandStores = [];  // ブランド番号 -> 店舗番号の配列
+let allStores = null;
+
+function init(data) {
+    storeLat = data.lat;
+    storeLon = data.lon;
+    const n = storeLat.length;
+    storeCosLat = new Float64Array(n);
+    const counts = [];
+    for (let i = 0; i < n; i++) {
+        storeCosLat[i] = Math.cos(storeLat[i] * RAD);
+        counts[data.brand[i]] = (counts[data.brand[i]] || 0) + 1;
+    }
+    brandStores = counts.map(count => new Int32Array(count));
+    const filled = counts.map(() => 0);
+    allStores = new Int32Array(n);
+    for (let i = 0; i < n; i++) {
+        allStores[i] = i;
+        const b = data.brand[i];
+        brandStores[b][filled[b]++] = i;
+    }
+}
 
-# 全ピン画像の生成
-generated_pin_base64 = generate_all_pin_images()
+// 候補の店舗それぞれについて、基準点からの距離（メートル、ハバーサイン）を計算
+function distancesFrom(lat, lon, candidates) {
+    const distances = new Float64Array(candidates.length);
+    const cosLat = Math.cos(lat * RAD);
+    for (let j = 0; j < candidates.length; j++) {
+        const i = candidates[j];
+        const sinLat = Math.sin((storeLat[i] - lat) * RAD / 2);
+        const sinLon = Math.sin((storeLon[i] - lon) * RAD / 2);
+        const a = sinLat * sinLat + cosLat * storeCosLat[i] * sinLon * sinLon;
+        distances[j] = 2 * EARTH_RADIUS_M * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
+    }
+    return distances;
+}
 
+// 距離の小さい順に k 件の位置を返す（全件を並べ替えず、k件の最大ヒープで選ぶ）
+function selectNearest(distances, k) {
+    const n = distances.length;
+    const size = Math.min(k, n);
+    const heap = new Int32Array(size);
+    let count = 0;
+    const siftDown = (pos) => {
+        for (;;) {
+            const left = pos * 2 + 1;
+            if (left >= count) return;
+            let largest = left;
+            if (left + 1 < count && distances[heap[left + 1]] > distances[heap[left]]) largest = left + 1;
+            if (distances[heap[largest]] <= distances[heap[pos]]) return;
+            const tmp = heap[pos]; heap[pos] = heap[largest]; heap[largest] = tmp;
+            pos = largest;
+        }
+    };
+    for (let j = 0; j < n; j++) {
+        if (count < size) {
+            let pos = count++;
+            heap[pos] = j;
+            while (pos > 0) {
+                const parent = (pos - 1) >> 1;
+                if (distances[heap[parent]] >= distances[heap[pos]]) break;
+                const tmp = heap[pos]; heap[pos] = heap[parent]; heap[parent] = tmp;
+                pos = parent;
+            }
+        } else if (size > 0 && distances[j] < distances[heap[0]]) {
+            heap[0] = j;
+            siftDown(0);
+        }
+    }
+    return heap.sort((a, b) => distances[a] - distances[b]);
+}
 
-# --- 4. Foliumマップの作成とマーカーの追加 ---
-FUKUYAMA_CENTER = [34.50, 133.37]
-map_name = "m_temp"
-# 地図をクリック可能にするために、folium.Mapのデフォルトのフォールバックレイヤーを設定
-m_temp = folium.Map(location=FUKUYAMA_CENTER, zoom_start=12, name=map_name)
-marker_data_for_js = []
+self.onmessage = function(event) {
+    const data = event.data;
+    if (data.type === 'init') {
+        init(data);
+        return;
+    }
+    const candidates = data.brand === -1 ? allStores : (brandStores[data.brand] || new Int32Array(0));
+    const distances = distancesFrom(data.lat, data.lon, candidates);
+    const order = selectNearest(distances, data.k);
+    const indices = new Int32Array(order.length);
+    const result = new Float64Array(order.length);
+    for (let j = 0; j < order.length; j++) {
+        indices[j] = candidates[order[j]];
+        result[j] = distances[order[j]];
+    }
+    postMessage({ requestId: data.requestId, indices: indices, distances: result }, [indices.buffer, result.buffer]);
+};
+"""
 
-for index, row in df.iterrows():
-    pin_image_base64 = generated_pin_base64.get(index)
+# 基準点を変えたときに、基準点のポップアップに表示する最寄り店舗の数
+NEAREST_POPUP_COUNT = 3
 
-    logo_base64_for_popup = generated_pin_base64.get(index, "").replace("data:image/png;base64,", "")
-            
-    popup_html = f"""
-    <div style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; max-width: 250px;">
-        <h4 style="margin: 0 0 8px 0; color: #333; border-bottom: 2px solid {PIN_COLORS.get(row['brand'], '#ccc')}; padding-bottom: 5px;">
-            <img src='data:image/png;base64,{logo_base64_for_popup}' alt='{row['brand']}ロゴ' style='height: 20px; vertical-align: middle; margin-right: 5px; background-color: {PIN_COLORS.get(row['brand'], '#ccc')}; border-radius: 5px;'>
-            {row['name']}
-        </h4>
-        <p style="margin: 5px 0;"><a href="{row['website']}" target="_blank" style="color: #007bff; text-decoration: none;"><i class="fas fa-globe"></i> 公式ウェブサイト</a></p>
-        <hr style="margin: 10px 0; border-top: 1px solid #eee;">
-
-        <button onclick="showComparisonPanel('{row['name']}')" style="margin-top: 5px; padding: 8px 10px; background-color: #ffc107; border: none; border-radius: 5px; cursor: pointer; font-weight: bold; width: 100%; color: #333; transition: background-color 0.2s;">
-            <i class="fas fa-search"></i> 本日の特売を見る
-        </button>
-
-        <div onclick="showCategorySelector('{row['name']}', '{index}')" style="margin-top: 10px; text-align: center; font-size: 0.9em; color: #007bff; cursor: pointer; padding: 5px 0; border-top: 1px solid #eee; transition: color 0.2s;">
-            詳細はこちら <i class="fas fa-chevron-right" style="font-size: 0.7em;"></i>
-        </div>
-    </div>
+
+def build_store_geojson(
+    df: pd.DataFrame,
+    store_pin_keys: Dict[int, str],
+    pin_atlas: SpriteAtlas
+) -> dict:
+    """
+    全店舗を1つのGeoJSON FeatureCollectionとして作成
+    
+    ポップアップや特売情報の表示に使う項目は、各Featureのプロパティに持たせます。
+    
+    Args:
+        df: 店舗データのDataFrame
+        store_pin_keys: 店舗インデックスとピン画像キーの対応
+        pin_atlas: ピン画像のスプライトアトラス
+        
+    Returns:
+        GeoJSON FeatureCollection
+    """
+    features = []
+    for index, row in df.iterrows():
+        pin_key = store_pin_keys.get(index)
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [
+                    round(float(row['lon']), COORDINATE_DIGITS),
+                    round(float(row['lat']), COORDINATE_DIGITS),
+                ],
+            },
+            'properties': {
+                'id': f'marker-{index}',
+                'name': row['name'],
+                'brand': row['brand'],
+                'website': row['website'],
+                'souzai': row['souzai_info'],
+                'sengyo': row['sengyo_info'],
+                'niku': row['niku_info'],
+                'seika': row['seika_info'],
+                'distance': int(row['distance_from_reference']),
+                'pin_class': pin_atlas.class_name(pin_key) if pin_key else '',
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def write_app_html(
+    path: str,
+    df: pd.DataFrame,
+    store_pin_keys: Dict[int, str],
+    pin_atlas: SpriteAtlas,
+    pin_sprite_css: str,
+    libraries: List[FrontendLibrary],
+    renderer: str = RENDERER,
+    browser_markers: bool = False,
+    cluster: bool = False,
+    chunk_urls: Optional[StoreChunkUrls] = None,
+    canvas: bool = False,
+    cull: bool = False,
+    lod_zoom: Optional[int] = None,
+    head_extra: str = ''
+) -> None:
+    """
+    地図とUIのHTMLを書き出す
+
+    RENDERER_LEAFLET の場合はFoliumのオブジェクトを作らず、マーカーは常にブラウザ側で作成します。
+
+    Args:
+        path: 出力先のパス
+        df: 店舗データのDataFrame
+        store_pin_keys: 店舗インデックスとピン画像キーの対応
+        pin_atlas: ピン画像のスプライトアトラス
+        pin_sprite_css: ピン画像のスプライトCSS
+        libraries: 読み込むフロントエンドライブラリ
+        renderer: 出力方法（RENDERER_FOLIUM または RENDERER_LEAFLET）
+        browser_markers: Trueの場合はマーカーをブラウザ側で作成する
+        cluster: Trueの場合はマーカーをクラスターにまとめる
+        chunk_urls: 分割出力モードで書き出したJSONのURL
+        canvas: ブラウザ側で作成するマーカーを canvas に描画する
+        cull: ブラウザ側で作成するマーカーを、表示範囲にある店舗の分だけ地図に載せる
+        lod_zoom: ブラウザ側で作成するマーカーを、このズーム未満では円、以上ではピンで描画する
+        head_extra: <head>に追加するHTML
     """
+    direct = renderer == RENDERER_LEAFLET
+    browser_markers = browser_markers or direct or chunk_urls is not None
+    store_geojson = None
+    if browser_markers and not chunk_urls:
+        store_geojson = build_store_geojson(df, store_pin_keys, pin_atlas)
+
+    if direct:
+        marker_data_for_js: List[dict] = []
+        map_var = LEAFLET_MAP_VAR
+        marker_layer_var = LEAFLET_MARKER_LAYER_VAR if cluster else map_var
+    else:
+        m_temp, marker_layer, marker_data_for_js = build_map(
+            df, store_pin_keys, pin_atlas, libraries,
+            with_markers=not browser_markers, cluster=cluster
+        )
+        if head_extra:
+            m_temp.get_root().header.add_child(folium.Element(head_extra), name='head_extra')
+        map_var, marker_layer_var = m_temp.get_name(), marker_layer.get_name()
 
-    if pin_image_base64:
-        icon = folium.CustomIcon(icon_image=pin_image_base64, icon_size=(40, 40), icon_anchor=(20, 40))
+    app_ui = iter_app_ui(
+        df.shape[0], marker_data_for_js, pin_sprite_css, map_var, marker_layer_var,
+        chunk_urls, store_geojson, canvas, cull, lod_zoom
+    )
+    if direct:
+        write_leaflet_html(
+            path, libraries, FUKUYAMA_CENTER, MAP_ZOOM_START, app_ui, map_var, marker_layer_var,
+            cluster_options=CLUSTER_OPTIONS if cluster else None,
+            cluster_icon_function='createBrandClusterIcon',
+            title=APP_NAME,
+            head_extra=head_extra
+        )
     else:
-        icon = folium.Icon(color='gray', icon='info-sign')
-
-    marker = folium.Marker(
-        location=[row['lat'], row['lon']],
-        popup=folium.Popup(popup_html, max_width=300),
-        icon=icon,
-        tooltip=row['name']
-    ).add_to(m_temp)
-
-    marker.add_child(folium.Element(f"<div id='marker-{index}' data-brand='{row['brand']}' class='custom-marker-info'></div>"))
-
-    marker_data_for_js.append({
-        'id': f'marker-{index}',
-        'name': row['name'],
-        'brand': row['brand'],
-        'souzai': row['souzai_info'],
-        'sengyo': row['sengyo_info'],
-        'niku': row['niku_info'],
-        'seika': row['seika_info'],
-        'layer_id': marker._id,
-        'lat': row['lat'],
-        'lon': row['lon'],
-        'distance': int(row['distance_from_reference'])  # 事前計算された距離（メートル）
-    })
-
-marker_data_json = json.dumps(marker_data_for_js)
-pin_colors_json = json.dumps(PIN_COLORS)
-fukuyama_center_json = json.dumps(FUKUYAMA_CENTER)
-
-
-# 5. UI要素の定義とJavaScriptによる動的機能の追加 (Raw String f-stringを使用)
-app_ui_elements = rf"""
-<script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
+        write_map_html(m_temp, path, app_ui)
+
+
+def iter_app_ui(
+    store_count: int,
+    marker_data_for_js: List[dict],
+    pin_sprite_css: str,
+    map_var: str,
+    marker_layer_var: str,
+    chunk_urls: Optional[StoreChunkUrls] = None,
+    store_geojson: Optional[dict] = None,
+    canvas: bool = False,
+    cull: bool = False,
+    lod_zoom: Optional[int] = None
+) -> Iterator[str]:
+    """
+    地図に重ねるUI要素（CSS・HTML・JavaScript）を順に生成
+    
+    店舗データのJSONは一度に文字列化せず、少しずつ生成します。
+    分割出力モードでは店舗データを埋め込まず、読み込み処理を追加します。
+    
+    Args:
+        store_count: 店舗数
+        marker_data_for_js: JavaScriptに渡す店舗データのリスト
+        pin_sprite_css: ピン画像のスプライトCSS
+        map_var: Foliumが地図を格納するJavaScriptの変数名
+        marker_layer_var: マーカーの追加先（地図またはクラスター）のJavaScriptの変数名
+        chunk_urls: 分割出力モードで書き出したJSONのURL
+        store_geojson: GeoJSONモードで埋め込む全店舗のGeoJSON
+        canvas: ブラウザ側で作成するマーカーを canvas に描画する
+        cull: ブラウザ側で作成するマーカーを、表示範囲にある店舗の分だけ地図に載せる
+        lod_zoom: ブラウザ側で作成するマーカーを、このズーム未満では円、以上ではピンで描画する
+        
+    Yields:
+        <body>の直後に挿入するHTMLの断片
+    """
+    map_name = MAP_NAME
+    brand_chunk_urls_json = json.dumps(chunk_urls.brands if chunk_urls else {})
+    pin_colors_json = json.dumps(PIN_COLORS)
+    fukuyama_center_json = json.dumps(FUKUYAMA_CENTER)
+
+    # UI要素の定義とJavaScriptによる動的機能の追加 (Raw String f-stringを使用)
+    app_ui_elements = rf"""
+<style>
+{pin_sprite_css}
+</style>
 <style>
     /* --- CSSスタイル --- */
 
@@ -1233,7 +1381,46 @@ app_ui_elements = rf"""
     #filter-results-list .result-item .result-brand-name {{
         font-size: 0.9em; color: #7f8c8d; display: block; margin-top: 5px; font-weight: 500;
     }}
-    
+
+    /* --- 店舗のポップアップ --- */
+    .store-popup {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; max-width: 250px; }}
+    .store-popup-title {{ margin: 0 0 8px 0; color: #333; border-bottom: 2px solid #CCCCCC; padding-bottom: 5px; }}
+    .store-popup-logo {{
+        height: 20px; width: 20px; vertical-align: middle; margin-right: 5px; border-radius: 5px;
+    }}
+    .store-popup-website {{ margin: 5px 0; color: #999; }}
+    .store-popup-website a {{ color: #007bff; text-decoration: none; }}
+    .store-popup-divider {{ margin: 10px 0; border-top: 1px solid #eee; }}
+    .store-popup-deals {{
+        margin-top: 5px; padding: 8px 10px; background-color: #ffc107; border: none; border-radius: 5px;
+        cursor: pointer; font-weight: bold; width: 100%; color: #333; transition: background-color 0.2s;
+    }}
+    .store-popup-details {{
+        margin-top: 10px; text-align: center; font-size: 0.9em; color: #007bff; cursor: pointer;
+        padding: 5px 0; border-top: 1px solid #eee; transition: color 0.2s;
+    }}
+    .store-popup-details i {{ font-size: 0.7em; }}
+
+    /* --- マーカーのクラスター（ブランドごとの店舗数） --- */
+    .brand-cluster {{ background: transparent; }}
+    .brand-cluster-ring {{
+        width: 100%; height: 100%; border-radius: 50%; box-shadow: 0 2px 6px rgba(0,0,0,0.35);
+        display: flex; align-items: center; justify-content: center;
+    }}
+    .brand-cluster-count {{
+        width: 70%; height: 70%; border-radius: 50%; background: #fff;
+        display: flex; align-items: center; justify-content: center;
+        font-weight: bold; font-size: 13px; color: #333;
+    }}
+    .brand-cluster-chips {{
+        position: absolute; top: 100%; left: 50%; transform: translateX(-50%);
+        display: flex; gap: 2px; margin-top: 2px; white-space: nowrap;
+    }}
+    .brand-cluster-chip {{
+        min-width: 16px; padding: 0 3px; border-radius: 8px; box-shadow: 0 1px 2px rgba(0,0,0,0.3);
+        font-size: 10px; line-height: 16px; text-align: center; color: #fff;
+    }}
+
     /* モバイル対応 - スマートフォン用スタイル */
     @media screen and (max-width: 768px) {{
         /* サイドバーの幅を全画面に */
@@ -1389,7 +1576,7 @@ app_ui_elements = rf"""
 
 <div id="loading-mask">
     <div id="loading-title"><i class="fas fa-map-marked-alt"></i> SMAP - Supermarket Map App</div>
-    <div id="loading-subtitle">福山市内の全店舗の特売情報と、最寄り店舗をすぐに検索！ (全{df.shape[0]}店舗)</div>
+    <div id="loading-subtitle">福山市内の全店舗の特売情報と、最寄り店舗をすぐに検索！ (全{store_count}店舗)</div>
     <button id="start-button" onclick="startApp()"><i class="fas fa-play-circle"></i> マップを起動する</button>
 </div>
 
@@ -1413,17 +1600,39 @@ app_ui_elements = rf"""
         ブランドをタップすると距離一覧が表示されます
     </p>
 """
-# 各ブランドのタップ可能なアイテムを動的に追加
-for brand, color in PIN_COLORS.items():
-    # ブランド名を安全にエスケープ
-    brand_escaped = brand.replace('"', '&quot;').replace("'", "\\'")
-    app_ui_elements += f"""
+    # 各ブランドのタップ可能なアイテムを動的に追加
+    for brand, color in PIN_COLORS.items():
+        # ブランド名を安全にエスケープ
+        brand_escaped = brand.replace('"', '&quot;').replace("'", "\\'")
+        app_ui_elements += f"""
     <div class="sidebar-item" onclick='showBrandDistance("{brand_escaped}")' style="cursor: pointer; border-left: 4px solid {color};">
         <i class="fas fa-store" style="color: {color};"></i> {brand}
         <i class="fas fa-chevron-right" style="float: right; color: #999; margin-top: 2px;"></i>
     </div>
     """
-app_ui_elements += rf"""
+    app_ui_elements += """
+    <hr>
+    <h3><i class="fas fa-filter"></i> 表示するブランド</h3>
+    <div class="filter-item filter-all">
+        <label for="filter-all">
+            <input type="checkbox" id="filter-all" checked onchange="setAllBrandsVisible(this.checked)">
+            <i class="fas fa-store"></i> 全ての店舗を表示
+        </label>
+    </div>
+"""
+    # 各ブランドの表示・非表示を切り替えるチェックボックスを追加
+    for brand_index, (brand, color) in enumerate(PIN_COLORS.items()):
+        brand_attr = brand.replace('"', '&quot;')
+        app_ui_elements += f"""
+    <div class="filter-item">
+        <label for="filter-brand-{brand_index}">
+            <input type="checkbox" id="filter-brand-{brand_index}" class="brand-filter" data-brand="{brand_attr}" checked onchange="setBrandVisible(this.dataset.brand, this.checked); syncAllBrandsCheckbox();">
+            <i class="fas fa-shopping-basket" style="color: {color};"></i> {brand}
+        </label>
+    </div>
+    """
+    app_ui_elements += rf"""
+    <hr>
     <h3><i class="fas fa-info-circle"></i> ヘルプ・その他</h3>
     <a href="faq.html" class="sidebar-item" style="text-decoration: none; display: flex; align-items: center;" onclick="toggleSidebar();">
         <i class="fas fa-question-circle"></i> よくある質問 (FAQ)
@@ -1471,13 +1680,30 @@ app_ui_elements += rf"""
 </div>
 
 <script>
-    const mapElement = window.{map_name};
-    const allMarkersData = {marker_data_json};
+    // 地図はこのスクリプトより後で作成されるため、DOM構築完了時に取得する
+    let mapElement = null;
+    let markerLayer = null;  // マーカーの追加先（地図、またはクラスター表示のクラスター）
+    const allMarkersData = """
+    yield app_ui_elements
+    yield from iter_json(marker_data_for_js)
+
+    yield rf""";
     const PIN_COLORS_JS = {pin_colors_json};
+    const CLUSTER_BRAND_CHIPS = {CLUSTER_BRAND_CHIPS};
+    const CULL_MARKERS = {json.dumps(cull)};  // 表示範囲の店舗だけにマーカーを割り当てる
+    const LOD_ZOOM = {json.dumps(lod_zoom)};  // ロゴのピンに切り替えるズーム（null: 切り替えない）
+    // マーカーを店舗に固定せず、表示する時点で割り当てる（間引き表示・詳細度の切り替え）
+    const MANAGED_MARKERS = CULL_MARKERS || LOD_ZOOM !== null;
     const FUKUYAMA_CENTER_JS = {fukuyama_center_json};
     let currentFilteredBrands = new Set();
     const layerControl = {{}};
-    const generated_pin_base64_js = {json.dumps(generated_pin_base64)};
+
+    // 店舗・マーカーの索引（読み込み時に1回だけ作成し、店舗の検索はすべてこれを使う）
+    const storesById = new Map();     // 店舗ID -> 店舗データ
+    const storesByName = new Map();   // 店舗名 -> 店舗データ
+    const storesByBrand = new Map();  // ブランド名 -> 店舗データの配列
+    const layersById = new Map();     // layer_id -> マーカー（間引き表示では地図に載っている店舗のみ）
+    const storesByLayerId = new Map(); // layer_id -> 店舗データ
 
     // --- 基準点とデモ現在地の定義 ---
     const INITIAL_REFERENCE_LAT = 34.49178298;
@@ -1498,18 +1724,169 @@ app_ui_elements += rf"""
     let currentReferenceName = INITIAL_REFERENCE_NAME;
     let currentLocationMarker = null; // 現在地のマーカーを保持するための変数
 
-    // Leaflet Layersをブランドごとにグループ化
-    mapElement.eachLayer(layer => {{
-        if(layer._leaflet_id && layer.options && layer.options.pane === 'markerPane') {{
-            const markerData = allMarkersData.find(d => d.layer_id === layer._leaflet_id);
-            if (markerData) {{
-                layerControl[markerData.brand] = layerControl[markerData.brand] || [];
-                layerControl[markerData.brand].push(layer);
+    // 店舗の詳細情報（分割出力モードでは、ブランドごとのデータを必要になった時点で読み込む）
+    const BRAND_CHUNK_URLS = {brand_chunk_urls_json};
+    const brandChunkRequests = {{}};
+
+    function withStoreDetails(store, callback) {{
+        const url = BRAND_CHUNK_URLS[store.brand];
+        if (store.souzai !== undefined || !url) {{
+            callback(store);
+            return;
+        }}
+        if (!brandChunkRequests[store.brand]) {{
+            brandChunkRequests[store.brand] = fetch(url)
+                .then(response => response.json())
+                .then(chunk => {{
+                    Object.keys(chunk).forEach(id => {{
+                        const target = storesById.get(id);
+                        if (target) Object.assign(target, chunk[id]);
+                    }});
+                }});
+        }}
+        brandChunkRequests[store.brand]
+            .then(() => callback(store))
+            .catch(error => {{
+                delete brandChunkRequests[store.brand];
+                console.error('店舗情報の読み込みに失敗しました', error);
+                alert('店舗情報の読み込みに失敗しました');
+            }});
+    }}
+
+    function escapeHtml(value) {{
+        return String(value).replace(/[&<>"']/g, c => ({{
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        }})[c]);
+    }}
+
+    // 店舗のポップアップ（全店舗で共通のテンプレート。見た目は .store-popup のCSSで指定）
+    function buildStorePopupHtml(store) {{
+        const brandColor = PIN_COLORS_JS[store.brand] || '#CCCCCC';
+        const nameArg = escapeHtml(JSON.stringify(store.name));
+        const indexArg = escapeHtml(JSON.stringify(store.id.replace('marker-', '')));
+        // 分割出力モードでは、ウェブサイトはブランドごとのJSONを読み込んだ後に表示する
+        const website = store.website === undefined
+            ? '<i class="fas fa-spinner fa-spin"></i>'
+            : `<a href="${{escapeHtml(store.website)}}" target="_blank"><i class="fas fa-globe"></i> 公式ウェブサイト</a>`;
+        return `<div class="store-popup">
+            <h4 class="store-popup-title" style="border-bottom-color: ${{brandColor}};">
+                <span class="store-popup-logo ${{store.pin_class}}" role="img" aria-label="${{escapeHtml(store.brand)}}ロゴ" style="background-color: ${{brandColor}};"></span>
+                ${{escapeHtml(store.name)}}
+            </h4>
+            <p class="store-popup-website">${{website}}</p>
+            <hr class="store-popup-divider">
+            <button class="store-popup-deals" onclick="showComparisonPanel(${{nameArg}})">
+                <i class="fas fa-search"></i> 本日の特売を見る
+            </button>
+            <div class="store-popup-details" onclick="showCategorySelector(${{nameArg}}, ${{indexArg}})">
+                詳細はこちら <i class="fas fa-chevron-right"></i>
+            </div>
+        </div>`;
+    }}
+
+    // ポップアップの内容は持たせず、開いた時点で店舗データから作成する
+    // （marker.store を差し替えれば、別の店舗のマーカーとして再利用できる）
+    function bindStorePopup(store, marker) {{
+        marker.store = store;
+        marker.bindPopup(() => buildStorePopupHtml(marker.store), {{ maxWidth: 300 }});
+        marker.on('popupopen', () => {{
+            if (marker.store.website === undefined) {{
+                withStoreDetails(marker.store, () => marker.getPopup().update());
             }}
+        }});
+    }}
+
+    // 店舗データとマーカーを索引に登録し、ブランドごとにグループ化する
+    // 間引き表示・詳細度の切り替えではマーカーを後から割り当てるため、marker は null
+    function registerStore(store, marker) {{
+        store.layer_id = L.stamp(marker || store);
+        storesById.set(store.id, store);
+        // 同じ名前の店舗がある場合は、先に登録した店舗を使う
+        if (!storesByName.has(store.name)) storesByName.set(store.name, store);
+        if (!storesByBrand.has(store.brand)) storesByBrand.set(store.brand, []);
+        storesByBrand.get(store.brand).push(store);
+        storesByLayerId.set(store.layer_id, store);
+        currentFilteredBrands.add(store.brand);
+        if (!marker) return;
+
+        layersById.set(store.layer_id, marker);
+        layerControl[store.brand] = layerControl[store.brand] || [];
+        layerControl[store.brand].push(marker);
+    }}
+
+    // Leaflet Layersをブランドごとにグループ化
+    // クラスター表示ではマーカーが地図に直接載らないため、Foliumのマーカー変数から対応付ける
+    function groupMarkersByBrand() {{
+        allMarkersData.forEach(store => {{
+            const marker = window[store.marker];
+            if (!marker) return;
+            bindStorePopup(store, marker);
+            registerStore(store, marker);
+        }});
+    }}
+
+    // ブランドの表示・非表示を切り替える（クラスター表示ではクラスターから出し入れする）
+    function setBrandVisible(brand, visible) {{
+        if (MANAGED_MARKERS) {{
+            if (visible) currentFilteredBrands.add(brand);
+            else currentFilteredBrands.delete(brand);
+            updateVisibleMarkers();
+            return;
         }}
-    }});
+        const markers = layerControl[brand] || [];
+        if (visible) {{
+            currentFilteredBrands.add(brand);
+            if (markerLayer.addLayers) markerLayer.addLayers(markers);
+            else markers.forEach(marker => markerLayer.addLayer(marker));
+        }} else {{
+            currentFilteredBrands.delete(brand);
+            if (markerLayer.removeLayers) markerLayer.removeLayers(markers);
+            else markers.forEach(marker => markerLayer.removeLayer(marker));
+        }}
+    }}
 
-    Object.keys(layerControl).forEach(brand => currentFilteredBrands.add(brand));
+    // サイドバーの「全ての店舗を表示」: 全ブランドのチェックボックスをそろえる
+    function setAllBrandsVisible(visible) {{
+        document.querySelectorAll('#sidebar .brand-filter').forEach(checkbox => {{
+            if (checkbox.checked === visible) return;
+            checkbox.checked = visible;
+            setBrandVisible(checkbox.dataset.brand, visible);
+        }});
+    }}
+
+    function syncAllBrandsCheckbox() {{
+        const checkboxes = Array.from(document.querySelectorAll('#sidebar .brand-filter'));
+        document.getElementById('filter-all').checked = checkboxes.every(checkbox => checkbox.checked);
+    }}
+
+    // クラスターのアイコン: 店舗数と、ブランドごとの店舗数（外周の色の割合と、多い順の内訳）
+    function createBrandClusterIcon(cluster) {{
+        const counts = {{}};
+        cluster.getAllChildMarkers().forEach(marker => {{
+            const brand = marker.options.brand;
+            counts[brand] = (counts[brand] || 0) + 1;
+        }});
+        const total = cluster.getChildCount();
+        const brands = Object.keys(counts).sort((a, b) => counts[b] - counts[a]);
+        let angle = 0;
+        const stops = brands.map(brand => {{
+            const start = angle;
+            angle += counts[brand] / total * 360;
+            return `${{PIN_COLORS_JS[brand] || '#999'}} ${{start}}deg ${{angle}}deg`;
+        }});
+        const chips = brands.slice(0, CLUSTER_BRAND_CHIPS).map(brand =>
+            `<span class="brand-cluster-chip" style="background: ${{PIN_COLORS_JS[brand] || '#999'}};">${{counts[brand]}}</span>`
+        ).join('');
+        const title = brands.map(brand => `${{brand}}: ${{counts[brand]}}店舗`).join('\n');
+        const size = total < 10 ? 36 : total < 100 ? 44 : 52;
+        return L.divIcon({{
+            html: `<div class="brand-cluster-ring" style="background: conic-gradient(${{stops.join(', ')}});" title="${{title}}">`
+                + `<span class="brand-cluster-count">${{total}}</span></div>`
+                + `<div class="brand-cluster-chips">${{chips}}</div>`,
+            className: 'brand-cluster',
+            iconSize: L.point(size, size)
+        }});
+    }}
 
     // 緯度経度から距離(メートル)を計算する関数
     function getDistance(lat1, lon1, lat2, lon2) {{
@@ -1523,8 +1900,119 @@ app_ui_elements += rf"""
         return Math.round(R * c * 1000);
     }}
 
+    // --- 最寄り店舗の順位付け（基準点からの距離を Web Worker で計算し、画面の操作を止めない） ---
+    const NEAREST_WORKER_SOURCE = {json.dumps(NEAREST_WORKER_JS)};
+    const NEAREST_CACHE_SIZE = 32;
+    const NEAREST_POPUP_COUNT = {NEAREST_POPUP_COUNT};
+    const nearestCache = new Map();     // 基準点・ブランド・件数 -> 結果の Promise（古いものから削除）
+    const nearestRequests = new Map();  // 要求番号 -> {{ resolve, lat, lon, brand, k }}
+    const brandNumbers = new Map();     // ブランド名 -> Worker 内のブランド番号
+    let nearestWorker = null;
+    let nearestStoreCount = 0;          // Worker に渡した店舗数（分割出力で店舗が増えたら渡し直す）
+    let nearestRequestId = 0;
+
+    function initNearestWorker() {{
+        const n = allMarkersData.length;
+        const lat = new Float64Array(n);
+        const lon = new Float64Array(n);
+        const brand = new Int32Array(n);
+        allMarkersData.forEach((store, i) => {{
+            if (!brandNumbers.has(store.brand)) brandNumbers.set(store.brand, brandNumbers.size);
+            lat[i] = store.lat;
+            lon[i] = store.lon;
+            brand[i] = brandNumbers.get(store.brand);
+        }});
+        nearestStoreCount = n;
+        nearestCache.clear();
+
+        if (nearestWorker === null) {{
+            try {{
+                const url = URL.createObjectURL(new Blob([NEAREST_WORKER_SOURCE], {{ type: 'text/javascript' }}));
+                nearestWorker = new Worker(url);
+                URL.revokeObjectURL(url);
+                nearestWorker.onmessage = event => {{
+                    const request = nearestRequests.get(event.data.requestId);
+                    nearestRequests.delete(event.data.requestId);
+                    if (request) request.resolve(Array.from(event.data.indices, (index, j) => ({{
+                        store: allMarkersData[index], distance: event.data.distances[j]
+                    }})));
+                }};
+                // 起動後の失敗（スクリプトの読み込みがCSPなどで拒否された、Worker 内で例外が出た、
+                // メッセージを復元できない）も、この画面での計算に切り替える
+                nearestWorker.onerror = event => {{
+                    if (event && event.preventDefault) event.preventDefault();
+                    stopNearestWorker(event);
+                }};
+                nearestWorker.onmessageerror = stopNearestWorker;
+            }} catch (error) {{
+                console.warn('Web Worker を使えないため、距離をこの画面で計算します', error);
+                nearestWorker = false;
+            }}
+        }}
+        if (nearestWorker) {{
+            nearestWorker.postMessage({{ type: 'init', lat, lon, brand }}, [lat.buffer, lon.buffer, brand.buffer]);
+        }}
+    }}
+
+    // Worker を止めて以降はこの画面で計算し、応答を待っている要求もこの画面の計算結果で完了させる
+    function stopNearestWorker(error) {{
+        if (!nearestWorker) return;
+        console.warn('Web Worker で距離を計算できないため、この画面で計算します', error);
+        nearestWorker.terminate();
+        nearestWorker = false;
+        // 完了しない Promise がキャッシュから返され続けないよう、結果をすべて破棄する
+        nearestCache.clear();
+        const requests = Array.from(nearestRequests.values());
+        nearestRequests.clear();
+        requests.forEach(request => request.resolve(
+            rankNearestStoresHere(request.lat, request.lon, request.brand, request.k)
+        ));
+    }}
+
+    // Worker を使わずに順位付けする（全店舗の距離を計算して並べ替える）
+    function rankNearestStoresHere(lat, lon, brand, k) {{
+        const stores = brand ? (storesByBrand.get(brand) || []) : allMarkersData;
+        return stores
+            .map(store => ({{ store, distance: getDistance(lat, lon, store.lat, store.lon) }}))
+            .sort((a, b) => a.distance - b.distance)
+            .slice(0, k);
+    }}
+
+    // 基準点から近い順に最大 k 件の店舗を返す（brand を指定した場合はそのブランドのみ）
+    // 結果: Promise<[{{ store, distance }}]>（distance はメートル）
+    function rankNearestStores(lat, lon, brand, k) {{
+        if (nearestStoreCount !== allMarkersData.length) initNearestWorker();
+
+        const key = `${{lat.toFixed(6)}},${{lon.toFixed(6)}}|${{brand || ''}}|${{k}}`;
+        if (nearestCache.has(key)) {{
+            const cached = nearestCache.get(key);
+            nearestCache.delete(key);
+            nearestCache.set(key, cached);
+            return cached;
+        }}
+
+        let result;
+        if (nearestWorker) {{
+            const requestId = ++nearestRequestId;
+            result = new Promise(resolve => nearestRequests.set(requestId, {{ resolve, lat, lon, brand, k }}));
+            const brandNumber = !brand ? -1 : brandNumbers.has(brand) ? brandNumbers.get(brand) : -2;
+            nearestWorker.postMessage({{ type: 'rank', requestId, lat, lon, brand: brandNumber, k }});
+        }} else {{
+            result = Promise.resolve(rankNearestStoresHere(lat, lon, brand, k));
+        }}
+
+        nearestCache.set(key, result);
+        if (nearestCache.size > NEAREST_CACHE_SIZE) {{
+            nearestCache.delete(nearestCache.keys().next().value);
+        }}
+        return result;
+    }}
+
     $(document).ready(function() {{
+        mapElement = window.{map_var};
+        markerLayer = window.{marker_layer_var};
         // 初期状態で全てのブランドが表示されるようにする
+        groupMarkersByBrand();
         // DOM構築完了
         // ★修正点：初期状態でマップクリックイベントを登録★
         mapElement.on('click', onMapClick); 
@@ -1593,32 +2081,56 @@ app_ui_elements += rf"""
             }}),
             zIndexOffset: 2000
         }}).addTo(mapElement).bindPopup(`${{currentReferenceName}}`).openPopup();
+
+        // 最寄り店舗をポップアップに追加（計算中に基準点が変わった場合は表示しない）
+        const referenceMarker = currentLocationMarker;
+        rankNearestStores(currentReferenceLat, currentReferenceLon, null, NEAREST_POPUP_COUNT).then(ranked => {{
+            if (referenceMarker !== currentLocationMarker || ranked.length === 0) return;
+            const items = ranked.map(({{ store, distance }}) =>
+                `<li style="cursor: pointer;" onclick="openMarkerPopup(${{store.lat}}, ${{store.lon}}, ${{store.layer_id}})">`
+                + `${{escapeHtml(store.name)}} <span style="color: #667eea; font-weight: 600;">${{Math.round(distance)}} m</span></li>`
+            ).join('');
+            referenceMarker.setPopupContent(
+                `${{escapeHtml(currentReferenceName)}}<br><b>最寄り店舗</b><ol style="margin: 4px 0 0 0; padding-left: 18px;">${{items}}</ol>`
+            );
+        }});
         
         // 地図上の情報オーバーレイを更新
         $('#map-info-text').html(`(基準点: ${{currentReferenceName}} Lat: ${{currentReferenceLat.toFixed(4)}}, Lon: ${{currentReferenceLon.toFixed(4)}})`);
     }}
 
     function openMarkerPopup(lat, lon, layerId) {{
+        let marker = layersById.get(layerId);
+
+        // クラスターにまとめられている場合は、マーカーが見えるまで展開してから開く
+        if (marker && markerLayer.zoomToShowLayer && markerLayer.hasLayer(marker)) {{
+            markerLayer.zoomToShowLayer(marker, () => marker.openPopup());
+            return;
+        }}
+
         const currentZoom = mapElement.getZoom();
         const targetZoom = Math.max(currentZoom, 14);
 
         mapElement.setView([lat, lon], targetZoom);
 
-        mapElement.eachLayer(layer => {{
-            if (layer._leaflet_id === layerId) {{
-                if (layer.openPopup) {{
-                    layer.openPopup();
-                    return;
-                }}
-            }}
-        }});
+        // 間引き表示などでは移動・ズームでマーカーが入れ替わるため、移動後に取り直す
+        if (MANAGED_MARKERS && storesByLayerId.has(layerId)) {{
+            marker = showStoreMarker(storesByLayerId.get(layerId));
+        }}
+        if (marker && marker.openPopup) {{
+            marker.openPopup();
+        }}
     }}
 
 
 
     function showComparisonPanel(storeName) {{
-        const store = allMarkersData.find(d => d.name === storeName);
+        const store = storesByName.get(storeName);
         if (!store) return;
+        if (store.souzai === undefined) {{
+            withStoreDetails(store, () => showComparisonPanel(storeName));
+            return;
+        }}
 
         $('#comparison-store-name').text(storeName + ' の特売情報');
         let detailHtml = '';
@@ -1655,7 +2167,7 @@ app_ui_elements += rf"""
             return;
         }}
         
-        const filteredStores = allMarkersData.filter(d => d.brand === brandName);
+        const filteredStores = storesByBrand.get(brandName) || [];
         console.log('Filtered stores for brand', brandName, ':', filteredStores.length);
         
         if (filteredStores.length === 0) {{
@@ -1663,13 +2175,22 @@ app_ui_elements += rf"""
             return;
         }}
         
-        const storesWithDistance = filteredStores.map(store => ({{
-            ...store,
-            distance: store.distance || 0,
-            distanceKm: ((store.distance || 0) / 1000).toFixed(2),
-            distanceM: Math.round(store.distance || 0)
-        }})).sort((a, b) => (a.distance || 0) - (b.distance || 0));
+        // 現在の基準点からの距離で並べ替える（Web Worker で計算。計算中に基準点が変わった場合は表示しない）
+        const referenceLat = currentReferenceLat;
+        const referenceLon = currentReferenceLon;
+        const referenceName = currentReferenceName;
+        rankNearestStores(referenceLat, referenceLon, brandName, filteredStores.length).then(ranked => {{
+            if (referenceLat !== currentReferenceLat || referenceLon !== currentReferenceLon) return;
+            renderBrandDistance(brandName, referenceName, ranked.map(({{ store, distance }}) => ({{
+                ...store,
+                distance: distance,
+                distanceKm: (distance / 1000).toFixed(2),
+                distanceM: Math.round(distance)
+            }})));
+        }});
+    }}
 
+    function renderBrandDistance(brandName, referenceName, storesWithDistance) {{
         const panel = document.getElementById('comparison-panel');
         if (!panel) {{
             alert('距離表示パネルが見つかりません');
@@ -1683,18 +2204,16 @@ app_ui_elements += rf"""
         }}
         
         let detailHtml = '<div style="margin-bottom: 15px; padding: 10px; background: #f0f4ff; border-radius: 8px;">' +
-            '<p style="margin: 0; font-size: 0.9em; color: #667eea;"><i class="fas fa-map-marker-alt"></i> 基準点: 穴吹ビジネス専門学校から</p>' +
+            '<p style="margin: 0; font-size: 0.9em; color: #667eea;"><i class="fas fa-map-marker-alt"></i> 基準点: ' + escapeHtml(referenceName) + 'から</p>' +
             '<p style="margin: 5px 0 0 0; font-size: 0.85em; color: #999;">全' + storesWithDistance.length + '店舗</p>' +
             '</div>';
         
         storesWithDistance.forEach(store => {{
             const brandColor = PIN_COLORS_JS[store.brand] || '#333';
-            const markerIndex = parseInt(store.id.replace('marker-', '')) || -1;
-            const logoBase64Url = markerIndex >= 0 ? (generated_pin_base64_js[markerIndex] || '') : '';
             
             detailHtml += '<div class="comparison-item" style="padding: 12px; margin-bottom: 8px; border-left: 4px solid ' + brandColor + '; background: #f9f9f9; border-radius: 4px; cursor: pointer;" onclick="openMarkerPopup(' + store.lat + ', ' + store.lon + ', ' + store.layer_id + '); document.getElementById(\'comparison-panel\').style.display=\'none\';">' +
                 '<div style="display: flex; align-items: center; gap: 10px;">' +
-                (logoBase64Url ? '<img src="' + logoBase64Url + '" style="height: 30px; width: 30px; object-fit: contain; cursor: pointer;" onerror="this.style.display=\'none\'" onclick="openMarkerPopup(' + store.lat + ', ' + store.lon + ', ' + store.layer_id + '); document.getElementById(\'comparison-panel\').style.display=\'none\'; event.stopPropagation();">' : '') +
+                (store.pin_class ? '<span class="' + store.pin_class + '" style="height: 30px; width: 30px; flex-shrink: 0; cursor: pointer;" onclick="openMarkerPopup(' + store.lat + ', ' + store.lon + ', ' + store.layer_id + '); document.getElementById(\'comparison-panel\').style.display=\'none\'; event.stopPropagation();"></span>' : '') +
                 '<div style="flex: 1;">' +
                 '<p style="margin: 0; font-weight: 600; color: #333; font-size: 1em;"><i class="fas fa-store" style="color: ' + brandColor + ';"></i> ' + store.name + '</p>' +
                 '<p style="margin: 5px 0 0 0; font-size: 1.1em; color: #667eea; font-weight: 700;">' + store.distanceM + ' m (' + store.distanceKm + ' km)</p>' +
@@ -1726,7 +2245,7 @@ app_ui_elements += rf"""
 
     // カテゴリー選択画面を表示する関数
     function showCategorySelector(storeName, markerIndex) {{
-        const store = allMarkersData.find(d => d.name === storeName);
+        const store = storesByName.get(storeName);
         if (!store) {{
             alert('店舗情報が見つかりません');
             return;
@@ -1778,11 +2297,15 @@ app_ui_elements += rf"""
     
     // カテゴリーごとの情報を表示する関数
     function showCategoryInfo(storeName, category) {{
-        const store = allMarkersData.find(d => d.name === storeName);
+        const store = storesByName.get(storeName);
         if (!store) {{
             alert('店舗情報が見つかりません');
             return;
         }}
+        if (store.souzai === undefined) {{
+            withStoreDetails(store, () => showCategoryInfo(storeName, category));
+            return;
+        }}
         
         const categoryNames = {{
             'sengyo': {{ name: '鮮魚', icon: 'fas fa-fish', color: '#00BCD4' }},
@@ -1877,36 +2400,480 @@ app_ui_elements += rf"""
 
 </script>
 """
+    if chunk_urls or store_geojson:
+        yield from iter_store_marker_js(canvas, store_geojson, cull, lod_zoom)
+    if chunk_urls:
+        yield from iter_store_loader_js(chunk_urls.stores)
+
+
+def iter_store_marker_js(
+    canvas: bool = False,
+    store_geojson: Optional[dict] = None,
+    cull: bool = False,
+    lod_zoom: Optional[int] = None
+) -> Iterator[str]:
+    """
+    ブラウザ側で店舗マーカーを作成するJavaScriptを順に生成
 
-# 5-2. マップをHTMLファイルとして保存し、UIを挿入
-file_path = "supermarket_app_map_clickable_list.html"
-m_temp.save(file_path)
+    分割出力モードとGeoJSONモードで共通です。アイコンはピンのCSSクラス（ブランド）ごとに
+    1つだけ作成して共有し、マーカーは1つのレイヤーにまとめて地図に追加します。
+    間引き表示・詳細度の切り替えでは、マーカーは店舗に固定せず、地図の移動・ズームのたびに
+    表示する店舗へ割り当てます。
 
-with open(file_path, 'r', encoding='utf-8') as f:
-    html_content = f.read()
+    Args:
+        canvas: Trueの場合はピン画像の代わりにブランド色の円を canvas に描画する
+        store_geojson: 全店舗のGeoJSON（GeoJSONモードの場合）
+        cull: Trueの場合は表示範囲にある店舗のマーカーだけを地図に載せる
+        lod_zoom: 指定した場合は、このズーム未満では円、以上ではピンで描画する
 
-# <head>タグ内にviewportメタタグを追加（モバイル対応）
-if '<meta name="viewport"' not in html_content:
-    head_insertion_point = html_content.find('</head>')
-    if head_insertion_point != -1:
-        viewport_meta = '    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">\n'
-        html_content = html_content[:head_insertion_point] + viewport_meta + html_content[head_insertion_point:]
+    Yields:
+        HTMLの断片
+    """
+    icon_size_json = json.dumps(list(ICON_SIZE))
+    icon_anchor_json = json.dumps(list(ICON_ANCHOR))
+    yield rf"""
+<script>
+    // canvas に描画する場合は、全店舗で1つの canvas を共有する
+    const CIRCLE_MARKERS = {json.dumps(canvas)};
+    const storeCanvas = CIRCLE_MARKERS || LOD_ZOOM !== null ? L.canvas({{ padding: 0.5 }}) : null;
+    const storeIcons = {{}};  // ピンのCSSクラス -> アイコン（ブランドごとに1つ）
+
+    function storeIcon(store) {{
+        const key = store.pin_class || '';
+        if (!storeIcons[key]) {{
+            storeIcons[key] = key
+                ? L.divIcon({{ className: key, iconSize: {icon_size_json}, iconAnchor: {icon_anchor_json} }})
+                : L.AwesomeMarkers  // Foliumを使わない出力では読み込まない
+                    ? L.AwesomeMarkers.icon({{ icon: 'info', markerColor: 'gray', prefix: 'fa' }})
+                    : new L.Icon.Default();
+        }}
+        return storeIcons[key];
+    }}
 
-# <body>タグの直後にUIコードを挿入
-insertion_point = html_content.find('<body>') + len('<body>')
-modified_html_content = html_content[:insertion_point] + app_ui_elements + html_content[insertion_point:]
+    // circle が true の場合はブランド色の円、false の場合はピン画像のマーカーを作成する
+    function newStoreMarker(store, circle) {{
+        const marker = circle
+            ? L.circleMarker([store.lat, store.lon], {{
+                renderer: storeCanvas, radius: 8, color: '#fff', weight: 2,
+                fillColor: PIN_COLORS_JS[store.brand] || '#999', fillOpacity: 0.9, brand: store.brand
+            }})
+            : L.marker([store.lat, store.lon], {{ icon: storeIcon(store), brand: store.brand }});
+        marker.bindTooltip(store.name);
+        bindStorePopup(store, marker);
+        return marker;
+    }}
 
-with open(file_path, 'w', encoding='utf-8') as f:
-    f.write(modified_html_content)
+    // 店舗マーカーを作成し、店舗データ・ブランドと対応付ける
+    function createStoreMarker(store) {{
+        const marker = newStoreMarker(store, CIRCLE_MARKERS);
+        allMarkersData.push(store);
+        registerStore(store, marker);
+        return marker;
+    }}
 
-print(f"\n処理が完了しました！全{df.shape[0]}店舗の情報を地図に組み込みました。")
-print("新機能: 地図上の任意の場所をクリックすると、そこが現在地(基準点)となり、詳細リストが更新されます。")
+    // 店舗マーカーのレイヤーを地図に追加する（クラスター表示ではまとめてクラスターに追加する）
+    function addStoreLayer(storeLayer) {{
+        if (markerLayer.addLayers) markerLayer.addLayers(storeLayer.getLayers());
+        else markerLayer = storeLayer.addTo(mapElement);
+    }}
 
-# --- 生成したHTMLをアプリのウィンドウで開く ---
-webview.create_window(
-    f"SMAP - Supermarket Map App (全{df.shape[0]}店舗)", 
-    file_path,               
-    width=1200, height=800,  
-    resizable=True           
-)
-webview.start()
\ No newline at end of file
+    // 店舗データを地図に追加する（間引き表示などでは、マーカーは表示する時点で割り当てる）
+    function addStores(stores) {{
+        if (MANAGED_MARKERS) addManagedStores(stores);
+        else addStoreLayer(L.featureGroup(stores.map(createStoreMarker)));
+    }}
+
+    // 全店舗のGeoJSON（GeoJSONモード以外では null）
+    const STORE_GEOJSON = """
+    yield from iter_json(store_geojson)
+    yield r""";
+
+    $(document).ready(function() {
+        if (!STORE_GEOJSON) return;
+        if (MANAGED_MARKERS) {
+            addStores(STORE_GEOJSON.features.map(feature => Object.assign({
+                lat: feature.geometry.coordinates[1], lon: feature.geometry.coordinates[0]
+            }, feature.properties)));
+            return;
+        }
+        addStoreLayer(L.geoJSON(STORE_GEOJSON, {
+            pointToLayer: (feature, latlng) => createStoreMarker(
+                Object.assign({ lat: latlng.lat, lon: latlng.lng }, feature.properties)
+            )
+        }));
+    });
+</script>
+"""
+    if cull or lod_zoom is not None:
+        yield from iter_managed_marker_js()
+
+
+def iter_managed_marker_js() -> Iterator[str]:
+    """
+    マーカーを表示する店舗に割り当てるJavaScriptを生成（間引き表示・詳細度の切り替え）
+
+    間引き表示では、店舗を緯度経度の格子に振り分けておき、表示範囲（余白付き）に重なる格子の
+    店舗だけにマーカーを割り当てます。地図上のマーカー（DOM要素）の数は表示範囲の店舗数に比例します。
+    詳細度の切り替えでは、ズームが LOD_ZOOM を超えた時点で、表示中のマーカーを円とピンで入れ替えます。
+    どちらの場合も、不要になったマーカーは種類ごとに取っておき、別の店舗の位置・アイコン・
+    ポップアップに差し替えて再利用します。
+
+    Yields:
+        HTMLの断片
+    """
+    yield rf"""
+<script>
+    const CULL_GRID_DEGREES = {CULL_GRID_DEGREES};
+    const CULL_PADDING = {CULL_PADDING};
+    const storeGrid = new Map();     // 格子のキー -> 店舗データの配列
+    const shownMarkers = new Map();  // 店舗ID -> 地図に載せているマーカー
+    // 地図から外し、再利用を待っているマーカー（円・ピンの種類ごと）
+    const markerPools = {{ circle: [], pin: [] }};
+    let managedLayer = null;
+    let showCircles = CIRCLE_MARKERS;  // 表示中のマーカーの種類
+
+    function gridKey(row, col) {{
+        return row + ':' + col;
+    }}
+
+    // 現在のズームで使うマーカーの種類
+    function useCircleMarkers() {{
+        return LOD_ZOOM === null ? CIRCLE_MARKERS : mapElement.getZoom() < LOD_ZOOM;
+    }}
+
+    function addManagedStores(stores) {{
+        stores.forEach(store => {{
+            allMarkersData.push(store);
+            registerStore(store, null);
+            const key = gridKey(Math.floor(store.lat / CULL_GRID_DEGREES), Math.floor(store.lon / CULL_GRID_DEGREES));
+            if (!storeGrid.has(key)) storeGrid.set(key, []);
+            storeGrid.get(key).push(store);
+        }});
+        if (!managedLayer) {{
+            managedLayer = L.layerGroup().addTo(mapElement);
+            markerLayer = managedLayer;
+            showCircles = useCircleMarkers();
+            // 詳細度の切り替えだけの場合は、移動では表示する店舗が変わらない
+            mapElement.on(CULL_MARKERS ? 'moveend zoomend' : 'zoomend', updateVisibleMarkers);
+        }}
+        updateVisibleMarkers();
+    }}
+
+    // 店舗にマーカーを割り当てて地図に載せる（再利用できるマーカーがあればそれを使う）
+    function showStoreMarker(store) {{
+        if (shownMarkers.has(store.id)) return shownMarkers.get(store.id);
+        let marker = markerPools[showCircles ? 'circle' : 'pin'].pop();
+        if (marker) {{
+            marker.store = store;
+            marker.options.brand = store.brand;
+            marker.setLatLng([store.lat, store.lon]);
+            marker.setTooltipContent(store.name);
+            if (showCircles) marker.setStyle({{ fillColor: PIN_COLORS_JS[store.brand] || '#999' }});
+            else marker.setIcon(storeIcon(store));
+        }} else {{
+            marker = newStoreMarker(store, showCircles);
+        }}
+        shownMarkers.set(store.id, marker);
+        layersById.set(store.layer_id, marker);
+        managedLayer.addLayer(marker);
+        return marker;
+    }}
+
+    function hideStoreMarker(storeId, marker) {{
+        managedLayer.removeLayer(marker);
+        shownMarkers.delete(storeId);
+        layersById.delete(marker.store.layer_id);
+        markerPools[marker instanceof L.CircleMarker ? 'circle' : 'pin'].push(marker);
+    }}
+
+    // 表示中のブランドの店舗（間引き表示では表示範囲にある店舗のみ）にマーカーを割り当てる
+    function updateVisibleMarkers() {{
+        if (!managedLayer) return;
+
+        // 円とピンを切り替える場合は、表示中のマーカーをすべて入れ替える（開いているポップアップは開き直す）
+        let reopenStore = null;
+        if (useCircleMarkers() !== showCircles) {{
+            shownMarkers.forEach((marker, storeId) => {{
+                if (marker.isPopupOpen()) reopenStore = marker.store;
+                hideStoreMarker(storeId, marker);
+            }});
+            showCircles = !showCircles;
+        }}
+
+        const visible = new Set();
+        if (CULL_MARKERS) {{
+            const bounds = mapElement.getBounds().pad(CULL_PADDING);
+            const addCell = stores => stores.forEach(store => {{
+                if (currentFilteredBrands.has(store.brand) && bounds.contains([store.lat, store.lon])) {{
+                    visible.add(store);
+                }}
+            }});
+
+            const rowMin = Math.floor(bounds.getSouth() / CULL_GRID_DEGREES);
+            const rowMax = Math.floor(bounds.getNorth() / CULL_GRID_DEGREES);
+            const colMin = Math.floor(bounds.getWest() / CULL_GRID_DEGREES);
+            const colMax = Math.floor(bounds.getEast() / CULL_GRID_DEGREES);
+            if ((rowMax - rowMin + 1) * (colMax - colMin + 1) > storeGrid.size) {{
+                // 広い範囲を表示している場合は、店舗のある格子だけを調べる
+                storeGrid.forEach(addCell);
+            }} else {{
+                for (let row = rowMin; row <= rowMax; row++) {{
+                    for (let col = colMin; col <= colMax; col++) {{
+                        const stores = storeGrid.get(gridKey(row, col));
+                        if (stores) addCell(stores);
+                    }}
+                }}
+            }}
+        }} else {{
+            allMarkersData.forEach(store => {{
+                if (currentFilteredBrands.has(store.brand)) visible.add(store);
+            }});
+        }}
+
+        // ポップアップを開いているマーカーは、範囲外でも閉じるまで残す
+        shownMarkers.forEach((marker, storeId) => {{
+            if (!visible.has(marker.store) && !marker.isPopupOpen()) hideStoreMarker(storeId, marker);
+        }});
+        visible.forEach(showStoreMarker);
+        if (reopenStore) showStoreMarker(reopenStore).openPopup();
+    }}
+</script>
+"""
+
+
+def iter_store_loader_js(stores_url: str) -> Iterator[str]:
+    """
+    分割出力モードで、店舗一覧JSONを読み込んでマーカーを作成するJavaScriptを生成
+
+    Args:
+        stores_url: 店舗一覧JSONのURL
+
+    Yields:
+        HTMLの断片
+    """
+    yield rf"""
+<script>
+    const STORES_URL = {json.dumps(stores_url)};
+
+    // 店舗一覧を読み込み、マーカーを作成する
+    $(document).ready(function() {{
+        fetch(STORES_URL)
+            .then(response => response.json())
+            .then(data => {{
+                addStores(data.rows.map(row => {{
+                    const store = {{}};
+                    data.fields.forEach((field, i) => {{ store[field] = row[i]; }});
+                    store.brand = data.brands[store.brand];
+                    store.pin_class = data.pins[store.pin];
+                    delete store.pin;
+                    return store;
+                }}));
+            }})
+            .catch(error => {{
+                console.error('店舗データの読み込みに失敗しました', error);
+                alert('店舗データの読み込みに失敗しました。ページを再読み込みしてください。');
+            }});
+    }});
+</script>
+"""
+
+
+# ============================================================================
+# メイン処理
+# ============================================================================
+
+def parse_args() -> argparse.Namespace:
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="スーパーマーケット地図アプリケーションを生成します。")
+    parser.add_argument(
+        '--workers', type=int, default=IMAGE_WORKERS,
+        help="画像生成に使うプロセス数（省略時はCPU数）"
+    )
+    parser.add_argument(
+        '--serial', action='store_true',
+        help="画像生成を並列化せずに1プロセスで実行する（デバッグ用）"
+    )
+    parser.add_argument(
+        '--pin-encoding', choices=list(PIN_ENCODINGS), default=PIN_ENCODING,
+        help="ピン画像のエンコード方式"
+    )
+    parser.add_argument(
+        '--pin-budget', type=int, default=PIN_BYTE_BUDGET,
+        help="1ピンあたりのバイト数の上限（0で無効）"
+    )
+    parser.add_argument(
+        '--strict-budget', action='store_true',
+        help="ピン画像が上限を超えた場合にビルドを失敗させる"
+    )
+    parser.add_argument(
+        '--external-assets', action='store_true', default=ASSET_MODE == ASSET_MODE_EXTERNAL,
+        help="画像などを assets フォルダに別ファイルとして出力する（サーバーで配信する場合。"
+             "--pwa・--chunked では常に有効）"
+    )
+    parser.add_argument(
+        '--chunked', action='store_true', default=CHUNKED_OUTPUT,
+        help="店舗データをHTMLに埋め込まず、店舗一覧とブランドごとのJSONに分けて出力する"
+    )
+    parser.add_argument(
+        '--cluster', action='store_true', default=CLUSTER_MARKERS,
+        help="近くの店舗のマーカーをクラスターにまとめる（店舗数が多い場合に地図の操作を軽くする）"
+    )
+    parser.add_argument(
+        '--markers', choices=[MARKER_BACKEND_FOLIUM, MARKER_BACKEND_GEOJSON], default=MARKER_BACKEND,
+        help="マーカーの出力方法（folium: 店舗ごとのマーカー, geojson: 全店舗を1つのGeoJSONレイヤーに描画）"
+    )
+    parser.add_argument(
+        '--renderer', choices=[RENDERER_FOLIUM, RENDERER_LEAFLET], default=RENDERER,
+        help="地図ページの出力方法（leaflet: Foliumを使わず1つのテンプレートから出力。マーカーは常にブラウザ側で作成）"
+    )
+    parser.add_argument(
+        '--canvas', action='store_true', default=CANVAS_MARKERS,
+        help="マーカーをブランド色の円として canvas に描画する（--markers geojson または --chunked と併用）"
+    )
+    parser.add_argument(
+        '--cull', action='store_true', default=CULL_MARKERS,
+        help="表示範囲にある店舗のマーカーだけを地図に載せる（--markers geojson または --chunked と併用）"
+    )
+    parser.add_argument(
+        '--lod', action='store_true', default=LOD_MARKERS,
+        help="引いた表示ではブランド色の円、ズームするとロゴのピンで描画する（--markers geojson または --chunked と併用）"
+    )
+    parser.add_argument(
+        '--lod-zoom', type=int, default=LOD_ZOOM,
+        help="--lod でロゴのピンに切り替えるズーム"
+    )
+    parser.add_argument(
+        '--vendor', action='store_true', default=VENDOR_LIBRARIES,
+        help="Leaflet などのライブラリを static フォルダに保存し、インターネット接続なしで表示できるようにする"
+    )
+    parser.add_argument(
+        '--pwa', action='store_true', default=PWA_OUTPUT,
+        help="マニフェストとサービスワーカーを出力し、2回目以降の表示を高速化・オフライン対応にする"
+    )
+    parser.add_argument(
+        '--no-precompress', action='store_true',
+        help="HTMLとアセットの圧縮版（.gz / .br）を出力しない"
+    )
+    parser.add_argument(
+        '--no-window', action='store_true',
+        help="生成後にアプリのウィンドウを開かない"
+    )
+    args = parser.parse_args()
+    # PWAのキャッシュと分割出力の遅延読み込みは、別ファイルのアセットを前提とする
+    args.external_assets = args.external_assets or args.pwa or args.chunked
+    args.browser_markers = (
+        args.chunked or args.markers == MARKER_BACKEND_GEOJSON or args.renderer == RENDERER_LEAFLET
+    )
+    if args.canvas and not args.browser_markers:
+        parser.error("--canvas は --markers geojson または --chunked と組み合わせてください")
+    if args.cull and not args.browser_markers:
+        parser.error("--cull は --markers geojson または --chunked と組み合わせてください")
+    if args.cull and args.cluster:
+        parser.error("--cull と --cluster は同時に指定できません（クラスターは表示範囲を自身で管理します）")
+    if args.lod and not args.browser_markers:
+        parser.error("--lod は --markers geojson または --chunked と組み合わせてください")
+    if args.lod and (args.canvas or args.cluster):
+        parser.error("--lod は --canvas・--cluster と同時に指定できません")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    workers = 1 if args.serial else args.workers
+
+    # データの準備
+    df, brand_registry = prepare_data()
+    os.makedirs(LOGO_FOLDER, exist_ok=True)
+
+    with TaskRunner(workers) as runner:
+        # 画像の準備
+        prepare_images(brand_registry, runner)
+
+        # ロゴの正規化（以降はサムネイルのみを読み込む）
+        logo_thumbnails = prepare_logo_thumbnails(brand_registry, runner)
+
+        # 全ピン画像の生成とスプライトアトラスへの集約
+        store_pin_keys, variant_pins = generate_all_pin_images(
+            df, brand_registry, logo_thumbnails, runner
+        )
+    encoder = PinEncoder(
+        args.pin_encoding,
+        budget_bytes=args.pin_budget or None,
+        on_over_budget=BUDGET_FAIL if args.strict_budget else BUDGET_WARN
+    )
+    output_dir = os.path.dirname(OUTPUT_HTML_FILE) or '.'
+    assets = AssetWriter(
+        ASSET_MODE_EXTERNAL if args.external_assets else ASSET_MODE_INLINE,
+        output_dir=output_dir,
+        assets_folder=ASSETS_FOLDER
+    )
+    pin_atlas, pin_sprite_css = build_pin_sprites(variant_pins, encoder, assets)
+
+    # フロントエンドライブラリ（各1つずつ。--vendor の場合はローカルのファイルを参照）
+    libraries = FRONTEND_LIBRARIES + (CLUSTER_LIBRARIES if args.cluster else [])
+    if args.renderer == RENDERER_LEAFLET:
+        libraries = leaflet_libraries(libraries)
+    static = AssetWriter(output_dir=output_dir, assets_folder=STATIC_FOLDER)
+    if args.vendor:
+        libraries = vendor_libraries(libraries, static, VENDOR_CACHE_FOLDER)
+
+    chunk_urls = write_store_chunks(df, store_pin_keys, pin_atlas, assets) if args.chunked else None
+
+    # PWA: マニフェストとアイコン（サービスワーカーはHTMLの書き出し後）
+    pwa_files = []
+    pwa_head = ''
+    if args.pwa:
+        app_icons = write_app_icons(PIN_BASE_IMAGE, APP_THEME_COLOR, assets)
+        pwa_files.append(write_manifest(
+            output_dir, os.path.basename(OUTPUT_HTML_FILE), APP_NAME, APP_SHORT_NAME, APP_THEME_COLOR, app_icons
+        ))
+        pwa_head = head_html(APP_THEME_COLOR, app_icons)
+
+    # 分割出力モード・GeoJSONモード・Leaflet直接出力では、マーカーはブラウザ側で作成する
+    write_app_html(
+        OUTPUT_HTML_FILE, df, store_pin_keys, pin_atlas, pin_sprite_css, libraries,
+        renderer=args.renderer,
+        browser_markers=args.browser_markers,
+        cluster=args.cluster,
+        chunk_urls=chunk_urls,
+        canvas=args.canvas,
+        cull=args.cull,
+        lod_zoom=args.lod_zoom if args.lod else None,
+        head_extra=pwa_head
+    )
+
+    if args.pwa:
+        # 特売データ（ブランドごとの詳細JSON）だけはネットワーク優先で取得する
+        deal_urls = [url for url in (chunk_urls.brands.values() if chunk_urls else [])
+                     if not url.startswith('data:')]
+        pwa_files.append(write_service_worker(
+            output_dir,
+            [OUTPUT_HTML_FILE] + pwa_files + assets.written + static.written,
+            library_urls_to_cache(library.url for library in libraries),
+            deal_urls
+        ))
+
+    # 配信用の圧縮版（start_mobile_server.py が Accept-Encoding に応じて返す）
+    if PRECOMPRESS_OUTPUT and not args.no_precompress:
+        precompress_artifacts([OUTPUT_HTML_FILE] + pwa_files + assets.written + static.written)
+
+    print(f"\n処理が完了しました！全{df.shape[0]}店舗の情報を地図に組み込みました。")
+    print("新機能: 地図上の任意の場所をクリックすると、そこが現在地(基準点)となり、詳細リストが更新されます。")
+
+    if args.no_window:
+        return
+
+    # --- 生成したHTMLをアプリのウィンドウで開く ---
+    webview.create_window(
+        f"SMAP - Supermarket Map App (全{df.shape[0]}店舗)", 
+        OUTPUT_HTML_FILE,               
+        width=1200, height=800,  
+        resizable=True           
+    )
+    webview.start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+HTML出力モジュール
+
+Foliumの地図とアプリのUIを、1回の書き込みで出力ファイルに流し込みます。
+保存したHTMLを読み直して文字列を差し込む方式と違い、UIを含めた文書全体の
+文字列をメモリ上に作りません。書き込みは一時ファイルに行い、完了後に
+置き換えるため、途中で失敗しても既存のファイルは壊れません。
+"""
+import json
+from typing import Any, ContextManager, Iterable, Iterator, TextIO
+
+import folium
+
+from atomic_file import atomic_writer
+
+VIEWPORT_META = (
+    '    <meta name="viewport" content="width=device-width, initial-scale=1.0, '
+    'maximum-scale=1.0, user-scalable=no">\n'
+)
+
+
+def atomic_text_writer(path: str, encoding: str = 'utf-8') -> ContextManager[TextIO]:
+    """
+    一時ファイルに書き込み、正常に閉じられたら path に置き換える（テキスト用の atomic_writer）
+
+    Args:
+        path: 出力先のパス
+        encoding: 文字コード
+
+    Returns:
+        書き込み用のファイルオブジェクトを返すコンテキストマネージャー
+    """
+    return atomic_writer(path, 'w', encoding)
+
+
+def iter_json(value: Any) -> Iterator[str]:
+    """
+    JSONを少しずつ生成する（json.dumps と同じ出力）
+
+    店舗数が増えても、配列全体のJSON文字列をメモリ上に作りません。
+    """
+    return json.JSONEncoder().iterencode(value)
+
+
+def write_map_html(m: folium.Map, path: str, body_prefix: Iterable[str]) -> None:
+    """
+    地図を書き出し、<body>の直後にUIを挿入する
+
+    地図の文書は Figure.render() で1つの文字列として描画し、UIの断片は
+    文字列に連結せず、その間に順に書き込みます。
+
+    Args:
+        m: Foliumマップ
+        path: 出力先のパス
+        body_prefix: <body>の直後に挿入するHTMLの断片
+    """
+    document = m.get_root().render()
+    head_end = document.index('</head>')
+    body_start = document.index('<body>', head_end) + len('<body>')
+
+    with atomic_text_writer(path) as f:
+        f.write(document[:head_end])
+        # viewportメタタグ（モバイル対応）
+        if '<meta name="viewport"' not in document[:head_end]:
+            f.write(VIEWPORT_META)
+        f.write(document[head_end:body_start])
+        for chunk in body_prefix:
+            f.write(chunk)
+        f.write(document[body_start:])
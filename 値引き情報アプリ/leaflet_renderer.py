@@ -0,0 +1,126 @@
+"""
+Leaflet直接出力モジュール
+
+Foliumを使わずに、地図のページを1つの文字列テンプレートから書き出します。
+Foliumはマップ・タイル・マーカーなどのオブジェクトごとにテンプレートを描画しますが、
+ここでは地図とタイルレイヤー（とクラスター）を作る数行のスクリプトだけを出力し、
+店舗マーカーはブラウザ側で店舗データ（GeoJSON または分割出力のJSON）から作成します。
+"""
+import html
+import json
+from typing import Iterable, List, Optional, Sequence
+
+from html_writer import VIEWPORT_META, atomic_text_writer
+from vendor_assets import FrontendLibrary
+
+TILE_URL = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'
+TILE_OPTIONS = {
+    'maxZoom': 19,
+    'attribution': '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
+}
+
+# Foliumのマーカー（folium.Icon）だけが使うライブラリ。直接出力では読み込まない
+FOLIUM_ONLY_LIBRARIES = ('awesome_markers', 'awesome_markers_css')
+
+PAGE_HEAD_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>{title}</title>
+{links}
+{viewport}    <style>
+        html, body {{ width: 100%; height: 100%; margin: 0; padding: 0; }}
+        #{map_var} {{ position: absolute; top: 0; bottom: 0; right: 0; left: 0; }}
+        .leaflet-container {{ font-size: 1rem; }}
+    </style>
+    {head_extra}
+</head>
+<body>"""
+
+PAGE_MAP_TEMPLATE = """
+<div id="{map_var}"></div>
+<script>
+    var {map_var} = L.map({map_id}, {map_options});
+    L.tileLayer({tile_url}, {tile_options}).addTo({map_var});
+    {marker_layer_script}
+</script>
+</body>
+</html>"""
+
+
+def leaflet_libraries(libraries: Iterable[FrontendLibrary]) -> List[FrontendLibrary]:
+    """
+    直接出力で読み込むライブラリ（Foliumのマーカー用のプラグインを除く）
+    """
+    return [library for library in libraries if library.name not in FOLIUM_ONLY_LIBRARIES]
+
+
+def library_links(libraries: Iterable[FrontendLibrary]) -> str:
+    """
+    ライブラリを読み込む<script>・<link>タグ（Foliumと同じくスクリプトを先に並べる）
+    """
+    libraries = list(libraries)
+    tags = [f'    <script src="{library.url}"></script>' for library in libraries if library.kind == 'js']
+    tags += [f'    <link rel="stylesheet" href="{library.url}"/>' for library in libraries if library.kind == 'css']
+    return '\n'.join(tags)
+
+
+def write_leaflet_html(
+    path: str,
+    libraries: Iterable[FrontendLibrary],
+    center: Sequence[float],
+    zoom: int,
+    body_prefix: Iterable[str],
+    map_var: str,
+    marker_layer_var: str,
+    cluster_options: Optional[dict] = None,
+    cluster_icon_function: str = '',
+    title: str = '',
+    head_extra: str = ''
+) -> None:
+    """
+    地図のページを書き出す
+
+    地図のスクリプトは<body>の末尾に置くため、<body>の直後に挿入するUIのスクリプトは
+    $(document).ready() の中で地図の変数を参照します（Foliumの出力と同じ順序）。
+
+    Args:
+        path: 出力先のパス
+        libraries: 読み込むライブラリ
+        center: 地図の中心（緯度, 経度）
+        zoom: 初期ズーム
+        body_prefix: <body>の直後に挿入するHTMLの断片
+        map_var: 地図を格納するJavaScriptの変数名（地図の要素のIDにも使う）
+        marker_layer_var: マーカーの追加先を格納するJavaScriptの変数名
+        cluster_options: 指定した場合はマーカーをクラスターにまとめる（L.markerClusterGroup のオプション）
+        cluster_icon_function: クラスターのアイコンを作成するJavaScriptの関数名
+        title: ページのタイトル（エスケープして出力する）
+        head_extra: <head>に追加するHTML
+    """
+    if cluster_options is None:
+        marker_layer_script = f"var {marker_layer_var} = {map_var};" if marker_layer_var != map_var else ''
+    else:
+        icon_option = f", {{ iconCreateFunction: {cluster_icon_function} }}" if cluster_icon_function else ''
+        marker_layer_script = (
+            f"var {marker_layer_var} = L.markerClusterGroup(Object.assign({json.dumps(cluster_options)}"
+            f"{icon_option})).addTo({map_var});"
+        )
+
+    with atomic_text_writer(path) as f:
+        f.write(PAGE_HEAD_TEMPLATE.format(
+            title=html.escape(title),
+            links=library_links(libraries),
+            viewport=VIEWPORT_META,
+            map_var=map_var,
+            head_extra=head_extra,
+        ))
+        for chunk in body_prefix:
+            f.write(chunk)
+        f.write(PAGE_MAP_TEMPLATE.format(
+            map_var=map_var,
+            map_id=json.dumps(map_var),
+            map_options=json.dumps({'center': list(center), 'zoom': zoom, 'zoomControl': True}),
+            tile_url=json.dumps(TILE_URL),
+            tile_options=json.dumps(TILE_OPTIONS),
+            marker_layer_script=marker_layer_script,
+        ))
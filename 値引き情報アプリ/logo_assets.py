@@ -0,0 +1,263 @@
+"""
+ロゴ画像の準備モジュール
+
+ロゴファイルが見つからないブランドの代替ロゴを生成し、
+各ブランドのロゴをピン合成用の小さなサムネイルに正規化します。
+生成処理は TaskRunner からプロセスプールで並列実行できるよう、
+引数と戻り値が pickle 可能なトップレベル関数として定義しています。
+"""
+import hashlib
+import json
+import logging
+import os
+from io import BytesIO
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from atomic_file import atomic_writer
+from parallel import TaskResult, TaskRunner
+
+logger = logging.getLogger(__name__)
+
+# 正規化処理の内容を変更したときに上げる（古いサムネイルを無効化するため）
+THUMBNAIL_VERSION = 1
+
+DEFAULT_THUMBNAIL_FOLDER = '.logo_cache'
+THUMBNAIL_MANIFEST = 'manifest.json'
+
+# 余白の除去で背景色とみなす色差
+TRIM_TOLERANCE = 16
+
+
+class PlaceholderLogoTask(NamedTuple):
+    """代替ロゴ1件分の生成条件"""
+    brand_name: str
+    color: str
+    size: Tuple[int, int]
+    font_path: Optional[str]
+    font_size: int
+
+
+def render_placeholder_logo(task: PlaceholderLogoTask) -> TaskResult:
+    """
+    ブランド名の頭文字を中央に配置した代替ロゴ画像（PNG）を生成
+
+    Args:
+        task: 生成条件
+
+    Returns:
+        PNGバイト列を持つ結果（失敗時は error にメッセージ）
+    """
+    warnings = []
+    try:
+        size = task.size
+        img = Image.new('RGBA', size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+
+        draw.ellipse((0, 0, size[0], size[1]), fill=task.color)
+
+        initial = task.brand_name[0]
+
+        # フォントの読み込み
+        font = ImageFont.load_default()
+        if task.font_path:
+            try:
+                font = ImageFont.truetype(task.font_path, task.font_size)
+            except Exception:
+                warnings.append(
+                    f"フォント '{task.font_path}' の読み込みに失敗しました。デフォルトフォントを使用します。"
+                )
+
+        fill_color = "#FFFFFF"
+
+        # テキストの中央配置
+        if hasattr(draw, 'textbbox'):
+            text_bbox = draw.textbbox((0, 0), initial, font=font)
+            text_width = text_bbox[2] - text_bbox[0]
+            text_height = text_bbox[3] - text_bbox[1]
+            x = (size[0] - text_width) // 2
+            y = (size[1] - text_height) // 2
+            draw.text((x, y), initial, font=font, fill=fill_color)
+        else:
+            draw.text(
+                (size[0] // 4, size[1] // 4),
+                initial,
+                fill=fill_color,
+                font=font
+            )
+
+        buffered = BytesIO()
+        img.save(buffered, format="PNG")
+        return TaskResult(buffered.getvalue(), tuple(warnings))
+
+    except Exception as e:
+        return TaskResult(None, tuple(warnings), str(e))
+
+
+class LogoThumbnailTask(NamedTuple):
+    """ロゴ1件分の正規化条件"""
+    source_path: str
+    size: Tuple[int, int]
+
+
+def _trim(img: Image.Image) -> Image.Image:
+    """
+    ロゴの周囲の余白（透明部分、または四隅と同じ色の帯）を取り除く
+    """
+    bbox = img.getchannel('A').getbbox()
+    if bbox is None:
+        return img
+    img = img.crop(bbox)
+
+    background = Image.new('RGBA', img.size, img.getpixel((0, 0)))
+    diff = ImageChops.difference(img, background).convert('L')
+    bbox = diff.point(lambda value: 255 if value > TRIM_TOLERANCE else 0).getbbox()
+    if bbox is None:
+        return img
+    return img.crop(bbox)
+
+
+def normalize_logo(task: LogoThumbnailTask) -> TaskResult:
+    """
+    ロゴを余白除去・RGBA変換し、縦横比を保って指定サイズに縮小したPNGを生成
+
+    縮小後の画像は指定サイズの透明なキャンバスの中央に配置します。
+
+    Args:
+        task: 正規化条件
+
+    Returns:
+        PNGバイト列を持つ結果（失敗時は error にメッセージ）
+    """
+    try:
+        with Image.open(task.source_path) as source:
+            img = _trim(source.convert('RGBA'))
+        img.thumbnail(task.size, Image.LANCZOS)
+
+        canvas = Image.new('RGBA', task.size, (0, 0, 0, 0))
+        canvas.paste(img, ((task.size[0] - img.width) // 2, (task.size[1] - img.height) // 2))
+
+        buffered = BytesIO()
+        canvas.save(buffered, format="PNG", optimize=True)
+        return TaskResult(buffered.getvalue())
+
+    except Exception as e:
+        return TaskResult(None, (), f"ロゴ '{task.source_path}' の正規化に失敗しました: {e}")
+
+
+class LogoThumbnailCache:
+    """
+    正規化済みロゴサムネイルのキャッシュ
+
+    サムネイルは (元画像の内容ハッシュ, サイズ, 処理バージョン) から決まる名前で保存します。
+    元画像のハッシュはマニフェストに更新時刻・サイズと一緒に記録し、
+    それらが変わらない限り元画像を読み直しません。
+    """
+
+    def __init__(self, size: Tuple[int, int], cache_dir: str = DEFAULT_THUMBNAIL_FOLDER):
+        """
+        Args:
+            size: サムネイルのサイズ
+            cache_dir: キャッシュフォルダ
+        """
+        self.size = size
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._manifest_path = os.path.join(cache_dir, THUMBNAIL_MANIFEST)
+        self._manifest = self._load_manifest()
+        self.stats = {'hits': 0, 'normalized': 0}
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        try:
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self) -> None:
+        self._write_atomic(
+            self._manifest_path,
+            json.dumps(self._manifest, ensure_ascii=False, indent=1).encode('utf-8')
+        )
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        """一時ファイル経由で書き込む（途中で中断されても壊れない）"""
+        try:
+            with atomic_writer(path) as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"ロゴキャッシュの書き込みに失敗しました: {e}")
+
+    def _source_digest(self, path: str) -> Optional[str]:
+        """
+        元画像の内容ハッシュ（更新時刻とサイズが記録と同じなら再計算しない）
+
+        ファイルが存在しない場合は None を返します。
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        abspath = os.path.abspath(path)
+        entry = self._manifest.get(abspath)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['sha256']
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._manifest[abspath] = {
+            'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest
+        }
+        return digest
+
+    def thumbnail_path(self, source_digest: str) -> str:
+        parts = [f"v{THUMBNAIL_VERSION}", source_digest, f"{self.size[0]}x{self.size[1]}"]
+        key = hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def prepare(self, source_paths: Iterable[str], runner: Optional[TaskRunner] = None) -> Dict[str, str]:
+        """
+        ロゴのサムネイルを用意する。キャッシュに無いものだけを正規化する
+
+        Args:
+            source_paths: 元のロゴ画像のパス
+            runner: 正規化に使う実行器（Noneの場合は直列）
+
+        Returns:
+            元画像のパスとサムネイルのパスの対応（元画像が無い・正規化に失敗したものは含まない）
+        """
+        thumbnails: Dict[str, str] = {}
+        pending: Dict[str, str] = {}  # サムネイルのパス -> 元画像のパス
+        for source_path in dict.fromkeys(source_paths):
+            digest = self._source_digest(source_path)
+            if digest is None:
+                continue
+            thumb_path = self.thumbnail_path(digest)
+            if os.path.exists(thumb_path):
+                self.stats['hits'] += 1
+                thumbnails[source_path] = thumb_path
+            elif thumb_path in pending.values() or thumb_path in thumbnails.values():
+                # 内容が同じ別名のファイル
+                thumbnails[source_path] = thumb_path
+            else:
+                pending[source_path] = thumb_path
+
+        tasks = [LogoThumbnailTask(source_path, self.size) for source_path in pending]
+        if runner is None:
+            results = [normalize_logo(task) for task in tasks]
+        else:
+            results = runner.map(normalize_logo, tasks)
+        for (source_path, thumb_path), result in zip(pending.items(), results):
+            if result.data is None:
+                logger.error(result.error)
+                continue
+            self._write_atomic(thumb_path, result.data)
+            self.stats['normalized'] += 1
+            thumbnails[source_path] = thumb_path
+
+        self._save_manifest()
+        # 内容が同じ別名のファイルは、正規化に失敗していれば除く
+        return {
+            source_path: thumb_path for source_path, thumb_path in thumbnails.items()
+            if os.path.exists(thumb_path)
+        }
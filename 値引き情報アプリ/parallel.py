@@ -0,0 +1,90 @@
+"""
+並列処理ユーティリティ
+
+画像生成などのCPU負荷の高い処理をプロセスプールで並列実行します。
+結果は常に入力と同じ順序で返すため、直列実行と同じ出力になります。
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# これより少ないタスク数ではプロセス起動のコストが上回るため直列で実行する
+DEFAULT_MIN_PARALLEL_TASKS = 4
+
+
+class TaskResult(NamedTuple):
+    """
+    並列タスクの結果
+
+    ワーカー内ではログを出さず、メッセージを返してメインプロセスで出力します。
+    """
+    data: Optional[bytes]
+    warnings: Tuple[str, ...] = ()
+    error: Optional[str] = None
+
+
+class TaskRunner:
+    """
+    順序を保ったまま関数を各要素に適用する実行器
+
+    プロセスプールは最初に並列実行が必要になった時点で起動し、
+    複数の処理段で使い回します。workers が1以下なら常に直列で実行します。
+    並列実行する関数と引数は pickle 可能である必要があります。
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        min_parallel_tasks: int = DEFAULT_MIN_PARALLEL_TASKS
+    ):
+        """
+        Args:
+            workers: ワーカープロセス数（Noneの場合はCPU数、1以下で直列実行）
+            min_parallel_tasks: 並列実行に切り替える最小タスク数
+        """
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.min_parallel_tasks = min_parallel_tasks
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def serial(self) -> bool:
+        return self.workers <= 1
+
+    def map(self, func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        各要素に関数を適用し、入力と同じ順序で結果を返す
+
+        Args:
+            func: モジュールのトップレベルで定義された関数
+            items: 引数の列
+
+        Returns:
+            結果のリスト
+        """
+        items = list(items)
+        if self.serial or len(items) < self.min_parallel_tasks:
+            return [func(item) for item in items]
+
+        if self._executor is None:
+            logger.info(f"画像処理を{self.workers}プロセスで並列実行します。")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        chunksize = max(1, len(items) // (self.workers * 4))
+        return list(self._executor.map(func, items, chunksize=chunksize))
+
+    def close(self) -> None:
+        """プロセスプールを終了する"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> 'TaskRunner':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
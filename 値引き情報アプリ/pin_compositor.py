@@ -0,0 +1,299 @@
+"""
+ピン画像合成モジュール
+
+ロゴとピンベースを合成したピン画像を、入力内容のハッシュをキーにして
+メモリとディスクにキャッシュします。同じブランドの店舗は同じピンを共有し、
+ロゴが変わらない限り再ビルド時にPILでの合成処理を行いません。
+"""
+import hashlib
+import logging
+import os
+from io import BytesIO
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+from atomic_file import atomic_writer
+from parallel import TaskResult, TaskRunner
+
+logger = logging.getLogger(__name__)
+
+# 合成処理の内容を変更したときに上げる（古いキャッシュを無効化するため）
+COMPOSITOR_VERSION = 2
+
+DEFAULT_CACHE_FOLDER = '.pin_cache'
+
+
+def composite_logo_pin(
+    logo_path: str,
+    pin_base_path: str,
+    pin_color: str,
+    pin_size: Tuple[int, int],
+    logo_size: Tuple[int, int]
+) -> bytes:
+    """
+    ロゴとピンベースを合成したPNG画像を生成
+
+    Args:
+        logo_path: ロゴ画像のパス
+        pin_base_path: ピンベース画像のパス
+        pin_color: ピンの色
+        pin_size: ピン画像のサイズ
+        logo_size: ロゴサイズ
+
+    Returns:
+        PNG画像のバイト列
+    """
+    # ピンベースとロゴは原寸から出力サイズへ直接リサンプリングする（二重の縮小を避ける）
+    pin_base = Image.open(pin_base_path).convert("RGBA").resize(
+        pin_size, Image.LANCZOS
+    )
+    logo_img = Image.open(logo_path).convert("RGBA").resize(
+        logo_size, Image.LANCZOS
+    )
+
+    # カラー付きピンシェイプの作成
+    colored_background = Image.new('RGBA', pin_base.size, pin_color)
+    pin_mask = pin_base.split()[-1]
+    colored_pin_shape = Image.new('RGBA', pin_base.size, (0, 0, 0, 0))
+    colored_pin_shape.paste(colored_background, (0, 0), pin_mask)
+
+    # ロゴを中央に配置（ピンの高さの1/10だけ上にオフセット）
+    x_offset = (colored_pin_shape.width - logo_img.width) // 2
+    y_offset = (colored_pin_shape.height - logo_img.height) // 2 - colored_pin_shape.height // 10
+    final_pin = colored_pin_shape.copy()
+    final_pin.paste(logo_img, (x_offset, y_offset), logo_img)
+
+    buffered = BytesIO()
+    final_pin.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def solid_color_pin(pin_color: str, pin_size: Tuple[int, int]) -> bytes:
+    """
+    単色のピン画像を生成（フォールバック用）
+
+    Args:
+        pin_color: ピンの色
+        pin_size: ピン画像のサイズ
+
+    Returns:
+        PNG画像のバイト列
+    """
+    img = Image.new('RGBA', pin_size, (0, 0, 0, 0))
+    ImageDraw.Draw(img).ellipse(
+        (0, 0, pin_size[0] - 1, pin_size[1] - 1),
+        fill=pin_color
+    )
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+class PinTask(NamedTuple):
+    """ピン画像1件分の合成条件"""
+    logo_path: str
+    pin_base_path: str
+    pin_color: str
+    pin_size: Tuple[int, int]
+    logo_size: Tuple[int, int]
+
+
+def composite_pin_task(task: PinTask) -> TaskResult:
+    """
+    ピン画像を合成（失敗時は単色ピン、それも失敗した場合はデータなし）
+
+    TaskRunner からプロセスプールで実行できるトップレベル関数です。
+    """
+    warnings = []
+    try:
+        return TaskResult(composite_logo_pin(
+            task.logo_path, task.pin_base_path, task.pin_color, task.pin_size, task.logo_size
+        ))
+    except Exception as e:
+        warnings.append(f"ピン画像合成中にエラーが発生しました: {e}. 単色ピンを使用します。")
+    try:
+        return TaskResult(solid_color_pin(task.pin_color, task.pin_size), tuple(warnings))
+    except Exception as e:
+        return TaskResult(None, tuple(warnings), f"単色ピン生成に失敗しました: {e}")
+
+
+class PinCompositor:
+    """
+    内容アドレス方式のキャッシュ付きピン画像合成器
+
+    キャッシュキーは (ロゴのバイト列, ピンベースのバイト列, 色, サイズ) のハッシュです。
+    同一ビルド内ではメモリ上で、ビルド間ではキャッシュフォルダのPNGで再利用します。
+    キーは同じ見た目のピンを共有するための識別子としても使えます。
+    """
+
+    def __init__(
+        self,
+        pin_base_path: str,
+        pin_size: Tuple[int, int],
+        logo_size: Tuple[int, int],
+        cache_dir: Optional[str] = DEFAULT_CACHE_FOLDER
+    ):
+        """
+        Args:
+            pin_base_path: ピンベース画像のパス
+            pin_size: ピン画像のサイズ
+            logo_size: ロゴサイズ
+            cache_dir: ディスクキャッシュのフォルダ（Noneの場合はメモリのみ）
+        """
+        self.pin_base_path = pin_base_path
+        self.pin_size = pin_size
+        self.logo_size = logo_size
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._file_digests: Dict[Tuple[str, int, int], str] = {}
+        self._pins: Dict[str, bytes] = {}
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'composited': 0}
+
+    def _file_digest(self, path: str) -> str:
+        """
+        ファイル内容のハッシュ（パス・更新時刻・サイズが同じ間はメモ化）
+
+        ファイルが存在しない場合は 'missing' を返します。
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 'missing'
+        memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        digest = self._file_digests.get(memo_key)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            self._file_digests[memo_key] = digest
+        return digest
+
+    def pin_key(self, logo_path: str, pin_color: str) -> str:
+        """
+        ピン画像のキャッシュキーを計算
+
+        Args:
+            logo_path: ロゴ画像のパス
+            pin_color: ピンの色
+
+        Returns:
+            16進数のハッシュ文字列
+        """
+        parts = [
+            f"v{COMPOSITOR_VERSION}",
+            self._file_digest(logo_path),
+            self._file_digest(self.pin_base_path),
+            pin_color.upper(),
+            f"{self.pin_size[0]}x{self.pin_size[1]}",
+            f"{self.logo_size[0]}x{self.logo_size[1]}",
+        ]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _read_cache(self, key: str) -> Optional[bytes]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_cache(self, key: str, png: bytes) -> None:
+        """
+        キャッシュファイルを一時ファイル経由で書き込む（途中で中断されても壊れない）
+        """
+        if not self.cache_dir:
+            return
+        try:
+            with atomic_writer(self._cache_path(key)) as f:
+                f.write(png)
+        except OSError as e:
+            logger.warning(f"ピン画像キャッシュの書き込みに失敗しました: {e}")
+
+    def _task(self, logo_path: str, pin_color: str) -> PinTask:
+        return PinTask(logo_path, self.pin_base_path, pin_color, self.pin_size, self.logo_size)
+
+    def _store(self, key: str, result: TaskResult) -> Optional[bytes]:
+        """
+        合成結果のログを出力し、メモリとディスクのキャッシュに登録する
+        """
+        for message in result.warnings:
+            logger.error(message)
+        if result.data is None:
+            logger.error(result.error)
+            return None
+        self.stats['composited'] += 1
+        self._write_cache(key, result.data)
+        self._pins[key] = result.data
+        return result.data
+
+    def _lookup(self, key: str) -> Optional[bytes]:
+        """
+        メモリ、ディスクの順にキャッシュを探す
+        """
+        png = self._pins.get(key)
+        if png is not None:
+            self.stats['memory_hits'] += 1
+            return png
+        png = self._read_cache(key)
+        if png is not None:
+            self.stats['disk_hits'] += 1
+            self._pins[key] = png
+        return png
+
+    def render(self, logo_path: str, pin_color: str) -> Optional[bytes]:
+        """
+        ピン画像（PNG）を取得。キャッシュに無い場合のみ合成する
+
+        Args:
+            logo_path: ロゴ画像のパス
+            pin_color: ピンの色
+
+        Returns:
+            PNG画像のバイト列、生成できない場合はNone
+        """
+        key = self.pin_key(logo_path, pin_color)
+        png = self._lookup(key)
+        if png is not None:
+            return png
+        return self._store(key, composite_pin_task(self._task(logo_path, pin_color)))
+
+    def render_many(
+        self,
+        requests: Sequence[Tuple[str, str]],
+        runner: Optional[TaskRunner] = None
+    ) -> Dict[str, Optional[bytes]]:
+        """
+        複数のピン画像をまとめて取得。キャッシュに無いものだけを合成する
+
+        Args:
+            requests: (ロゴ画像のパス, ピンの色) の列
+            runner: 合成に使う実行器（Noneの場合は直列）
+
+        Returns:
+            ピン画像キーとPNGバイト列（生成できない場合はNone）の対応。
+            requests の順序で、重複するキーは最初の1件だけ含む
+        """
+        results: Dict[str, Optional[bytes]] = {}
+        pending: Dict[str, PinTask] = {}
+        for logo_path, pin_color in requests:
+            key = self.pin_key(logo_path, pin_color)
+            if key in results:
+                continue
+            results[key] = self._lookup(key)
+            if results[key] is None:
+                pending[key] = self._task(logo_path, pin_color)
+
+        tasks = list(pending.values())
+        if runner is None:
+            composited = [composite_pin_task(task) for task in tasks]
+        else:
+            composited = runner.map(composite_pin_task, tasks)
+        for key, result in zip(pending, composited):
+            results[key] = self._store(key, result)
+        return results
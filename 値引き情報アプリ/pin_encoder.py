@@ -0,0 +1,206 @@
+"""
+ピン画像エンコードモジュール
+
+合成済みのピン画像（32bit RGBA PNG）を、配信サイズの小さい形式に
+エンコードし直します。パレットPNG・最適化PNG・WebP（可逆/非可逆）から
+選択でき、1ピンあたりのバイト数の上限（予算）を超えた場合は警告または
+エラーにします。エンコード前後のバイト数を集計して削減量を報告します。
+"""
+import logging
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+# エンコード方式 -> (説明, MIMEタイプ)
+PIN_ENCODINGS = {
+    'png': ('32bit PNG（変換なし）', 'image/png'),
+    'png-optimized': ('最適化PNG', 'image/png'),
+    'png-palette': ('減色パレットPNG', 'image/png'),
+    'webp-lossless': ('可逆WebP', 'image/webp'),
+    'webp': ('非可逆WebP', 'image/webp'),
+}
+
+DEFAULT_PIN_ENCODING = 'png-palette'
+DEFAULT_PALETTE_COLORS = 256
+DEFAULT_WEBP_QUALITY = 85
+
+# 予算超過時の扱い
+BUDGET_WARN = 'warn'
+BUDGET_FAIL = 'fail'
+
+
+class PinEncodingError(ValueError):
+    """エンコード方式の指定が不正な場合、または予算を超過した場合のエラー"""
+
+
+@dataclass
+class EncodedImage:
+    """エンコード済み画像"""
+    data: bytes
+    mime_type: str
+    encoding: str
+
+    @property
+    def extension(self) -> str:
+        """ファイル拡張子（ドットなし）"""
+        return self.mime_type.split('/')[-1]
+
+
+def encode_image(
+    image: Image.Image,
+    encoding: str,
+    palette_colors: int = DEFAULT_PALETTE_COLORS,
+    webp_quality: int = DEFAULT_WEBP_QUALITY
+) -> EncodedImage:
+    """
+    RGBA画像を指定の方式でエンコード
+
+    Args:
+        image: エンコードする画像
+        encoding: PIN_ENCODINGS のいずれか
+        palette_colors: パレットPNGの色数
+        webp_quality: 非可逆WebPの品質 (0-100)
+
+    Returns:
+        エンコード済み画像
+    """
+    if encoding not in PIN_ENCODINGS:
+        raise PinEncodingError(
+            f"不明なエンコード方式です: {encoding} (選択肢: {', '.join(PIN_ENCODINGS)})"
+        )
+
+    image = image.convert('RGBA')
+    buffered = BytesIO()
+    if encoding == 'png':
+        image.save(buffered, format='PNG')
+    elif encoding == 'png-optimized':
+        image.save(buffered, format='PNG', optimize=True)
+    elif encoding == 'png-palette':
+        # 透過を保ったまま減色できるのは FASTOCTREE のみ
+        quantized = image.quantize(colors=palette_colors, method=Image.Quantize.FASTOCTREE)
+        quantized.save(buffered, format='PNG', optimize=True)
+    elif encoding == 'webp-lossless':
+        image.save(buffered, format='WEBP', lossless=True, method=6)
+    else:
+        image.save(buffered, format='WEBP', quality=webp_quality, method=6)
+    return EncodedImage(buffered.getvalue(), PIN_ENCODINGS[encoding][1], encoding)
+
+
+class PinEncoder:
+    """
+    予算チェックと削減量の集計を行うピン画像エンコーダー
+
+    encode() に渡した画像ごとに、元のPNGとエンコード後のバイト数を累計します。
+    """
+
+    def __init__(
+        self,
+        encoding: str = DEFAULT_PIN_ENCODING,
+        budget_bytes: Optional[int] = None,
+        on_over_budget: str = BUDGET_WARN,
+        palette_colors: int = DEFAULT_PALETTE_COLORS,
+        webp_quality: int = DEFAULT_WEBP_QUALITY
+    ):
+        """
+        Args:
+            encoding: PIN_ENCODINGS のいずれか
+            budget_bytes: 1ピンあたりのバイト数の上限（Noneの場合はチェックしない）
+            on_over_budget: 上限を超えたときの扱い（'warn' または 'fail'）
+            palette_colors: パレットPNGの色数
+            webp_quality: 非可逆WebPの品質 (0-100)
+        """
+        if encoding not in PIN_ENCODINGS:
+            raise PinEncodingError(
+                f"不明なエンコード方式です: {encoding} (選択肢: {', '.join(PIN_ENCODINGS)})"
+            )
+        if on_over_budget not in (BUDGET_WARN, BUDGET_FAIL):
+            raise PinEncodingError(f"不明な予算超過時の扱いです: {on_over_budget}")
+        if PIN_ENCODINGS[encoding][1] == 'image/webp' and not features.check('webp'):
+            logger.warning(
+                f"このPillowはWebPに対応していないため、'{encoding}' の代わりに "
+                f"'png-palette' を使用します。"
+            )
+            encoding = 'png-palette'
+
+        self.encoding = encoding
+        self.budget_bytes = budget_bytes
+        self.on_over_budget = on_over_budget
+        self.palette_colors = palette_colors
+        self.webp_quality = webp_quality
+        self.original_bytes = 0
+        self.encoded_bytes = 0
+        self.count = 0
+
+    @property
+    def mime_type(self) -> str:
+        return PIN_ENCODINGS[self.encoding][1]
+
+    def encode(
+        self,
+        png: bytes,
+        label: str = '',
+        pin_count: int = 1
+    ) -> EncodedImage:
+        """
+        PNG画像をエンコードし、予算をチェックして集計に加える
+
+        Args:
+            png: 元のPNGバイト列
+            label: ログに表示する名前
+            pin_count: 画像に含まれるピンの数（アトラスの場合はセル数。予算はこの倍になる）
+
+        Returns:
+            エンコード済み画像
+
+        Raises:
+            PinEncodingError: on_over_budget が 'fail' で予算を超過した場合
+        """
+        encoded = encode_image(
+            Image.open(BytesIO(png)), self.encoding, self.palette_colors, self.webp_quality
+        )
+        self.check_budget(len(encoded.data), label, pin_count)
+        self.original_bytes += len(png)
+        self.encoded_bytes += len(encoded.data)
+        self.count += 1
+        return encoded
+
+    def check_budget(self, size: int, label: str = '', pin_count: int = 1) -> None:
+        """
+        バイト数が予算内かどうかを確認
+
+        Args:
+            size: エンコード後のバイト数
+            label: ログに表示する名前
+            pin_count: 画像に含まれるピンの数
+
+        Raises:
+            PinEncodingError: on_over_budget が 'fail' で予算を超過した場合
+        """
+        if self.budget_bytes is None:
+            return
+        budget = self.budget_bytes * pin_count
+        if size <= budget:
+            return
+        message = (
+            f"ピン画像 '{label}' が予算を超えています: {size:,} bytes > {budget:,} bytes "
+            f"({self.encoding})"
+        )
+        if self.on_over_budget == BUDGET_FAIL:
+            raise PinEncodingError(message)
+        logger.warning(message)
+
+    def log_summary(self) -> None:
+        """エンコード前後の合計バイト数と削減量をログに出力"""
+        if not self.count:
+            return
+        saved = self.original_bytes - self.encoded_bytes
+        ratio = saved / self.original_bytes * 100 if self.original_bytes else 0.0
+        logger.info(
+            f"ピン画像のエンコード ({PIN_ENCODINGS[self.encoding][0]}): "
+            f"{self.original_bytes:,} bytes → {self.encoded_bytes:,} bytes "
+            f"({saved:,} bytes / {ratio:.1f}% 削減)"
+        )
@@ -0,0 +1,119 @@
+"""
+ビルド成果物の事前圧縮モジュール
+
+HTMLやアセットの隣に、最大圧縮の gzip（.gz）と brotli（.br）版を書き出します。
+サーバーはリクエストごとに圧縮せず、Accept-Encoding に合ったファイルを返すだけで済みます。
+brotli は任意の依存です。インストールされていない場合は .gz のみを出力します。
+"""
+import gzip
+import logging
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from atomic_file import atomic_writer
+
+logger = logging.getLogger(__name__)
+
+# Content-Encoding -> ファイルの拡張子（サーバーはこの順で優先する）
+PRECOMPRESSED_SUFFIXES: Dict[str, str] = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+# 圧縮後のサイズがこの割合を超える場合は圧縮版を置かない（PNGなど圧縮済みの形式）
+MAX_COMPRESSED_RATIO = 0.9
+
+
+class CompressionResult(NamedTuple):
+    """1ファイル・1方式分の圧縮結果"""
+    path: str
+    encoding: str
+    original_bytes: int
+    compressed_bytes: int
+
+    @property
+    def ratio(self) -> float:
+        """圧縮後のサイズの割合（0〜1）"""
+        return self.compressed_bytes / self.original_bytes if self.original_bytes else 1.0
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        # mtime=0 で、内容が同じなら同じバイト列になるようにする
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def _is_fresh(path: str, source_mtime: float) -> bool:
+    try:
+        return os.path.getmtime(path) >= source_mtime
+    except OSError:
+        return False
+
+
+def precompress_file(path: str, encodings: Optional[Iterable[str]] = None) -> List[CompressionResult]:
+    """
+    ファイルの圧縮版を隣に書き出す（圧縮版が元ファイルより新しければ作り直さない）
+
+    Args:
+        path: 元ファイルのパス
+        encodings: 'gzip' / 'br' のうち出力するもの（Noneの場合は利用できるすべて）
+
+    Returns:
+        圧縮結果のリスト（ほとんど小さくならなかった方式は含まない）
+    """
+    if encodings is None:
+        encodings = [encoding for encoding in PRECOMPRESSED_SUFFIXES
+                     if encoding != 'br' or brotli is not None]
+
+    source_mtime = os.path.getmtime(path)
+    original_bytes = os.path.getsize(path)
+    data: Optional[bytes] = None
+    results = []
+    for encoding in encodings:
+        compressed_path = path + PRECOMPRESSED_SUFFIXES[encoding]
+        if not _is_fresh(compressed_path, source_mtime):
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            compressed = _compress(data, encoding)
+            if len(compressed) > original_bytes * MAX_COMPRESSED_RATIO:
+                if os.path.exists(compressed_path):
+                    os.remove(compressed_path)
+                continue
+            with atomic_writer(compressed_path) as f:
+                f.write(compressed)
+        results.append(CompressionResult(
+            path, encoding, original_bytes, os.path.getsize(compressed_path)
+        ))
+    return results
+
+
+def precompress_artifacts(paths: Iterable[str]) -> List[CompressionResult]:
+    """
+    複数のファイルを事前圧縮し、圧縮率をログに出力
+
+    Args:
+        paths: 元ファイルのパス
+
+    Returns:
+        圧縮結果のリスト
+    """
+    if brotli is None:
+        logger.warning("brotli がインストールされていないため、.br ファイルは生成しません。")
+
+    results = []
+    for path in dict.fromkeys(paths):
+        for result in precompress_file(path):
+            logger.info(
+                f"事前圧縮 ({result.encoding}): {result.path} "
+                f"{result.original_bytes:,} → {result.compressed_bytes:,} bytes "
+                f"({result.ratio * 100:.1f}%)"
+            )
+            results.append(result)
+    return results
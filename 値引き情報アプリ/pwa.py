@@ -0,0 +1,299 @@
+"""
+PWA（ホーム画面に追加できるWebアプリ）出力モジュール
+
+Webアプリマニフェストとサービスワーカーを出力HTMLの隣に書き出します。
+サービスワーカーはビルドごとのバージョン付きキャッシュを使い分けます。
+HTML・ピン画像・ライブラリは事前にキャッシュしておき、キャッシュから即座に返します。
+特売データは毎回ネットワークを優先し、接続できない場合のみキャッシュを返します。
+再生成すると sw.js の内容（バージョン）が変わり、ブラウザは次回表示時に新しいキャッシュへ
+切り替えます。
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+from typing import Iterable, List, NamedTuple
+
+from PIL import Image
+
+from asset_writer import AssetWriter
+from html_writer import atomic_text_writer
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.webmanifest'
+# サービスワーカーの制御範囲は自身のフォルダ以下なので、HTMLと同じフォルダに置く
+SERVICE_WORKER_FILE = 'sw.js'
+
+# ホーム画面・スプラッシュ画面用のアイコンサイズ
+APP_ICON_SIZES = (192, 512)
+# アイコン内のピンの大きさ（アイコンに対する割合。マスク可能アイコンの安全領域に収める）
+APP_ICON_PIN_RATIO = 0.6
+
+# 特売データの取得を待つ時間。超えた場合はキャッシュを返す
+NETWORK_TIMEOUT_MS = 3000
+
+# キャッシュ名の接頭辞（古いバージョンのキャッシュの削除に使う）
+CACHE_PREFIX = 'smap-'
+
+
+class AppIcon(NamedTuple):
+    """書き出したアプリアイコン"""
+    url: str
+    size: int
+
+
+def render_app_icon(pin_base_path: str, size: int, background: str) -> bytes:
+    """
+    ピンベース画像の形を白抜きにしたアプリアイコンを作成
+
+    Args:
+        pin_base_path: ピンベース画像のパス（アルファチャンネルを形として使う）
+        size: アイコンの一辺（ピクセル）
+        background: 背景色
+
+    Returns:
+        PNG画像のバイト列
+    """
+    icon = Image.new('RGBA', (size, size), background)
+    pin_size = int(size * APP_ICON_PIN_RATIO)
+    with Image.open(pin_base_path) as pin_base:
+        mask = pin_base.convert('RGBA').getchannel('A').resize((pin_size, pin_size), Image.LANCZOS)
+    offset = (size - pin_size) // 2
+    icon.paste((255, 255, 255, 255), (offset, offset, offset + pin_size, offset + pin_size), mask)
+
+    buffer = io.BytesIO()
+    icon.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def write_app_icons(pin_base_path: str, background: str, assets: AssetWriter) -> List[AppIcon]:
+    """
+    アプリアイコンを内容ハッシュ付きのファイルとして書き出す
+
+    Args:
+        pin_base_path: ピンベース画像のパス
+        background: 背景色
+        assets: 書き出し先
+
+    Returns:
+        書き出したアイコンのリスト
+    """
+    return [
+        AppIcon(assets.url(f"app-icon-{size}", render_app_icon(pin_base_path, size, background),
+                           'image/png', 'png'), size)
+        for size in APP_ICON_SIZES
+    ]
+
+
+def write_manifest(
+    output_dir: str,
+    start_url: str,
+    name: str,
+    short_name: str,
+    theme_color: str,
+    icons: List[AppIcon]
+) -> str:
+    """
+    Webアプリマニフェストを書き出す
+
+    Args:
+        output_dir: 出力HTMLのあるフォルダ
+        start_url: ホーム画面から開くページ（出力フォルダからの相対URL）
+        name: アプリ名
+        short_name: ホーム画面に表示する短い名前
+        theme_color: テーマカラー
+        icons: アプリアイコン
+
+    Returns:
+        書き出したファイルのパス
+    """
+    manifest = {
+        'name': name,
+        'short_name': short_name,
+        'start_url': start_url,
+        'scope': './',
+        'display': 'standalone',
+        'background_color': '#ffffff',
+        'theme_color': theme_color,
+        'icons': [
+            {'src': icon.url, 'sizes': f"{icon.size}x{icon.size}", 'type': 'image/png', 'purpose': 'any maskable'}
+            for icon in icons
+        ],
+    }
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with atomic_text_writer(path) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def head_html(theme_color: str, icons: List[AppIcon]) -> str:
+    """
+    マニフェスト・テーマカラー・サービスワーカー登録を<head>に追加するHTML
+
+    新しいバージョンのサービスワーカーが有効になったら、ページを1回だけ読み直して
+    新しいHTMLとデータに切り替えます。
+    """
+    touch_icon = max(icons, key=lambda icon: icon.size).url if icons else ''
+    return f"""<link rel="manifest" href="{MANIFEST_FILE}">
+    <meta name="theme-color" content="{theme_color}">
+    <link rel="apple-touch-icon" href="{touch_icon}">
+    <script>
+        if ('serviceWorker' in navigator) {{
+            window.addEventListener('load', function() {{
+                const hadController = !!navigator.serviceWorker.controller;
+                navigator.serviceWorker.addEventListener('controllerchange', function() {{
+                    if (hadController) location.reload();
+                }});
+                navigator.serviceWorker.register('{SERVICE_WORKER_FILE}').catch(function(error) {{
+                    console.warn('サービスワーカーを登録できませんでした:', error);
+                }});
+            }});
+        }}
+    </script>"""
+
+
+def _relative_url(path: str, output_dir: str) -> str:
+    return os.path.relpath(path, output_dir).replace(os.sep, '/')
+
+
+def _build_version(output_dir: str, urls: Iterable[str]) -> str:
+    """事前キャッシュするファイルの内容から、ビルドのバージョンを求める"""
+    digest = hashlib.sha256()
+    for url in sorted(urls):
+        digest.update(url.encode('utf-8'))
+        with open(os.path.join(output_dir, url), 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()[:12]
+
+
+def service_worker_js(
+    version: str,
+    shell_urls: List[str],
+    library_urls: List[str],
+    data_urls: List[str]
+) -> str:
+    """
+    サービスワーカーのスクリプトを作成
+
+    Args:
+        version: ビルドのバージョン（キャッシュ名に使う）
+        shell_urls: 事前キャッシュし、キャッシュ優先で返す同一オリジンのファイル
+        library_urls: CDNのライブラリ（取得できた場合のみ事前キャッシュし、キャッシュ優先で返す）
+        data_urls: 特売データ（事前キャッシュし、ネットワーク優先で返す）
+    """
+    return f"""// generate_map.py が生成したファイルです。直接編集しないでください。
+const VERSION = {json.dumps(version)};
+const SHELL_CACHE = '{CACHE_PREFIX}shell-' + VERSION;
+const DATA_CACHE = '{CACHE_PREFIX}data-' + VERSION;
+const SHELL_URLS = {json.dumps(shell_urls, ensure_ascii=False)};
+const LIBRARY_URLS = {json.dumps(library_urls)};
+const DATA_URLS = {json.dumps(data_urls, ensure_ascii=False)};
+const NETWORK_TIMEOUT_MS = {NETWORK_TIMEOUT_MS};
+
+const toAbsolute = url => new URL(url, self.location).href;
+const cacheFirstUrls = new Set(SHELL_URLS.concat(LIBRARY_URLS).map(toAbsolute));
+const dataUrls = new Set(DATA_URLS.map(toAbsolute));
+
+self.addEventListener('install', event => {{
+    event.waitUntil(Promise.all([
+        caches.open(SHELL_CACHE).then(cache =>
+            cache.addAll(SHELL_URLS).then(() =>
+                // CDNに接続できなくてもインストールは失敗させない
+                Promise.allSettled(LIBRARY_URLS.map(url => cache.add(url)))
+            )
+        ),
+        caches.open(DATA_CACHE).then(cache => cache.addAll(DATA_URLS)),
+    ]).then(() => self.skipWaiting()));
+}});
+
+self.addEventListener('activate', event => {{
+    event.waitUntil(
+        caches.keys().then(keys => Promise.all(
+            keys.filter(key => key.startsWith('{CACHE_PREFIX}') && key !== SHELL_CACHE && key !== DATA_CACHE)
+                .map(key => caches.delete(key))
+        )).then(() => self.clients.claim())
+    );
+}});
+
+function putInCache(cacheName, request, response) {{
+    if (response.ok) {{
+        const copy = response.clone();
+        caches.open(cacheName).then(cache => cache.put(request, copy));
+    }}
+    return response;
+}}
+
+function cacheFirst(request, cacheKey) {{
+    return caches.match(cacheKey).then(cached =>
+        cached || fetch(request).then(response => putInCache(SHELL_CACHE, cacheKey, response))
+    );
+}}
+
+function networkFirst(request) {{
+    const network = fetch(request).then(response => putInCache(DATA_CACHE, request, response));
+    const timeout = new Promise(resolve => setTimeout(resolve, NETWORK_TIMEOUT_MS));
+    const fromCache = () => caches.match(request).then(cached => cached || network);
+    return Promise.race([network, timeout.then(fromCache)]).catch(fromCache);
+}}
+
+self.addEventListener('fetch', event => {{
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    url.hash = '';
+    if (dataUrls.has(url.href)) {{
+        event.respondWith(networkFirst(request));
+        return;
+    }}
+    // ページはクエリ付きで開かれても同じHTMLを返す
+    if (request.mode === 'navigate') url.search = '';
+    if (cacheFirstUrls.has(url.href)) {{
+        event.respondWith(cacheFirst(request, url.href));
+    }}
+}});
+"""
+
+
+def write_service_worker(
+    output_dir: str,
+    shell_paths: Iterable[str],
+    library_urls: Iterable[str],
+    data_urls: Iterable[str]
+) -> str:
+    """
+    サービスワーカーを書き出す
+
+    出力HTMLなどを書き出した後に呼び出します（内容からバージョンを求めるため）。
+
+    Args:
+        output_dir: 出力HTMLのあるフォルダ
+        shell_paths: 事前キャッシュするファイルのパス（HTML・マニフェスト・アセット）
+        library_urls: CDNから読み込むライブラリのURL
+        data_urls: 特売データのURL（出力フォルダからの相対URL）
+
+    Returns:
+        書き出したファイルのパス
+    """
+    data_urls = list(dict.fromkeys(data_urls))
+    shell_urls = [
+        url for url in dict.fromkeys(_relative_url(path, output_dir) for path in shell_paths)
+        if url not in data_urls
+    ]
+    version = _build_version(output_dir, shell_urls + data_urls)
+
+    path = os.path.join(output_dir, SERVICE_WORKER_FILE)
+    with atomic_text_writer(path) as f:
+        f.write(service_worker_js(version, shell_urls, list(library_urls), data_urls))
+    logger.info(
+        f"サービスワーカーを書き出しました: {path} (バージョン {version}, "
+        f"事前キャッシュ {len(shell_urls)} + データ {len(data_urls)} ファイル)"
+    )
+    return path
+
+
+def library_urls_to_cache(urls: Iterable[str]) -> List[str]:
+    """CDNから読み込むライブラリのURLだけを取り出す"""
+    return [url for url in urls if url.startswith(('http://', 'https://'))]
@@ -0,0 +1,340 @@
+"""
+店舗の空間インデックスモジュール
+
+店舗の緯度経度を単位球面上の3次元座標に変換し、k-d木で索引します。
+球面上の弦の長さは大円距離と単調な関係にあるため、
+木の探索結果はHaversineによる全件走査と同じ順序になります。
+"""
+import heapq
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from distance import EARTH_RADIUS_M, distance_matrix
+
+# 葉ノードに格納する最大店舗数
+DEFAULT_LEAF_SIZE = 16
+
+
+class Neighbor(NamedTuple):
+    """検索結果の1件（店舗インデックスと距離）"""
+    index: int
+    distance: float  # メートル
+
+
+def _to_unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    緯度経度を単位球面上の (x, y, z) 座標に変換
+    """
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((
+        cos_lat * np.cos(lon_rad),
+        cos_lat * np.sin(lon_rad),
+        np.sin(lat_rad),
+    ))
+
+
+def _meters_to_chord(meters: float) -> float:
+    """
+    大円距離（メートル）を単位球面上の弦の長さに変換
+    """
+    angle = min(meters / EARTH_RADIUS_M, np.pi)
+    return 2.0 * np.sin(angle / 2.0)
+
+
+class _KDTree:
+    """
+    3次元座標の静的k-d木
+
+    ノード情報は探索時のオーバーヘッドを抑えるため、Pythonのリストで保持します。
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = DEFAULT_LEAF_SIZE):
+        """
+        Args:
+            points: (N, 3) の座標配列
+            leaf_size: 葉ノードに格納する最大点数
+        """
+        self._points = points
+        self._leaf_size = max(1, leaf_size)
+        self._order = np.arange(points.shape[0])
+
+        # ノードごとの情報: 範囲[start, end)、子ノード、バウンディングボックス
+        self._start: List[int] = []
+        self._end: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._lower: List[Tuple[float, float, float]] = []
+        self._upper: List[Tuple[float, float, float]] = []
+
+        if points.shape[0]:
+            self._build(0, points.shape[0])
+        self._sorted_points = points[self._order]
+
+    def _build(self, start: int, end: int) -> int:
+        """
+        [start, end) の点から部分木を構築し、ノード番号を返す
+        """
+        node = len(self._start)
+        subset = self._points[self._order[start:end]]
+        lower = subset.min(axis=0)
+        upper = subset.max(axis=0)
+
+        self._start.append(start)
+        self._end.append(end)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._lower.append(tuple(lower.tolist()))
+        self._upper.append(tuple(upper.tolist()))
+
+        if end - start <= self._leaf_size:
+            return node
+
+        # 広がりが最大の軸の中央値で分割
+        axis = int(np.argmax(upper - lower))
+        mid = (end - start) // 2
+        partition = np.argpartition(subset[:, axis], mid)
+        self._order[start:end] = self._order[start:end][partition]
+
+        self._left[node] = self._build(start, start + mid)
+        self._right[node] = self._build(start + mid, end)
+        return node
+
+    def _box_distance(self, node: int, query: Tuple[float, float, float]) -> float:
+        """
+        クエリ点からノードのバウンディングボックスまでの最短距離
+        """
+        total = 0.0
+        for q, lo, hi in zip(query, self._lower[node], self._upper[node]):
+            if q < lo:
+                total += (lo - q) ** 2
+            elif q > hi:
+                total += (q - hi) ** 2
+        return total ** 0.5
+
+    def _leaf_distances(self, node: int, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        葉ノード内の点の元インデックスと、クエリ点からの弦の長さ
+        """
+        start, end = self._start[node], self._end[node]
+        diff = self._sorted_points[start:end] - query
+        return self._order[start:end], np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+    def nearest(self, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """
+        弦の長さが小さい順にk点を返す（同距離はインデックス順）
+
+        Returns:
+            (弦の長さ, 点インデックス) のリスト
+        """
+        if k <= 0 or not self._start:
+            return []
+        query_tuple = tuple(query.tolist())
+        # best は (-距離, -インデックス) の最大ヒープ（先頭が現時点の k 番目）
+        best: List[Tuple[float, int]] = []
+        pending = [(0.0, 0)]
+        while pending:
+            bound, node = heapq.heappop(pending)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            left = self._left[node]
+            if left < 0:
+                indices, dists = self._leaf_distances(node, query)
+                for index, dist in zip(indices.tolist(), dists.tolist()):
+                    item = (-dist, -index)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                continue
+            for child in (left, self._right[node]):
+                child_bound = self._box_distance(child, query_tuple)
+                if len(best) < k or child_bound <= -best[0][0]:
+                    heapq.heappush(pending, (child_bound, child))
+        return sorted((-dist, -neg_index) for dist, neg_index in best)
+
+    def within(self, query: np.ndarray, radius: float) -> List[int]:
+        """
+        弦の長さが radius 以下の点のインデックスを返す（順不同）
+        """
+        if not self._start:
+            return []
+        query_tuple = tuple(query.tolist())
+        found: List[int] = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, query_tuple) > radius:
+                continue
+            left = self._left[node]
+            if left < 0:
+                indices, dists = self._leaf_distances(node, query)
+                found.extend(indices[dists <= radius].tolist())
+                continue
+            stack.append(left)
+            stack.append(self._right[node])
+        return found
+
+
+class StoreSpatialIndex:
+    """
+    店舗テーブルから構築する最寄り店舗検索用の空間インデックス
+
+    距離はHaversine（distanceモジュール）で計算し直すため、
+    全件走査で求めた距離と同じ値を返します。
+    """
+
+    def __init__(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        brands: Sequence[str],
+        labels: Optional[Sequence[int]] = None,
+        leaf_size: int = DEFAULT_LEAF_SIZE
+    ):
+        """
+        Args:
+            lats: 店舗の緯度
+            lons: 店舗の経度
+            brands: 店舗のブランド名
+            labels: 検索結果として返す店舗インデックス（省略時は0からの連番）
+            leaf_size: k-d木の葉ノードの最大店舗数
+        """
+        self._lats = np.asarray(lats, dtype=np.float64)
+        self._lons = np.asarray(lons, dtype=np.float64)
+        self._brands = np.asarray(brands, dtype=object)
+        if not (self._lats.shape == self._lons.shape == self._brands.shape):
+            raise ValueError("緯度・経度・ブランドの件数が一致しません")
+        if labels is None:
+            self._labels = np.arange(self._lats.shape[0])
+        else:
+            self._labels = np.asarray(labels)
+        self._leaf_size = leaf_size
+        self._points = _to_unit_vectors(self._lats, self._lons)
+        self._tree = _KDTree(self._points, leaf_size)
+
+        # ブランドごとの木は初回検索時に構築する
+        brand_rows: Dict[str, List[int]] = {}
+        for row, brand in enumerate(self._brands.tolist()):
+            brand_rows.setdefault(brand, []).append(row)
+        self._brand_rows: Dict[str, np.ndarray] = {
+            brand: np.asarray(rows, dtype=np.intp) for brand, rows in brand_rows.items()
+        }
+        self._brand_trees: Dict[str, _KDTree] = {}
+
+    @classmethod
+    def from_dataframe(cls, df, leaf_size: int = DEFAULT_LEAF_SIZE) -> 'StoreSpatialIndex':
+        """
+        prepare_data() で作成した店舗DataFrameからインデックスを構築
+
+        Args:
+            df: lat, lon, brand 列を持つ店舗DataFrame
+            leaf_size: k-d木の葉ノードの最大店舗数
+        """
+        return cls(
+            df['lat'].to_numpy(), df['lon'].to_numpy(), df['brand'].to_numpy(),
+            labels=df.index.to_numpy(), leaf_size=leaf_size
+        )
+
+    def __len__(self) -> int:
+        return self._lats.shape[0]
+
+    def _brand_tree(self, brand: str) -> Optional[_KDTree]:
+        """
+        ブランド内の店舗だけを索引した木を取得（未知のブランドはNone）
+        """
+        rows = self._brand_rows.get(brand)
+        if rows is None:
+            return None
+        tree = self._brand_trees.get(brand)
+        if tree is None:
+            tree = _KDTree(self._points[rows], self._leaf_size)
+            self._brand_trees[brand] = tree
+        return tree
+
+    def _to_neighbors(self, lat: float, lon: float, rows: Iterable[int]) -> List[Neighbor]:
+        """
+        行番号を距離順（同距離は行番号順）の検索結果に変換
+        """
+        rows = np.fromiter(rows, dtype=np.intp)
+        if rows.size == 0:
+            return []
+        points = np.column_stack((self._lats[rows], self._lons[rows]))
+        distances = distance_matrix((lat, lon), points)[0]
+        order = np.lexsort((rows, distances))
+        return [
+            Neighbor(int(self._labels[rows[i]]), float(distances[i]))
+            for i in order
+        ]
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 1,
+        brands: Optional[Iterable[str]] = None
+    ) -> List[Neighbor]:
+        """
+        基準点から近い順にk店舗を検索
+
+        Args:
+            lat: 基準点の緯度
+            lon: 基準点の経度
+            k: 取得する店舗数
+            brands: 対象とするブランド名（省略時は全ブランド）
+
+        Returns:
+            距離の昇順に並んだ検索結果
+        """
+        query = _to_unit_vectors(np.array([lat]), np.array([lon]))[0]
+        if brands is None:
+            candidates = [row for _, row in self._tree.nearest(query, k)]
+        else:
+            # ブランドごとの上位k件を集め、その中から改めて上位k件を選ぶ
+            candidates = []
+            for brand in set(brands):
+                tree = self._brand_tree(brand)
+                if tree is None:
+                    continue
+                rows = self._brand_rows[brand]
+                candidates.extend(rows[row] for _, row in tree.nearest(query, k))
+        return self._to_neighbors(lat, lon, candidates)[:k]
+
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        meters: float,
+        brands: Optional[Iterable[str]] = None
+    ) -> List[Neighbor]:
+        """
+        基準点から半径meters以内の店舗を検索
+
+        Args:
+            lat: 基準点の緯度
+            lon: 基準点の経度
+            meters: 検索半径（メートル）
+            brands: 対象とするブランド名（省略時は全ブランド）
+
+        Returns:
+            距離の昇順に並んだ検索結果
+        """
+        query = _to_unit_vectors(np.array([lat]), np.array([lon]))[0]
+        # 弦への変換誤差で境界上の店舗を取りこぼさないよう少し広めに探索する
+        radius = _meters_to_chord(meters) * (1 + 1e-9)
+        if brands is None:
+            candidates = self._tree.within(query, radius)
+        else:
+            candidates = []
+            for brand in set(brands):
+                tree = self._brand_tree(brand)
+                if tree is None:
+                    continue
+                rows = self._brand_rows[brand]
+                candidates.extend(rows[row] for row in tree.within(query, radius))
+        return [
+            neighbor for neighbor in self._to_neighbors(lat, lon, candidates)
+            if neighbor.distance <= meters
+        ]
@@ -0,0 +1,108 @@
+"""
+スプライトアトラス生成モジュール
+
+ブランドごとのピン画像を1枚のPNG（スプライトアトラス）にまとめ、
+CSSの背景位置で各ピンを切り出して表示できるようにします。
+ブラウザは店舗数に関係なく画像を1枚だけデコードすれば済みます。
+"""
+import math
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Mapping, Tuple
+
+from PIL import Image
+
+# アトラス内のピンを表示するCSSクラスの接頭辞
+SPRITE_CLASS = 'pin-sprite'
+
+
+@dataclass
+class SpriteAtlas:
+    """パック済みのスプライトアトラス"""
+    png: bytes
+    cell_size: Tuple[int, int]
+    columns: int
+    rows: int
+    slots: Dict[str, int]  # 画像キー -> スロット番号（左上から行優先）
+
+    def class_name(self, key: str) -> str:
+        """
+        画像キーに対応するCSSクラス（例: "pin-sprite pin-sprite-3"）
+        """
+        return f"{SPRITE_CLASS} {SPRITE_CLASS}-{self.slots[key]}"
+
+
+def pack_sprite_atlas(images: Mapping[str, bytes], cell_size: Tuple[int, int]) -> SpriteAtlas:
+    """
+    画像を正方形に近い格子状に並べて1枚のPNGにまとめる
+
+    Args:
+        images: 画像キーとPNGバイト列の対応（この順序でスロットを割り当てる）
+        cell_size: 1画像あたりのセルのサイズ（異なるサイズの画像は縮小・拡大する）
+
+    Returns:
+        スプライトアトラス
+    """
+    count = max(len(images), 1)
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    atlas = Image.new('RGBA', (columns * cell_size[0], rows * cell_size[1]), (0, 0, 0, 0))
+
+    slots: Dict[str, int] = {}
+    for slot, (key, png) in enumerate(images.items()):
+        image = Image.open(BytesIO(png)).convert('RGBA')
+        if image.size != cell_size:
+            image = image.resize(cell_size, Image.LANCZOS)
+        column, row = slot % columns, slot // columns
+        atlas.paste(image, (column * cell_size[0], row * cell_size[1]))
+        slots[key] = slot
+
+    buffered = BytesIO()
+    atlas.save(buffered, format='PNG')
+    return SpriteAtlas(buffered.getvalue(), cell_size, columns, rows, slots)
+
+
+def _percent(index: int, count: int) -> str:
+    """
+    背景位置のパーセント指定（要素サイズに依存せず index 番目のセルを指す）
+    """
+    if count <= 1:
+        return '0%'
+    return f"{index * 100 / (count - 1):.4f}%"
+
+
+def sprite_css(atlas: SpriteAtlas, image_urls: Mapping[int, str]) -> str:
+    """
+    アトラスからピンを切り出すCSSを生成
+
+    背景のサイズと位置をパーセントで指定するため、同じクラスを
+    マーカー（40px）・ポップアップ（20px）・一覧（30px）のどの大きさでも使えます。
+    解像度の異なるアトラスが複数ある場合は、デバイスピクセル比のメディアクエリで
+    切り替えます（data URL を埋め込んでも各画像が1回ずつしか現れないように
+    image-set() は使いません）。
+
+    Args:
+        atlas: スプライトアトラス（他の解像度のアトラスも同じ並び順であること）
+        image_urls: デバイスピクセル比とアトラス画像のURL（data URL も可）の対応
+
+    Returns:
+        CSSテキスト
+    """
+    scales = sorted(image_urls)
+    lines = [
+        f".{SPRITE_CLASS} {{ background-image: url('{image_urls[scales[0]]}'); "
+        f"background-size: {atlas.columns * 100}% {atlas.rows * 100}%; "
+        f"background-repeat: no-repeat; display: inline-block; }}"
+    ]
+    for scale in scales[1:]:
+        lines.append(
+            f"@media (-webkit-min-device-pixel-ratio: {scale}), (min-resolution: {scale}dppx) {{ "
+            f".{SPRITE_CLASS} {{ background-image: url('{image_urls[scale]}'); }} }}"
+        )
+    for slot in sorted(atlas.slots.values()):
+        column, row = slot % atlas.columns, slot // atlas.columns
+        lines.append(
+            f".{SPRITE_CLASS}-{slot} {{ background-position: "
+            f"{_percent(column, atlas.columns)} {_percent(row, atlas.rows)}; }}"
+        )
+    return '\n'.join(lines)
@@ -7,6 +7,7 @@
 import http.server
 import socketserver
 import socket
+import ssl
 import webbrowser
 import os
 import sys
@@ -17,15 +18,95 @@ PORT = 8000
 # HTMLファイル名
 HTML_FILE = "supermarket_app_map_clickable_list.html"
 
+# サービスワーカー（generate_map.py --pwa が出力）。更新を確実に検出させるためキャッシュさせない
+SERVICE_WORKER_FILE = "sw.js"
+
+# HTTPS用の証明書と秘密鍵（両方ある場合はHTTPSで起動する）
+# サービスワーカーは localhost 以外では HTTPS でのみ動作するため、スマートフォンで
+# オフライン表示を使う場合に必要です（例: mkcert で作成し、スマートフォンにルート証明書を入れる）
+SSL_CERT_FILE = "server.crt"
+SSL_KEY_FILE = "server.key"
+
+# 事前圧縮ファイル（generate_map.py が出力）: Content-Encoding -> 拡張子（優先順）
+PRECOMPRESSED_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def parse_accept_encoding(header):
+    """Accept-Encodingヘッダーから受け入れ可能な方式の集合を取得（q=0 は除外）"""
+    accepted = set()
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """カスタムHTTPリクエストハンドラー"""
+    extensions_map = dict(
+        http.server.SimpleHTTPRequestHandler.extensions_map,
+        **{'.webmanifest': 'application/manifest+json'}
+    )
+
     def end_headers(self):
         # CORSヘッダーを追加（モバイルアクセス用）
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        # 圧縮版を返すかどうかは Accept-Encoding で変わる
+        self.send_header('Vary', 'Accept-Encoding')
+        if self.path.split('?')[0].endswith('/' + SERVICE_WORKER_FILE):
+            self.send_header('Cache-Control', 'no-cache')
         super().end_headers()
 
+    def find_precompressed(self, path):
+        """クライアントが受け入れ可能で、元ファイルより新しい圧縮版を探す"""
+        accepted = parse_accept_encoding(self.headers.get('Accept-Encoding'))
+        if '*' in accepted:
+            accepted.update(coding for coding, _ in PRECOMPRESSED_SUFFIXES)
+        try:
+            source_mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        for coding, suffix in PRECOMPRESSED_SUFFIXES:
+            compressed_path = path + suffix
+            if coding in accepted and os.path.isfile(compressed_path) \
+                    and os.path.getmtime(compressed_path) >= source_mtime:
+                return coding, compressed_path
+        return None
+
+    def send_head(self):
+        """事前圧縮ファイルがあればそれを返す（リクエストごとの圧縮はしない）"""
+        path = self.translate_path(self.path)
+        found = self.find_precompressed(path) if os.path.isfile(path) else None
+        if found is None:
+            return super().send_head()
+
+        coding, compressed_path = found
+        try:
+            f = open(compressed_path, 'rb')
+        except OSError:
+            return super().send_head()
+        fs = os.fstat(f.fileno())
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Encoding', coding)
+        self.send_header('Content-Length', str(fs.st_size))
+        self.send_header('Last-Modified', self.date_time_string(fs.st_mtime))
+        self.end_headers()
+        return f
+
 def get_local_ip():
     """ローカルIPアドレスを取得"""
     try:
@@ -52,15 +133,22 @@ def main():
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
     with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
+        scheme = "http"
+        if os.path.exists(SSL_CERT_FILE) and os.path.exists(SSL_KEY_FILE):
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(SSL_CERT_FILE, SSL_KEY_FILE)
+            httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+            scheme = "https"
+
         print("=" * 60)
         print("📱 スマートフォンでアクセスできるサーバーを起動しました！")
         print("=" * 60)
         print()
         print(f"🖥️  パソコン（ローカル）でアクセス:")
-        print(f"   http://localhost:{PORT}/{HTML_FILE}")
+        print(f"   {scheme}://localhost:{PORT}/{HTML_FILE}")
         print()
         print(f"📱 スマートフォンでアクセス:")
-        print(f"   http://{local_ip}:{PORT}/{HTML_FILE}")
+        print(f"   {scheme}://{local_ip}:{PORT}/{HTML_FILE}")
         print()
         print("⚠️  重要:")
         print("   1. スマートフォンとパソコンが同じWiFiネットワークに接続されていることを確認してください")
@@ -72,7 +160,7 @@ def main():
         
         # ブラウザで自動的に開く（オプション）
         try:
-            webbrowser.open(f"http://localhost:{PORT}/{HTML_FILE}")
+            webbrowser.open(f"{scheme}://localhost:{PORT}/{HTML_FILE}")
         except:
             pass
         
@@ -0,0 +1,116 @@
+"""
+店舗データ分割出力モジュール
+
+分割出力モードでは、HTMLには店舗ごとのデータを埋め込まず、
+地図表示に必要な最小限の項目だけを持つ店舗一覧JSONと、
+ポップアップや特売情報の表示に使うブランドごとの詳細JSONを別ファイルに書き出します。
+HTML（初回表示）の大きさは店舗数に依存しません。
+"""
+import json
+from typing import Dict, List, NamedTuple, Tuple
+
+import pandas as pd
+
+from asset_writer import AssetWriter
+from sprite_atlas import SpriteAtlas
+
+# 店舗一覧JSONの各行の項目（JavaScript 側で同名のプロパティに展開する）
+STORE_FIELDS = ['id', 'name', 'brand', 'lat', 'lon', 'distance', 'pin']
+
+# 詳細JSONの項目: JavaScript 側のプロパティ名 -> DataFrame の列名
+DETAIL_FIELDS = {
+    'website': 'website',
+    'souzai': 'souzai_info',
+    'sengyo': 'sengyo_info',
+    'niku': 'niku_info',
+    'seika': 'seika_info',
+}
+
+# 緯度経度の小数点以下の桁数（約0.1m）
+COORDINATE_DIGITS = 6
+
+
+class StoreChunkUrls(NamedTuple):
+    """書き出したJSONのURL"""
+    stores: str
+    brands: Dict[str, str]  # ブランド名 -> 詳細JSONのURL
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def build_store_chunks(
+    df: pd.DataFrame,
+    store_pin_keys: Dict[int, str],
+    pin_atlas: SpriteAtlas
+) -> Tuple[dict, Dict[str, dict]]:
+    """
+    店舗一覧と、ブランドごとの詳細データを作成
+
+    店舗一覧はブランド名とピンのCSSクラスを表への添字で持つ行の配列です。
+
+    Args:
+        df: 店舗データのDataFrame
+        store_pin_keys: 店舗インデックスとピン画像キーの対応
+        pin_atlas: ピン画像のスプライトアトラス
+
+    Returns:
+        店舗一覧と、ブランド名をキーとする詳細データ（店舗ID -> 詳細）
+    """
+    brands: Dict[str, int] = {}
+    pins: Dict[str, int] = {'': 0}
+    rows: List[list] = []
+    details: Dict[str, dict] = {}
+
+    for index, row in df.iterrows():
+        store_id = f'marker-{index}'
+        pin_key = store_pin_keys.get(index)
+        pin_class = pin_atlas.class_name(pin_key) if pin_key else ''
+        rows.append([
+            store_id,
+            row['name'],
+            brands.setdefault(row['brand'], len(brands)),
+            round(float(row['lat']), COORDINATE_DIGITS),
+            round(float(row['lon']), COORDINATE_DIGITS),
+            int(row['distance_from_reference']),
+            pins.setdefault(pin_class, len(pins)),
+        ])
+        details.setdefault(row['brand'], {})[store_id] = {
+            key: row[column] for key, column in DETAIL_FIELDS.items()
+        }
+
+    stores = {
+        'fields': STORE_FIELDS,
+        'brands': list(brands),
+        'pins': list(pins),
+        'rows': rows,
+    }
+    return stores, details
+
+
+def write_store_chunks(
+    df: pd.DataFrame,
+    store_pin_keys: Dict[int, str],
+    pin_atlas: SpriteAtlas,
+    assets: AssetWriter
+) -> StoreChunkUrls:
+    """
+    店舗一覧と詳細データを内容ハッシュ付きのJSONファイルとして書き出す
+
+    Args:
+        df: 店舗データのDataFrame
+        store_pin_keys: 店舗インデックスとピン画像キーの対応
+        pin_atlas: ピン画像のスプライトアトラス
+        assets: 書き出し先
+
+    Returns:
+        書き出したJSONのURL
+    """
+    stores, details = build_store_chunks(df, store_pin_keys, pin_atlas)
+    brand_urls = {
+        brand: assets.url(f"stores-brand{number}", _dumps(chunk), 'application/json', 'json')
+        for number, (brand, chunk) in enumerate(details.items())
+    }
+    stores_url = assets.url('stores', _dumps(stores), 'application/json', 'json')
+    return StoreChunkUrls(stores_url, brand_urls)
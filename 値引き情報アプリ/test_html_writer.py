@@ -0,0 +1,56 @@
+"""
+HTML出力（html_writer）のテスト
+"""
+import os
+import re
+
+import folium
+import pytest
+
+from html_writer import VIEWPORT_META, atomic_text_writer, write_map_html
+
+UI_CHUNKS = ['<div id="ui">', 'アプリのUI', '</div>']
+
+# Foliumが要素ごとに振るランダムなID（例: map_4bc8d9ff...）
+ELEMENT_ID = re.compile(r'_[0-9a-f]{32}\b')
+
+
+def make_map() -> folium.Map:
+    m = folium.Map(location=[34.49, 133.36], zoom_start=13)
+    folium.Marker([34.49, 133.36], tooltip='店舗').add_to(m)
+    return m
+
+
+def normalize_ids(html: str) -> str:
+    return ELEMENT_ID.sub('_<id>', html)
+
+
+def test_write_map_html_inserts_ui_into_rendered_figure(tmp_path):
+    path = str(tmp_path / 'map.html')
+    write_map_html(make_map(), path, iter(UI_CHUNKS))
+
+    with open(path, encoding='utf-8') as f:
+        written = normalize_ids(f.read())
+    # 同じ Figure を2回描画すると一部のスクリプトが重複するため、同じ内容の別の地図と比べる
+    expected = normalize_ids(make_map().get_root().render())
+
+    ui = ''.join(UI_CHUNKS)
+    assert written.index(ui) == written.index('<body>') + len('<body>')
+    without_ui = written.replace(ui, '', 1)
+    if VIEWPORT_META not in expected:
+        without_ui = without_ui.replace(VIEWPORT_META, '', 1)
+    assert without_ui == expected
+    assert written.count('<meta name="viewport"') == 1
+
+
+def test_atomic_text_writer_keeps_existing_file_on_failure(tmp_path):
+    path = tmp_path / 'out.html'
+    path.write_text('old', encoding='utf-8')
+
+    with pytest.raises(RuntimeError):
+        with atomic_text_writer(str(path)) as f:
+            f.write('new')
+            raise RuntimeError
+
+    assert path.read_text(encoding='utf-8') == 'old'
+    assert os.listdir(tmp_path) == ['out.html']
@@ -0,0 +1,160 @@
+"""
+空間インデックス（spatial_index）のテスト
+
+ランダムな店舗データで、StoreSpatialIndex の検索結果が
+Haversineによる全件走査と一致することを確認します。
+"""
+import numpy as np
+import pytest
+
+from distance import distance_matrix
+from spatial_index import StoreSpatialIndex
+
+BRANDS = ('エブリイ', 'フレスタ', 'フジ', 'ハローズ', 'ラ・ムー')
+
+# (緯度の範囲, 経度の範囲): 福山市周辺・日付変更線付近・北極付近・南極付近
+REGIONS = {
+    'fukuyama': ((34.40, 34.60), (133.25, 133.50)),
+    'antimeridian': ((-10.0, 10.0), (179.0, 181.0)),
+    'north_pole': ((88.0, 90.0), (-180.0, 180.0)),
+    'south_pole': ((-90.0, -88.0), (-180.0, 180.0)),
+}
+
+
+def make_catalog(region: str, count: int, seed: int):
+    """
+    指定した地域にランダムな店舗を配置（経度は -180〜180 に正規化）
+
+    Returns:
+        (緯度, 経度, ブランド) の配列
+    """
+    rng = np.random.default_rng(seed)
+    lat_range, lon_range = REGIONS[region]
+    lats = rng.uniform(*lat_range, count)
+    lons = (rng.uniform(*lon_range, count) + 180.0) % 360.0 - 180.0
+    brands = rng.choice(BRANDS, count)
+    return lats, lons, brands
+
+
+def make_queries(region: str, count: int, seed: int):
+    """
+    指定した地域のランダムな基準点
+    """
+    lats, lons, _ = make_catalog(region, count, seed)
+    return list(zip(lats.tolist(), lons.tolist()))
+
+
+def brute_force(lats, lons, brands, lat, lon, allowed=None):
+    """
+    全店舗の距離を計算し、距離順（同距離は行番号順）に並べる
+
+    Returns:
+        (行番号, 距離) のリスト
+    """
+    distances = distance_matrix((lat, lon), np.column_stack((lats, lons)))[0]
+    rows = np.arange(len(lats))
+    if allowed is not None:
+        mask = np.isin(brands, list(allowed))
+        rows, distances = rows[mask], distances[mask]
+    order = np.lexsort((rows, distances))
+    return [(int(rows[i]), float(distances[i])) for i in order]
+
+
+def assert_same(neighbors, expected):
+    assert [neighbor.index for neighbor in neighbors] == [row for row, _ in expected]
+    np.testing.assert_allclose(
+        [neighbor.distance for neighbor in neighbors], [distance for _, distance in expected]
+    )
+
+
+@pytest.mark.parametrize('region', sorted(REGIONS))
+@pytest.mark.parametrize('k', [1, 5, 40])
+def test_nearest_matches_brute_force(region, k):
+    lats, lons, brands = make_catalog(region, 300, seed=1)
+    index = StoreSpatialIndex(lats, lons, brands, leaf_size=4)
+    for lat, lon in make_queries(region, 20, seed=2):
+        expected = brute_force(lats, lons, brands, lat, lon)[:k]
+        assert_same(index.nearest(lat, lon, k), expected)
+
+
+@pytest.mark.parametrize('region', sorted(REGIONS))
+@pytest.mark.parametrize('allowed', [('フジ',), ('エブリイ', 'ハローズ'), BRANDS])
+def test_nearest_with_brands_matches_brute_force(region, allowed):
+    lats, lons, brands = make_catalog(region, 300, seed=3)
+    index = StoreSpatialIndex(lats, lons, brands, leaf_size=4)
+    for lat, lon in make_queries(region, 20, seed=4):
+        expected = brute_force(lats, lons, brands, lat, lon, allowed)[:7]
+        assert_same(index.nearest(lat, lon, 7, brands=allowed), expected)
+
+
+@pytest.mark.parametrize('region', sorted(REGIONS))
+def test_nearest_with_k_larger_than_catalog(region):
+    lats, lons, brands = make_catalog(region, 25, seed=5)
+    index = StoreSpatialIndex(lats, lons, brands)
+    lat, lon = make_queries(region, 1, seed=6)[0]
+
+    assert_same(index.nearest(lat, lon, 100), brute_force(lats, lons, brands, lat, lon))
+    assert_same(
+        index.nearest(lat, lon, 100, brands=['フジ']),
+        brute_force(lats, lons, brands, lat, lon, ['フジ'])
+    )
+
+
+def test_empty_brand_filter_and_unknown_brand():
+    lats, lons, brands = make_catalog('fukuyama', 50, seed=7)
+    index = StoreSpatialIndex(lats, lons, brands)
+    lat, lon = make_queries('fukuyama', 1, seed=8)[0]
+
+    assert index.nearest(lat, lon, 5, brands=[]) == []
+    assert index.nearest(lat, lon, 5, brands=['存在しないブランド']) == []
+    assert index.within_radius(lat, lon, 1e7, brands=[]) == []
+
+
+def test_empty_catalog():
+    index = StoreSpatialIndex([], [], [])
+
+    assert len(index) == 0
+    assert index.nearest(34.5, 133.4, 3) == []
+    assert index.within_radius(34.5, 133.4, 1000.0) == []
+
+
+@pytest.mark.parametrize('region, meters', [
+    ('fukuyama', 3000.0),
+    ('antimeridian', 100000.0),
+    ('north_pole', 50000.0),
+    ('south_pole', 50000.0),
+])
+@pytest.mark.parametrize('allowed', [None, ('フレスタ', 'ラ・ムー')])
+def test_within_radius_matches_brute_force(region, meters, allowed):
+    lats, lons, brands = make_catalog(region, 300, seed=9)
+    index = StoreSpatialIndex(lats, lons, brands, leaf_size=4)
+    found = 0
+    for lat, lon in make_queries(region, 20, seed=10):
+        expected = [
+            (row, distance) for row, distance in brute_force(lats, lons, brands, lat, lon, allowed)
+            if distance <= meters
+        ]
+        assert_same(index.within_radius(lat, lon, meters, brands=allowed), expected)
+        found += len(expected)
+    # 半径が小さすぎて常に0件になる組み合わせでは検証にならない
+    assert found > 0
+
+
+def test_antimeridian_neighbors_across_the_line():
+    # 経度 179.999 と -179.999 は約220m しか離れていない
+    index = StoreSpatialIndex([0.0, 0.0, 0.0], [-179.999, 170.0, 179.0], BRANDS[:3])
+
+    nearest = index.nearest(0.0, 179.999, 1)
+    assert nearest[0].index == 0
+    assert nearest[0].distance < 300.0
+
+
+def test_from_dataframe_returns_dataframe_labels():
+    pd = pytest.importorskip('pandas')
+    lats, lons, brands = make_catalog('fukuyama', 30, seed=11)
+    df = pd.DataFrame({'lat': lats, 'lon': lons, 'brand': brands}, index=np.arange(100, 130))
+    index = StoreSpatialIndex.from_dataframe(df)
+    lat, lon = make_queries('fukuyama', 1, seed=12)[0]
+
+    expected = brute_force(lats, lons, brands, lat, lon)[:5]
+    assert [neighbor.index for neighbor in index.nearest(lat, lon, 5)] == [100 + row for row, _ in expected]
@@ -0,0 +1,212 @@
+"""
+フロントエンドライブラリ管理モジュール
+
+地図とUIが使うJavaScript/CSSライブラリを1か所で定義します。
+Foliumの既定のライブラリとUIが個別に読み込んでいたもの（jQuery・Font Awesome の
+重複、使っていない Bootstrap など）をまとめ、各ライブラリを1つずつだけ読み込みます。
+オフライン用には、ライブラリとCSSが参照するフォント・画像を static フォルダに
+内容ハッシュ付きのファイル名で保存し、参照先をローカルのファイルに書き換えます。
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import urllib.request
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urljoin, urlsplit
+
+import folium
+
+from asset_writer import AssetWriter
+from atomic_file import atomic_writer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VENDOR_CACHE_FOLDER = '.vendor_cache'
+DOWNLOAD_TIMEOUT = 30  # 秒
+
+# CSS内の url(...) 参照
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+class FrontendLibrary(NamedTuple):
+    """読み込むライブラリ1件"""
+    name: str  # Foliumのリンク名（同じ名前のリンクは1つにまとめられる）
+    kind: str  # 'js' または 'css'
+    url: str
+
+
+# 地図とUIが必要とするライブラリ（この順序で<head>に並ぶ）
+FRONTEND_LIBRARIES: List[FrontendLibrary] = [
+    FrontendLibrary('leaflet', 'js', 'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js'),
+    FrontendLibrary('jquery', 'js', 'https://code.jquery.com/jquery-3.7.1.min.js'),
+    # ピン画像が無い店舗の代替マーカー（folium.Icon）用
+    FrontendLibrary(
+        'awesome_markers', 'js',
+        'https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.js'
+    ),
+    FrontendLibrary('leaflet_css', 'css', 'https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css'),
+    FrontendLibrary(
+        'awesome_markers_font_css', 'css',
+        'https://cdn.jsdelivr.net/npm/@fortawesome/fontawesome-free@6.2.0/css/all.min.css'
+    ),
+    FrontendLibrary(
+        'awesome_markers_css', 'css',
+        'https://cdnjs.cloudflare.com/ajax/libs/Leaflet.awesome-markers/2.0.2/leaflet.awesome-markers.css'
+    ),
+]
+
+# マーカーのクラスタリング（--cluster）で追加するライブラリ
+CLUSTER_LIBRARIES: List[FrontendLibrary] = [
+    FrontendLibrary(
+        'markerclusterjs', 'js',
+        'https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/leaflet.markercluster.js'
+    ),
+    FrontendLibrary(
+        'markerclustercss', 'css',
+        'https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.css'
+    ),
+]
+
+
+class VendorError(RuntimeError):
+    """ライブラリを取得できなかった場合のエラー"""
+
+
+class LibraryVendor:
+    """
+    ライブラリをダウンロードして static フォルダに保存する
+
+    ダウンロードした内容はURLごとにキャッシュし、次回以降のビルドではネットワークに接続しません。
+    """
+
+    def __init__(self, static: AssetWriter, cache_dir: str = DEFAULT_VENDOR_CACHE_FOLDER):
+        """
+        Args:
+            static: ライブラリの書き出し先（external モード）
+            cache_dir: ダウンロードしたファイルのキャッシュフォルダ
+        """
+        self.static = static
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def fetch(self, url: str) -> bytes:
+        """
+        URLの内容を取得（キャッシュがあればそれを使う）
+
+        Raises:
+            VendorError: ダウンロードに失敗した場合
+        """
+        cache_path = self._cache_path(url)
+        try:
+            with open(cache_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+
+        try:
+            with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+                data = response.read()
+        except Exception as e:
+            raise VendorError(f"'{url}' のダウンロードに失敗しました: {e}") from e
+
+        with atomic_writer(cache_path) as f:
+            f.write(data)
+        logger.info(f"ダウンロードしました: {url} ({len(data):,} bytes)")
+        return data
+
+    def _write(self, url: str, data: bytes) -> str:
+        """
+        URLのファイル名を元に、内容ハッシュ付きのファイル名で書き出す
+
+        Returns:
+            static フォルダ内のファイル名
+        """
+        basename = posixpath.basename(urlsplit(url).path) or 'index'
+        stem, _, extension = basename.rpartition('.')
+        if not stem:
+            stem, extension = extension, 'bin'
+        written_url = self.static.url(stem, data, '', extension)
+        return posixpath.basename(written_url)
+
+    def _rewrite_css(self, css_url: str, css: str) -> str:
+        """
+        CSSが参照するフォント・画像を書き出し、参照先を書き出したファイルに置き換える
+        """
+        replacements: Dict[str, str] = {}
+
+        def replace(match: re.Match) -> str:
+            reference = match.group(2).strip()
+            if reference.startswith(('data:', '#')):
+                return match.group(0)
+            # クエリ（キャッシュ対策）は除き、フラグメント（SVGフォントのID）は残す
+            target, _, fragment = urljoin(css_url, reference).partition('#')
+            target = target.split('?')[0]
+            if target not in replacements:
+                replacements[target] = self._write(target, self.fetch(target))
+            suffix = f"#{fragment}" if fragment else ''
+            return f"url('{replacements[target]}{suffix}')"
+
+        return CSS_URL_PATTERN.sub(replace, css)
+
+    def vendor(self, library: FrontendLibrary) -> str:
+        """
+        ライブラリ（CSSの場合は参照先も含む）を書き出す
+
+        Returns:
+            出力HTMLからの相対URL
+
+        Raises:
+            VendorError: ダウンロードに失敗した場合
+        """
+        data = self.fetch(library.url)
+        if library.kind == 'css':
+            data = self._rewrite_css(library.url, data.decode('utf-8')).encode('utf-8')
+        return f"{self.static.assets_folder}/{self._write(library.url, data)}"
+
+
+def vendor_libraries(
+    libraries: List[FrontendLibrary],
+    static: AssetWriter,
+    cache_dir: str = DEFAULT_VENDOR_CACHE_FOLDER
+) -> List[FrontendLibrary]:
+    """
+    ライブラリを static フォルダに保存し、参照先をローカルのファイルに置き換えたリストを返す
+
+    取得できなかったライブラリは警告を出し、CDNのURLのまま残します。
+
+    Args:
+        libraries: ライブラリのリスト
+        static: 書き出し先
+        cache_dir: ダウンロードしたファイルのキャッシュフォルダ
+
+    Returns:
+        URLを置き換えたライブラリのリスト
+    """
+    vendor = LibraryVendor(static, cache_dir)
+    vendored = []
+    for library in libraries:
+        try:
+            vendored.append(library._replace(url=vendor.vendor(library)))
+        except (VendorError, UnicodeDecodeError) as e:
+            logger.warning(f"ライブラリ '{library.name}' をローカルに保存できませんでした。CDNから読み込みます: {e}")
+            vendored.append(library)
+    return vendored
+
+
+def apply_libraries(m: folium.Map, libraries: Optional[List[FrontendLibrary]] = None) -> None:
+    """
+    Foliumの既定のライブラリを、指定のライブラリに置き換える
+
+    Args:
+        m: Foliumマップ
+        libraries: ライブラリのリスト（Noneの場合は FRONTEND_LIBRARIES）
+    """
+    libraries = FRONTEND_LIBRARIES if libraries is None else libraries
+    # クラス属性を書き換えないよう、インスタンス属性として設定する
+    m.default_js = [(library.name, library.url) for library in libraries if library.kind == 'js']
+    m.default_css = [(library.name, library.url) for library in libraries if library.kind == 'css']